@@ -1,5 +1,5 @@
 """
-ASGI config for cita_medica project.
+ASGI config for Proyecto_cita_medica project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cita_medica.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Proyecto_cita_medica.settings')
+# settings deja CONN_MAX_AGE en 0 por defecto bajo ASGI
+os.environ.setdefault('AGENDA_ASGI', 'True')
 
 application = get_asgi_application()
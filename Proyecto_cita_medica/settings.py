@@ -28,10 +28,16 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "agenda.middleware.RolesMiddleware",
+    "agenda.routers.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Instrumentación de consultas por vista (ver agenda.instrumentacion)
+if os.getenv("AGENDA_INSTRUMENTAR_CONSULTAS", "False").lower() == "true":
+    MIDDLEWARE.insert(0, "agenda.middleware.PresupuestoConsultasMiddleware")
+
 ROOT_URLCONF = "Proyecto_cita_medica.urls"
 
 TEMPLATES = [
@@ -55,17 +61,119 @@ TEMPLATES = [
 WSGI_APPLICATION = "Proyecto_cita_medica.wsgi.application"
 
 # --- PostgreSQL ---
-DATABASES = {
+# Cada alias se arma desde <PREFIJO>_ENGINE/NAME/USER/PASSWORD/HOST/PORT.
+# Por defecto las conexiones son persistentes (DB_CONN_MAX_AGE segundos) con
+# chequeo de salud antes de reutilizarlas. Bajo ASGI (asgi.py define
+# AGENDA_ASGI) el valor por defecto es 0: las vistas async usan el ORM desde
+# hilos de sync_to_async y cada hilo dejaría su conexión abierta sin que nadie
+# la cierre; ahí conviene el pool. DB_POOL=True usa el pool de psycopg 3
+# (requiere psycopg[pool]); Django exige CONN_MAX_AGE=0 con pool, así que
+# ambos modos son excluyentes.
+_ASGI = os.getenv("AGENDA_ASGI", "False").lower() == "true"
+
+
+def _base_de_datos(prefijo: str, base: dict = None) -> dict:
+    """Alias leído de las variables ``<prefijo>_*``; lo no definido se toma de ``base``."""
+    base = base or {}
+
+    def env(clave, defecto):
+        return os.getenv(f"{prefijo}_{clave}", base.get(clave, defecto))
+
+    return {
+        "ENGINE": env("ENGINE", "django.db.backends.postgresql"),
+        "NAME": env("NAME", "cita_medica"),
+        "USER": env("USER", "postgres"),
+        "PASSWORD": env("PASSWORD", "postgres"),
+        "HOST": env("HOST", "127.0.0.1"),
+        "PORT": env("PORT", "5432"),
+        "CONN_MAX_AGE": int(env("CONN_MAX_AGE", 0 if _ASGI else 60)),
+        "CONN_HEALTH_CHECKS": str(env("CONN_HEALTH_CHECKS", True)).lower() == "true",
+        "POOL": str(env("POOL", False)).lower() == "true",
+        "POOL_MIN_SIZE": int(env("POOL_MIN_SIZE", 2)),
+        "POOL_MAX_SIZE": int(env("POOL_MAX_SIZE", 10)),
+        "POOL_TIMEOUT": float(env("POOL_TIMEOUT", 10)),
+    }
+
+
+def _alias(config: dict) -> dict:
+    """Entrada de DATABASES a partir de lo que arma ``_base_de_datos``."""
+    alias = {k: v for k, v in config.items() if not k.startswith("POOL")}
+    if config["POOL"] and config["ENGINE"].endswith("postgresql"):
+        alias["CONN_MAX_AGE"] = 0
+        alias["OPTIONS"] = {"pool": {
+            "min_size": config["POOL_MIN_SIZE"],
+            "max_size": config["POOL_MAX_SIZE"],
+            "timeout": config["POOL_TIMEOUT"],
+        }}
+    return alias
+
+
+_DB = _base_de_datos("DB")
+DATABASES = {"default": _alias(_DB)}
+
+# Réplica de lectura opcional: DB_REPLICA_HOST (o DB_REPLICA_NAME) la activa;
+# el resto de DB_REPLICA_* se hereda de DB_*. agenda.routers le manda las
+# lecturas de las vistas de solo lectura (AJAX, consultorio, KPIs).
+if os.getenv("DB_REPLICA_HOST") or os.getenv("DB_REPLICA_NAME"):
+    DATABASES["replica"] = {**_alias(_base_de_datos("DB_REPLICA", _DB)),
+                            "TEST": {"MIRROR": "default"}}
+
+DATABASE_ROUTERS = ["agenda.routers.ReplicaRouter"]
+
+# AGENDA_REPLICA=False deja todas las lecturas en la primaria sin quitar el alias
+AGENDA_REPLICA = os.getenv("AGENDA_REPLICA", "True").lower() == "true"
+
+# Segundos que una sesión lee de la primaria tras escribir citas/pacientes/médicos
+AGENDA_REPLICA_VENTANA = int(os.getenv("AGENDA_REPLICA_VENTANA", "10"))
+
+# --- Caché (horarios, datos de referencia…) ---
+# En producción con varios procesos usa una caché compartida (Redis/Memcached)
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": os.getenv("DB_NAME", "cita_medica"),
-        "USER": os.getenv("DB_USER", "postgres"),
-        "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),
-        "HOST": os.getenv("DB_HOST", "127.0.0.1"),
-        "PORT": os.getenv("DB_PORT", "5432"),
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "medidate"),
     }
 }
 
+# Cachés que se invalidan renovando una versión guardada en la caché: con
+# LocMemCache cada proceso tiene la suya y los demás workers servirían datos
+# viejos, así que por defecto solo se activan con una caché compartida
+# (agenda.checks lo exige).
+_CACHE_COMPARTIDA = not CACHES["default"]["BACKEND"].endswith(".LocMemCache")
+# Tablas de citas renderizadas (agenda.fragmentos)
+AGENDA_FRAGMENTOS = os.getenv("AGENDA_FRAGMENTOS", str(_CACHE_COMPARTIDA)).lower() == "true"
+# Catálogo (especialidades, médicos) y horarios, con el ETag de ajax_medicos
+AGENDA_CACHE_CATALOGO = os.getenv(
+    "AGENDA_CACHE_CATALOGO", str(_CACHE_COMPARTIDA)).lower() == "true"
+
+# --- Hash de contraseñas (ver agenda.hashers y el comando bench_hashers) ---
+# AGENDA_HASHER elige el algoritmo preferido: pbkdf2, scrypt o argon2 (este
+# requiere argon2-cffi). Los demás quedan para verificar hashes existentes;
+# cambiar el algoritmo o su costo rehace el hash de cada usuario al entrar.
+# Los valores por defecto son los de Django.
+AGENDA_HASHER = os.getenv("AGENDA_HASHER", "pbkdf2").lower()
+AGENDA_HASH_PBKDF2_ITERACIONES = int(os.getenv("AGENDA_HASH_PBKDF2_ITERACIONES", "1000000"))
+AGENDA_HASH_SCRYPT_N = int(os.getenv("AGENDA_HASH_SCRYPT_N", str(2 ** 14)))
+AGENDA_HASH_SCRYPT_R = int(os.getenv("AGENDA_HASH_SCRYPT_R", "8"))
+AGENDA_HASH_SCRYPT_P = int(os.getenv("AGENDA_HASH_SCRYPT_P", "1"))
+AGENDA_HASH_ARGON2_TIEMPO = int(os.getenv("AGENDA_HASH_ARGON2_TIEMPO", "2"))
+AGENDA_HASH_ARGON2_MEMORIA = int(os.getenv("AGENDA_HASH_ARGON2_MEMORIA", "102400"))  # KiB
+AGENDA_HASH_ARGON2_HILOS = int(os.getenv("AGENDA_HASH_ARGON2_HILOS", "8"))
+
+_HASHERS = {
+    "pbkdf2": "agenda.hashers.PBKDF2Hasher",
+    "scrypt": "agenda.hashers.ScryptHasher",
+    "argon2": "agenda.hashers.Argon2Hasher",
+}
+_PREFERIDO = _HASHERS.get(AGENDA_HASHER, _HASHERS["pbkdf2"])  # agenda.checks avisa si no existe
+PASSWORD_HASHERS = [
+    _PREFERIDO,
+    *(h for h in _HASHERS.values() if h != _PREFERIDO),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -88,12 +196,24 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "agenda.User"
+AUTHENTICATION_BACKENDS = ["agenda.backends.EmailBackend"]
 
 # OJO: deben concordar con las rutas incluidas en urls.py
 LOGIN_URL = "/accounts/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
+# Guarda el id de Paciente en la sesión para no consultarlo en cada petición
+AGENDA_ROLES_EN_SESION = os.getenv(
+    "AGENDA_ROLES_EN_SESION", "True").lower() == "true"
+
+# Endpoints AJAX async nativos; activar al desplegar con ASGI (ver README)
+AGENDA_AJAX_ASYNC = os.getenv("AGENDA_AJAX_ASYNC", "False").lower() == "true"
+
+# Citas con inicio anterior a este horizonte se mueven a CitaArchivada
+# (comando archivar_citas)
+AGENDA_ARCHIVO_DIAS = int(os.getenv("AGENDA_ARCHIVO_DIAS", "365"))
+
 EMAIL_BACKEND = os.getenv(
     "EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
 DEFAULT_FROM_EMAIL = os.getenv(
@@ -0,0 +1,38 @@
+"""
+Settings de ``manage.py test`` (CI): SQLite (también para la réplica), caché
+local y un hasher rápido.
+
+    DJANGO_SETTINGS_MODULE=Proyecto_cita_medica.settings_test python manage.py test
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "test.sqlite3",
+        # En archivo y no en memoria: las pruebas con hilos (reservas
+        # concurrentes) necesitan que SQLite espere el bloqueo en vez de fallar
+        "TEST": {"NAME": BASE_DIR / "test_agenda.sqlite3"},
+    },
+    # Otra BD, sin replicación: una réplica infinitamente atrasada. Solo la
+    # usan las pruebas de agenda.routers (con AGENDA_REPLICA=True)
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "test_replica.sqlite3",
+        "TEST": {"NAME": BASE_DIR / "test_agenda_replica.sqlite3"},
+    },
+}
+AGENDA_REPLICA = False
+# Como ReplicaRouter, pero crea el esquema también en la réplica
+DATABASE_ROUTERS = ["agenda.testing.ReplicaRouterPruebas"]
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+# Un solo proceso: la caché local no queda vieja en otros workers
+AGENDA_CACHE_CATALOGO = True
+SILENCED_SYSTEM_CHECKS = ["agenda.E003"]
+
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
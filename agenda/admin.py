@@ -1,6 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Paciente, Especialidad, Medico, Cita
+from . import cancelaciones
+from .models import (
+    User, Paciente, Especialidad, Medico, Cita, CitaArchivada, Notificacion,
+    PlantillaHorario, Feriado, ExcepcionHorario,
+)
 
 
 @admin.register(User)
@@ -38,11 +42,32 @@ class EspecialidadAdmin(admin.ModelAdmin):
 
 @admin.register(Medico)
 class MedicoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'especialidad')
-    list_filter = ('especialidad',)
+    list_display = ('nombre', 'especialidad', 'plantilla')
+    list_filter = ('especialidad', 'plantilla')
     search_fields = ('nombre',)
 
 
+@admin.register(PlantillaHorario)
+class PlantillaHorarioAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'dias', 'ventanas', 'paso_min')
+    search_fields = ('nombre',)
+
+
+@admin.register(Feriado)
+class FeriadoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'nombre')
+    ordering = ('-fecha',)
+    date_hierarchy = 'fecha'
+
+
+@admin.register(ExcepcionHorario)
+class ExcepcionHorarioAdmin(admin.ModelAdmin):
+    list_display = ('medico', 'fecha', 'ventanas', 'motivo')
+    list_filter = ('medico',)
+    ordering = ('-fecha',)
+    date_hierarchy = 'fecha'
+
+
 @admin.register(Cita)
 class CitaAdmin(admin.ModelAdmin):
     list_display = ('fecha', 'hora', 'paciente', 'medico', 'estado')
@@ -55,3 +80,35 @@ class CitaAdmin(admin.ModelAdmin):
     )
     ordering = ('-fecha', '-hora')
     date_hierarchy = 'fecha'
+    actions = ('cancelar_seleccionadas',)
+
+    @admin.action(description='Cancelar citas seleccionadas (solo vigentes)',
+                  permissions=('change',))
+    def cancelar_seleccionadas(self, request, queryset):
+        n = cancelaciones.cancelar_lote(queryset, request.user, "Cancelada desde admin")
+        self.message_user(request, f"{n} cita(s) cancelada(s).", messages.SUCCESS)
+
+
+@admin.register(CitaArchivada)
+class CitaArchivadaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'hora', 'paciente', 'medico', 'estado', 'archivada')
+    list_filter = ('estado', 'medico')
+    search_fields = ('paciente__user__email', 'medico__nombre')
+    ordering = ('-fecha', '-hora')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Notificacion)
+class NotificacionAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'cita', 'estado', 'intentos', 'proximo_intento', 'enviada_en')
+    list_filter = ('estado', 'tipo')
+    list_select_related = ('cita',)
+    raw_id_fields = ('cita',)
+    readonly_fields = ('creada', 'enviada_en', 'error')
+    ordering = ('-creada',)
@@ -8,3 +8,4 @@ class AgendaConfig(AppConfig):
     def ready(self):
         # importa signals para que se registren
         from . import signals  # noqa: F401
+        from . import checks  # noqa: F401
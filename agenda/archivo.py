@@ -0,0 +1,92 @@
+"""
+Archivo de citas históricas.
+
+Las citas cuyo ``inicio`` quedó más atrás que el horizonte
+(``AGENDA_ARCHIVO_DIAS``) se mueven a ``CitaArchivada`` en lotes: cada lote
+copia las filas y las borra de ``Cita`` en una misma transacción, así que el
+proceso se puede interrumpir y retomar sin duplicar ni perder filas. La tabla
+caliente queda con las citas recientes y futuras, que son las que consultan
+el consultorio, la disponibilidad y los KPIs.
+
+El borrado es un ``DELETE`` directo: no dispara las señales de ``Cita``
+(son citas pasadas, no afectan la ocupación futura ni las próximas del
+resumen del paciente).
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache as agenda_cache
+from .models import Cita, CitaArchivada, OcupacionDia, ResumenPaciente
+
+DIAS = getattr(settings, "AGENDA_ARCHIVO_DIAS", 365)
+
+CAMPOS = [
+    "id", "paciente_id", "medico_id", "fecha", "hora", "inicio", "motivo", "estado",
+    "creada", "cancelada_por_id", "cancelada_en", "cancel_motivo",
+]
+
+
+def corte(dias: int = None):
+    return timezone.now() - timedelta(days=DIAS if dias is None else dias)
+
+
+def pendientes(hasta):
+    return Cita.objects.filter(inicio__lt=hasta)
+
+
+def archivar_lote(hasta, lote: int = 5000) -> int:
+    """Mueve hasta ``lote`` citas anteriores a ``hasta``. Devuelve cuántas movió."""
+    with transaction.atomic():
+        filas = list(pendientes(hasta).order_by("id").values(*CAMPOS)[:lote])
+        if not filas:
+            return 0
+        ids = [f["id"] for f in filas]
+        CitaArchivada.objects.bulk_create(
+            [CitaArchivada(**f) for f in filas], ignore_conflicts=True)
+        # Un resumen viejo podría seguir apuntando a una de estas citas
+        ResumenPaciente.objects.filter(proxima_cita_id__in=ids).update(proxima_cita=None)
+        with connection.cursor() as cur:
+            marcas = ", ".join(["%s"] * len(ids))
+            cur.execute(
+                f"DELETE FROM {Cita._meta.db_table} WHERE id IN ({marcas})", ids)
+    return len(filas)
+
+
+def archivar(hasta, lote: int = 5000, max_lotes: int = None):
+    """Archiva por lotes; genera el tamaño de cada lote movido."""
+    hechos = 0
+    while max_lotes is None or hechos < max_lotes:
+        n = archivar_lote(hasta, lote)
+        if not n:
+            break
+        hechos += 1
+        yield n
+    # Los mapas de ocupación de días ya archivados no se vuelven a leer
+    OcupacionDia.objects.filter(fecha__lt=timezone.localtime(hasta).date()).delete()
+    agenda_cache.invalidar("citas")
+
+
+def historial(paciente, ahora=None) -> list:
+    """
+    Historial del paciente (más reciente primero) leyendo ``Cita`` y
+    ``CitaArchivada``; la mezcla respeta el orden de ambas consultas.
+    """
+    ahora = ahora or timezone.now()
+    relacionados = ("medico", "medico__especialidad")
+    recientes = (
+        Cita.objects.filter(paciente=paciente)
+        .filter(Q(inicio__lt=ahora) | Q(estado__in=["cancelada", "atendida"]))
+        .select_related(*relacionados)
+        .order_by("-inicio")
+    )
+    archivadas = (
+        CitaArchivada.objects.filter(paciente=paciente)
+        .select_related(*relacionados)
+        .order_by("-inicio")
+    )
+    return list(heapq.merge(recientes, archivadas, key=lambda c: c.inicio, reverse=True))
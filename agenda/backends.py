@@ -8,14 +8,21 @@ User = get_user_model()
 
 class EmailBackend(ModelBackend):
     """
-    Autentica usando el campo email en lugar de username.
+    Autentica usando el campo email en lugar de username, sin distinguir
+    mayúsculas (consulta por el índice único sobre LOWER(email)).
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(email__iexact=username)
-        except User.DoesNotExist:
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
             return None
-        if user.check_password(password):
+        user = User.objects.por_email(username).first()
+        if user is None:
+            # Igual que ModelBackend: se calcula un hash para que un email
+            # inexistente tarde lo mismo que una clave incorrecta
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
@@ -0,0 +1,121 @@
+"""
+Búsqueda de pacientes por nombre o email.
+
+``Paciente.busqueda`` guarda "nombre apellidos email" en minúsculas y sin
+tildes; lo mantienen las señales de ``User`` y ``Paciente``. Sobre esa columna:
+
+- PostgreSQL: índice GIN trigram (``pg_trgm``) que sirve a ``LIKE '%…%'``.
+- SQLite: tabla FTS5 de contenido externo con el tokenizador ``trigram``,
+  sincronizada con triggers.
+- Otros motores: ``LIKE`` sobre la columna normalizada.
+
+En todos los motores cada término se busca como subcadena ("úñe" encuentra a
+"Núñez"). Los índices trigram solo sirven a términos de 3 o más caracteres;
+los más cortos se comparan con ``LIKE`` sobre las filas ya filtradas.
+"""
+import re
+import unicodedata
+
+from django.db import OperationalError, connections
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = "agenda_paciente_fts"
+TRIGRAMA = 3
+
+_SQL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS agenda_paciente_busqueda_trgm "
+    "ON agenda_paciente USING gin (busqueda gin_trgm_ops)",
+]
+
+_SQL_SQLITE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+    "busqueda, content='agenda_paciente', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF busqueda ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda);
+        INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda);
+    END""",
+]
+
+_fts_listo = set()
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes y con espacios simples ("José  Núñez" -> "jose nunez")."""
+    sin_tildes = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in sin_tildes if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def texto_de(user) -> str:
+    return normalizar(f"{user.first_name} {user.last_name} {user.email}")
+
+
+def _fts_disponible(connection) -> bool:
+    if connection.alias in _fts_listo:
+        return True
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA_FTS])
+        existe = cur.fetchone() is not None
+    if existe:
+        _fts_listo.add(connection.alias)
+    return existe
+
+
+def instalar_indices(connection) -> None:
+    """
+    Crea (si faltan) el índice trigram o la tabla FTS5 con sus triggers.
+    Se llama tras cada ``migrate`` (las migraciones llevan su propia copia
+    del SQL), porque en SQLite
+    rehacer la tabla ``agenda_paciente`` elimina sus triggers.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cur:
+            for sql in _SQL_POSTGRES:
+                cur.execute(sql)
+    elif connection.vendor == "sqlite":
+        nueva = not _fts_disponible(connection)
+        try:
+            with connection.cursor() as cur:
+                for sql in _SQL_SQLITE:
+                    cur.execute(sql)
+                if nueva:
+                    cur.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        except OperationalError:
+            # SQLite sin FTS5 o anterior a 3.34 (sin trigram): queda LIKE
+            return
+
+
+def _expresion_fts(terminos) -> str:
+    # Cada término como frase: con trigram, una frase es una subcadena
+    return " ".join('"%s"' % t.replace('"', '""') for t in terminos)
+
+
+def filtrar(qs, q: str, campo: str = "busqueda", campo_id: str = "id"):
+    """
+    Filtra ``qs`` por los términos de ``q`` (todos deben aparecer).
+    ``campo``/``campo_id`` permiten filtrar modelos relacionados, p. ej.
+    ``filtrar(citas, q, "paciente__busqueda", "paciente_id")``.
+    """
+    terminos = [t for t in re.split(r"[\s@.]+", normalizar(q)) if t]
+    if not terminos:
+        return qs
+    conexion = connections[qs.db]
+    if conexion.vendor == "sqlite" and _fts_disponible(conexion):
+        largos = [t for t in terminos if len(t) >= TRIGRAMA]
+        if largos:
+            qs = qs.filter(**{f"{campo_id}__in": RawSQL(
+                f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s",
+                [_expresion_fts(largos)],
+            )})
+            terminos = [t for t in terminos if len(t) < TRIGRAMA]
+    for t in terminos:
+        qs = qs.filter(**{f"{campo}__contains": t})
+    return qs
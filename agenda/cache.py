@@ -0,0 +1,87 @@
+"""
+Claves de caché versionadas.
+
+Cada espacio de nombres ("horarios", "kpis", …) tiene una versión guardada en
+la caché; las señales la renuevan con ``invalidar`` y todas las entradas
+derivadas quedan obsoletas sin tener que borrarlas una a una.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PREFIJO = "agenda"
+# Espacios que ``obtener`` solo cachea con AGENDA_CACHE_CATALOGO (ver settings)
+CATALOGO = {"catalogo", "horarios"}
+
+
+def version(nombre: str) -> int:
+    clave = f"{PREFIJO}:v:{nombre}"
+    v = cache.get(clave)
+    if v is None:
+        v = time.time_ns() // 1000
+        cache.add(clave, v, timeout=None)
+        v = cache.get(clave, v)
+    return v
+
+
+def invalidar(nombre: str) -> None:
+    cache.set(f"{PREFIJO}:v:{nombre}", time.time_ns() // 1000, timeout=None)
+
+
+def clave(nombre: str, *partes) -> str:
+    sufijo = ":".join(str(p) for p in partes)
+    return f"{PREFIJO}:{nombre}:{version(nombre)}:{sufijo}"
+
+
+def activa(nombre: str) -> bool:
+    return nombre not in CATALOGO or getattr(settings, "AGENDA_CACHE_CATALOGO", False)
+
+
+def obtener(nombre: str, partes: tuple, cargar, ttl: int):
+    """
+    Valor guardado bajo la versión de ``nombre``. En un fallo de caché lo
+    calcula ``cargar()`` y lo guarda si no es None y ``routers.cacheable``
+    lo permite. Con la caché del espacio desactivada solo llama a ``cargar()``.
+    """
+    from . import routers  # routers importa este módulo
+    if not activa(nombre):
+        return cargar()
+    k = clave(nombre, *partes)
+    valor = cache.get(k)
+    if valor is None:
+        valor = cargar()
+        if valor is not None and routers.cacheable(nombre):
+            cache.set(k, valor, ttl)
+    return valor
+
+
+# ---- Variantes async (vistas AJAX bajo ASGI) ----
+
+async def aversion(nombre: str) -> int:
+    clave = f"{PREFIJO}:v:{nombre}"
+    v = await cache.aget(clave)
+    if v is None:
+        v = time.time_ns() // 1000
+        await cache.aadd(clave, v, timeout=None)
+        v = await cache.aget(clave, v)
+    return v
+
+
+async def aclave(nombre: str, *partes) -> str:
+    sufijo = ":".join(str(p) for p in partes)
+    return f"{PREFIJO}:{nombre}:{await aversion(nombre)}:{sufijo}"
+
+
+async def aobtener(nombre: str, partes: tuple, cargar, ttl: int):
+    """Como ``obtener``; ``cargar`` es una función async."""
+    from . import routers
+    if not activa(nombre):
+        return await cargar()
+    k = await aclave(nombre, *partes)
+    valor = await cache.aget(k)
+    if valor is None:
+        valor = await cargar()
+        if valor is not None and await routers.acacheable(nombre):
+            await cache.aset(k, valor, ttl)
+    return valor
@@ -0,0 +1,60 @@
+"""
+Cancelación masiva de citas (p. ej. un médico con licencia).
+
+``cancelar_lote`` bloquea las citas vigentes del queryset y les aplica los
+campos de auditoría con un único ``UPDATE`` que vuelve a exigir que no estén
+canceladas: una cita que el paciente canceló entre medio (donde no hay
+bloqueo de filas, como en SQLite) conserva su auditoría y no recibe un
+segundo aviso. Como ``QuerySet.update`` no dispara señales, después libera
+en el índice de ocupación solo los bloques de las citas que cambiaron (las
+reservas simultáneas de otros bloques no se tocan), descarta los resúmenes
+de los pacientes afectados, encola los avisos de cancelación en un solo
+INSERT e invalida la caché de "citas".
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache as agenda_cache, disponibilidad, notificaciones, resumen
+from .models import Cita
+
+
+def vigentes(qs=None):
+    """Citas que todavía pueden cancelarse: no canceladas y no pasadas."""
+    qs = Cita.objects.all() if qs is None else qs
+    return qs.exclude(estado="cancelada").filter(inicio__gt=timezone.now())
+
+
+def cancelar_lote(qs, user, motivo: str = "") -> int:
+    """Cancela las citas vigentes de ``qs``. Devuelve cuántas cambiaron."""
+    campos = {"estado": "cancelada", "cancelada_por": user,
+              "cancelada_en": timezone.now()}
+    if motivo:
+        campos["cancel_motivo"] = motivo[:200]
+
+    with transaction.atomic():
+        filas = list(
+            vigentes(qs).select_related(None).order_by()
+            .select_for_update(of=("self",))
+            .values_list("pk", "medico_id", "fecha", "hora")
+        )
+        if not filas:
+            return 0
+        ids = [f[0] for f in filas]
+        n = Cita.objects.filter(pk__in=ids).exclude(estado="cancelada").update(**campos)
+        if n != len(ids):
+            # Sin bloqueo de filas: quedan solo las que cancelamos nosotros
+            nuestras = set(Cita.objects.filter(
+                pk__in=ids, cancelada_en=campos["cancelada_en"]).values_list("pk", flat=True))
+            filas = [f for f in filas if f[0] in nuestras]
+            ids = [f[0] for f in filas]
+        resumen.descartar(Cita.objects.filter(pk__in=ids).values("paciente_id"))
+        notificaciones.encolar_muchas("cancelacion", ids)
+        disponibilidad.liberar_bloques(f[1:] for f in filas)
+    transaction.on_commit(lambda: agenda_cache.invalidar("citas"))
+    return n
+
+
+def cancelar_rango(medico_id: int, desde, hasta, user, motivo: str = "") -> int:
+    """Cancela las citas vigentes de un médico entre ``desde`` y ``hasta`` (inclusive)."""
+    qs = Cita.objects.filter(medico_id=medico_id, fecha__range=(desde, hasta))
+    return cancelar_lote(qs, user, motivo)
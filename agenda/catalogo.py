@@ -0,0 +1,59 @@
+"""
+Datos de referencia (especialidades y médicos) cacheados.
+
+Cambian muy poco, pero cada formulario y cada combo los pedía a la BD. Se
+guardan completos bajo la versión "catalogo" (la renuevan las señales de
+``Especialidad`` y ``Medico``), y los filtros por especialidad se resuelven en
+memoria. La misma versión sirve de ETag/Last-Modified para ``ajax_medicos``.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from . import cache as agenda_cache
+from .models import Especialidad, Medico
+
+TTL = 60 * 60
+
+
+def _cacheado(nombre, cargar):
+    return agenda_cache.obtener("catalogo", (nombre,), cargar, TTL)
+
+
+def especialidades() -> list:
+    return _cacheado(
+        "especialidades", lambda: list(Especialidad.objects.order_by("nombre")))
+
+
+def medicos(especialidad_id=None) -> list:
+    """Médicos ordenados por nombre (con su especialidad), opcionalmente filtrados."""
+    todos = _cacheado(
+        "medicos",
+        lambda: list(Medico.objects.select_related("especialidad").order_by("nombre")),
+    )
+    if especialidad_id is None:
+        return todos
+    especialidad_id = int(especialidad_id)
+    return [m for m in todos if m.especialidad_id == especialidad_id]
+
+
+def version():
+    """Versión del catálogo, o None si no se cachea (no serviría de ETag)."""
+    if not agenda_cache.activa("catalogo"):
+        return None
+    return agenda_cache.version("catalogo")
+
+
+def modificado():
+    """Instante (aprox.) del último cambio, derivado de la versión en microsegundos."""
+    v = version()
+    return v and datetime.fromtimestamp(v / 1_000_000, tz=dt_timezone.utc)
+
+
+async def _amedicos():
+    return [m async for m in Medico.objects.select_related("especialidad").order_by("nombre")]
+
+
+async def amedicos(especialidad_id) -> list:
+    """Como ``medicos`` (filtrado), con el ORM async."""
+    todos = await agenda_cache.aobtener("catalogo", ("medicos",), _amedicos, TTL)
+    especialidad_id = int(especialidad_id)
+    return [m for m in todos if m.especialidad_id == especialidad_id]
@@ -0,0 +1,40 @@
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+ALGORITMOS = ("pbkdf2", "scrypt", "argon2")
+
+
+@register()
+def hasher_configurado(app_configs, **kwargs):
+    """AGENDA_HASHER debe ser un algoritmo conocido y con su librería instalada."""
+    elegido = getattr(settings, "AGENDA_HASHER", "pbkdf2")
+    if elegido not in ALGORITMOS:
+        return [Error(
+            f"AGENDA_HASHER={elegido!r} no es válido.",
+            hint=f"Usa uno de: {', '.join(ALGORITMOS)}.", id="agenda.E001")]
+    if elegido == "argon2" and find_spec("argon2") is None:
+        return [Error(
+            "AGENDA_HASHER=argon2 requiere argon2-cffi.",
+            hint='pip install "argon2-cffi" o elige scrypt/pbkdf2.', id="agenda.E002")]
+    return []
+
+
+# Ajustes que exigen una caché compartida por todos los procesos
+AJUSTES_CACHE_COMPARTIDA = ("AGENDA_FRAGMENTOS", "AGENDA_CACHE_CATALOGO")
+
+
+@register()
+def cache_compartida(app_configs, **kwargs):
+    """Las cachés con versión necesitan una caché que vean todos los procesos."""
+    if not isinstance(caches["default"], LocMemCache):
+        return []
+    return [Error(
+        f"{ajuste}=True con LocMemCache: cada proceso invalidaría solo su propia "
+        "copia y los demás servirían datos viejos.",
+        hint=f"Usa una caché compartida (CACHE_BACKEND Redis/Memcached) o {ajuste}=False.",
+        id="agenda.E003",
+    ) for ajuste in AJUSTES_CACHE_COMPARTIDA if getattr(settings, ajuste, False)]
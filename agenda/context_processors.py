@@ -1,9 +1,10 @@
-from .models import Paciente
+from .roles import de_peticion
 
 
 def rol_flags(request):
     es_paciente = False
     user = getattr(request, "user", None)
     if user and user.is_authenticated:
-        es_paciente = Paciente.objects.filter(user=user).exists()
+        # Comparte la resolución (y la consulta) con los guards de las vistas
+        es_paciente = de_peticion(request).es_paciente
     return {"es_paciente": es_paciente}
@@ -0,0 +1,151 @@
+"""
+Índice de ocupación por (médico, fecha).
+
+Cada fila de ``OcupacionDia`` guarda un entero donde el bit ``n`` indica que el
+bloque de ``PASO_MIN`` minutos que empieza en ``n * PASO_MIN`` está reservado
+(qué bloques se ofrecen lo decide ``agenda.horarios``).
+Las señales de ``Cita`` lo mantienen al día con operaciones atómicas
+(``mapa | bit`` / ``mapa & ~bit``), así que las consultas de horas libres se
+responden con una sola lectura por clave, sin recorrer la tabla de citas.
+"""
+from datetime import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Cita, OcupacionDia
+
+PASO_MIN = 30
+
+
+def bit_de(hora: time):
+    """Índice de bit del bloque que empieza en ``hora`` o None si no está alineada."""
+    minutos = hora.hour * 60 + hora.minute
+    if hora.second or hora.microsecond or minutos % PASO_MIN:
+        return None
+    return minutos // PASO_MIN
+
+
+def mascara(horas) -> int:
+    m = 0
+    for h in horas:
+        b = bit_de(h)
+        if b is not None:
+            m |= 1 << b
+    return m
+
+
+def ocupacion(medico_id: int, fecha) -> int:
+    """Mapa de bits de la fecha (0 si el médico no tiene nada reservado)."""
+    return (
+        OcupacionDia.objects.filter(medico_id=medico_id, fecha=fecha)
+        .values_list("mapa", flat=True)
+        .first()
+    ) or 0
+
+
+def ocupacion_rango(medico_id: int, desde, hasta) -> dict:
+    """{fecha: mapa} de un médico entre dos fechas (incluidas), en una sola consulta."""
+    return dict(
+        OcupacionDia.objects.filter(
+            medico_id=medico_id, fecha__range=(desde, hasta))
+        .values_list("fecha", "mapa")
+    )
+
+
+async def aocupacion_rango(medico_id: int, desde, hasta) -> dict:
+    """Como ``ocupacion_rango``, con el ORM async (vistas AJAX bajo ASGI)."""
+    return {
+        fecha: mapa async for fecha, mapa in
+        OcupacionDia.objects.filter(medico_id=medico_id, fecha__range=(desde, hasta))
+        .values_list("fecha", "mapa")
+    }
+
+
+def marcar(medico_id: int, fecha, hora: time) -> None:
+    b = bit_de(hora)
+    if b is None:
+        return
+    bit = 1 << b
+    actualizadas = OcupacionDia.objects.filter(
+        medico_id=medico_id, fecha=fecha).update(mapa=F("mapa").bitor(bit))
+    if actualizadas:
+        return
+    try:
+        with transaction.atomic():
+            OcupacionDia.objects.create(
+                medico_id=medico_id, fecha=fecha, mapa=bit)
+    except IntegrityError:
+        # Otra transacción creó la fila entre medio: basta con el OR atómico
+        OcupacionDia.objects.filter(
+            medico_id=medico_id, fecha=fecha).update(mapa=F("mapa").bitor(bit))
+
+
+def liberar(medico_id: int, fecha, hora: time) -> None:
+    b = bit_de(hora)
+    if b is None:
+        return
+    OcupacionDia.objects.filter(medico_id=medico_id, fecha=fecha).update(
+        mapa=F("mapa").bitand(~(1 << b)))
+
+
+def liberar_bloques(bloques) -> int:
+    """
+    Libera muchos bloques ``(medico_id, fecha, hora)`` con un UPDATE por día
+    (``mapa & ~máscara``); los demás bits del día no se tocan. Devuelve
+    cuántos días cambiaron.
+    """
+    mascaras = {}
+    for medico_id, fecha, hora in bloques:
+        b = bit_de(hora)
+        if b is not None:
+            mascaras[(medico_id, fecha)] = mascaras.get((medico_id, fecha), 0) | (1 << b)
+    for (medico_id, fecha), m in mascaras.items():
+        OcupacionDia.objects.filter(medico_id=medico_id, fecha=fecha).update(
+            mapa=F("mapa").bitand(~m))
+    return len(mascaras)
+
+
+def sincronizar(anterior, actual) -> None:
+    """Aplica el cambio de bloque ocupado de una cita (tuplas de ``Cita.bloque_ocupado``)."""
+    if anterior == actual:
+        return
+    if anterior:
+        liberar(*anterior)
+    if actual:
+        marcar(*actual)
+
+
+def reconstruir(medico_id=None, desde=None, hasta=None) -> int:
+    """
+    Recalcula el índice desde ``Cita`` (tras cargas masivas o ``bulk_*`` que
+    no disparan señales). Devuelve cuántos días quedaron con ocupación.
+    Reemplaza las filas del rango: no debe correr junto a reservas en curso
+    (para eso, ``liberar_bloques``/``marcar``).
+    """
+    citas = Cita.objects.exclude(estado="cancelada")
+    dias = OcupacionDia.objects.all()
+    if medico_id is not None:
+        citas = citas.filter(medico_id=medico_id)
+        dias = dias.filter(medico_id=medico_id)
+    if desde:
+        citas = citas.filter(fecha__gte=desde)
+        dias = dias.filter(fecha__gte=desde)
+    if hasta:
+        citas = citas.filter(fecha__lte=hasta)
+        dias = dias.filter(fecha__lte=hasta)
+
+    mapas = {}
+    for med, fecha, hora in citas.values_list("medico_id", "fecha", "hora").iterator(chunk_size=5000):
+        b = bit_de(hora)
+        if b is not None:
+            mapas[(med, fecha)] = mapas.get((med, fecha), 0) | (1 << b)
+
+    with transaction.atomic():
+        dias.delete()
+        OcupacionDia.objects.bulk_create(
+            [OcupacionDia(medico_id=med, fecha=fecha, mapa=m)
+             for (med, fecha), m in mapas.items()],
+            batch_size=5000,
+        )
+    return len(mapas)
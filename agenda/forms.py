@@ -1,10 +1,10 @@
-from datetime import time
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
 
-from .models import Cita, Paciente, Medico, Especialidad, User
+from . import catalogo, horarios
+from .models import Cita, Paciente, Medico, User
 
 # =========================
 #  Autenticación / Registro
@@ -47,7 +47,7 @@ class RegistroForm(forms.ModelForm):
         if not email:
             raise forms.ValidationError("Este campo no puede estar vacío.")
         UserModel = get_user_model()
-        if UserModel.objects.filter(email__iexact=email).exists():
+        if UserModel.objects.por_email(email).exists():
             raise forms.ValidationError("Ya existe un usuario con ese email.")
         return email
 
@@ -118,16 +118,52 @@ class PacienteForm(forms.ModelForm):
 # =========================
 #  Citas
 # =========================
+class OpcionCatalogo(forms.ChoiceField):
+    """
+    Como ``ModelChoiceField``, pero sobre una lista ya cargada (las de
+    ``agenda.catalogo``): validar la opción elegida no consulta la BD.
+    """
+
+    def __init__(self, *args, objetos=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.objetos = objetos
+
+    @property
+    def objetos(self):
+        return self._objetos
+
+    @objetos.setter
+    def objetos(self, objetos):
+        self._objetos = list(objetos)
+        self._por_id = {str(o.pk): o for o in self._objetos}
+        self.choices = [("", "---------")] + [(o.pk, str(o)) for o in self._objetos]
+
+    def prepare_value(self, value):
+        return getattr(value, "pk", value)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self._por_id[str(getattr(value, "pk", value))]
+        except KeyError:
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"], code="invalid_choice",
+                params={"value": value}) from None
+
+    def validate(self, value):
+        if self.required and value is None:
+            raise forms.ValidationError(self.error_messages["required"], code="required")
+
+
 class CitaForm(forms.ModelForm):
-    especialidad = forms.ModelChoiceField(
-        queryset=Especialidad.objects.all().order_by("nombre"),
+    especialidad = OpcionCatalogo(
         required=True,
         label="Especialidad",
         widget=forms.Select(
             attrs={"class": "form-select", "id": "id_especialidad"}),
     )
-    medico = forms.ModelChoiceField(
-        queryset=Medico.objects.none(),
+    medico = OpcionCatalogo(
         required=True,
         label="Médico",
         widget=forms.Select(attrs={"class": "form-select", "id": "id_medico"}),
@@ -170,15 +206,17 @@ class CitaForm(forms.ModelForm):
         if not esp_id and getattr(self.instance, "pk", None) and getattr(self.instance, "medico_id", None):
             esp_id = self.instance.medico.especialidad_id
 
+        # Opciones desde el catálogo cacheado: ni renderizar ni validar consultan la BD
+        self.fields["especialidad"].objetos = catalogo.especialidades()
         try:
-            if esp_id:
-                self.fields["medico"].queryset = Medico.objects.filter(
-                    especialidad_id=int(esp_id)).order_by("nombre")
-            else:
-                self.fields["medico"].queryset = Medico.objects.select_related(
-                    "especialidad").order_by("nombre")
+            self.fields["medico"].objetos = catalogo.medicos(int(esp_id) if esp_id else None)
         except (TypeError, ValueError):
-            self.fields["medico"].queryset = Medico.objects.none()
+            self.fields["medico"].objetos = []
+
+    def _get_validation_exclusions(self):
+        # El médico ya se validó contra el catálogo y ``clean`` revisa el
+        # choque de horario: la validación del modelo no vuelve a consultarlos
+        return super()._get_validation_exclusions() | {"medico"}
 
     def clean_fecha(self):
         fecha = self.cleaned_data.get("fecha")
@@ -187,20 +225,8 @@ class CitaForm(forms.ModelForm):
         hoy = timezone.localdate()
         if fecha < hoy:
             raise forms.ValidationError("La fecha no puede ser pasada.")
-        if fecha.weekday() >= 5:
-            raise forms.ValidationError("No se atiende sábados ni domingos.")
         return fecha
 
-    def clean_hora(self):
-        hora = self.cleaned_data.get("hora")
-        if not hora:
-            return hora
-        inicio, fin = time(9, 0), time(18, 0)
-        if not (inicio <= hora <= fin):
-            raise forms.ValidationError(
-                "La hora debe estar entre 09:00 y 18:00.")
-        return hora
-
     def clean(self):
         cleaned = super().clean()
         medico = cleaned.get("medico")
@@ -209,11 +235,21 @@ class CitaForm(forms.ModelForm):
         if not (medico and fecha and hora):
             return cleaned
 
+        # Mismo horario que ofrecen ajax_horas y horas_disponibles_para
+        bloques = horarios.bloques_para(medico.pk, fecha)
+        if not bloques:
+            self.add_error("fecha", "El médico no atiende ese día.")
+            return cleaned
+        if not any(b.hora == hora for b in bloques):
+            self.add_error("hora", "El médico no atiende en ese horario.")
+            return cleaned
+
         now = timezone.localtime()
         if fecha == now.date() and hora <= now.time():
             self.add_error("hora", "La hora seleccionada ya pasó.")
 
-        qs = Cita.objects.filter(medico=medico, fecha=fecha, hora=hora)
+        qs = Cita.objects.filter(medico=medico, fecha=fecha, hora=hora).exclude(
+            estado="cancelada")
         if self.instance and self.instance.pk:
             qs = qs.exclude(pk=self.instance.pk)
         if qs.exists():
@@ -228,3 +264,26 @@ class CitaForm(forms.ModelForm):
         if commit:
             cita.save()
         return cita
+
+
+class CancelacionLoteForm(forms.Form):
+    medico = forms.ModelChoiceField(
+        queryset=Medico.objects.select_related("especialidad").order_by("nombre"),
+        label="Médico",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    desde = forms.DateField(
+        label="Desde", widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}))
+    hasta = forms.DateField(
+        label="Hasta", widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}))
+    motivo = forms.CharField(
+        label="Motivo", max_length=200, required=False,
+        widget=forms.TextInput(attrs={"class": "form-control",
+                                      "placeholder": "Ej: Médico con licencia"}))
+
+    def clean(self):
+        cleaned = super().clean()
+        desde, hasta = cleaned.get("desde"), cleaned.get("hasta")
+        if desde and hasta and hasta < desde:
+            self.add_error("hasta", "La fecha final debe ser posterior a la inicial.")
+        return cleaned
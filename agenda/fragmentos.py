@@ -0,0 +1,77 @@
+"""
+Tablas de citas renderizadas una vez y servidas desde la caché.
+
+El listado del consultorio y las secciones de citas del perfil se guardan ya
+renderizados bajo la versión "citas" (cambia con cada alta, edición o
+cancelación, incluidas las operaciones masivas) y la de "catalogo" (nombres de
+médicos y especialidades), más una huella de los filtros. Una visita repetida
+no consulta la BD ni recorre la plantilla.
+
+El estado visible de una cita también depende del reloj (una cita agendada
+pasa a "atendida" cuando llega su hora), así que cada fragmento vence, a más
+tardar, al comenzar la próxima cita vigente que muestra.
+
+Con ``AGENDA_FRAGMENTOS=False`` (el valor por defecto con LocMemCache, que
+no se comparte entre procesos) se renderizan en cada petición.
+
+El token CSRF es por usuario: el fragmento se guarda con una marca en su lugar
+y se reemplaza por el token de la petición al servirlo.
+"""
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import cache as agenda_cache, routers
+
+TTL = 5 * 60
+MARCA_CSRF = "__agenda_csrf__"
+
+
+def anotar_estados(citas, ahora=None):
+    """Fija ``estado_ui`` de todas las filas con una sola lectura del reloj."""
+    ahora = timezone.localtime(ahora)
+    for c in citas:
+        c._estado_ui = c.estado_ui_en(ahora)
+    return citas
+
+
+def vence(citas, ahora):
+    """Inicio de la primera cita vigente aún no ocurrida (o None)."""
+    futuras = [c.inicio for c in citas
+               if c.estado != "cancelada" and c.inicio and c.inicio > ahora]
+    return min(futuras, default=None)
+
+
+def clave(nombre: str, *partes) -> str:
+    huella = hashlib.sha1(repr(partes).encode()).hexdigest()
+    return agenda_cache.clave(
+        "citas", "fragmento", nombre, agenda_cache.version("catalogo"), huella)
+
+
+def renderizar(request, clave: str, plantilla: str, construir) -> str:
+    """
+    HTML del fragmento ``plantilla`` para ``request``. En un fallo de caché
+    llama a ``construir()``, que devuelve ``(contexto, vence)``.
+    """
+    if not getattr(settings, "AGENDA_FRAGMENTOS", False):
+        ctx, _ = construir()
+        ctx["csrf_token"] = get_token(request)
+        return mark_safe(render_to_string(plantilla, ctx))
+    html = cache.get(clave)
+    if html is None:
+        ctx, hasta = construir()
+        ctx["csrf_token"] = MARCA_CSRF
+        html = render_to_string(plantilla, ctx)
+        ttl = TTL
+        if hasta is not None:
+            restante = (hasta - timezone.now()).total_seconds()
+            ttl = max(1, min(TTL, math.ceil(restante)))
+        if routers.cacheable("citas"):
+            cache.set(clave, html, ttl)
+    return mark_safe(html.replace(MARCA_CSRF, get_token(request)))
@@ -0,0 +1,54 @@
+"""
+Hashers de contraseñas con el costo tomado de settings.
+
+Conservan el ``algorithm`` de los de Django, así que verifican los hashes ya
+guardados. Cada uno compara en ``must_update`` los parámetros del hash con los
+actuales, y ``User.check_password`` rehace el hash cuando no coinciden: al
+cambiar el algoritmo preferido (``AGENDA_HASHER``) o sus parámetros, cada
+usuario pasa al nuevo costo en su siguiente login. Los parámetros se leen
+de settings en cada uso (no al importar), así que ``override_settings`` los
+cambia sin recargar el módulo. El comando ``bench_hashers`` mide el costo en
+el hardware actual y sugiere valores.
+"""
+import base64
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher,
+)
+
+
+def _ajuste(nombre: str, defecto):
+    return property(lambda self: getattr(settings, nombre, defecto))
+
+
+class PBKDF2Hasher(PBKDF2PasswordHasher):
+    iterations = _ajuste("AGENDA_HASH_PBKDF2_ITERACIONES", PBKDF2PasswordHasher.iterations)
+
+
+class ScryptHasher(ScryptPasswordHasher):
+    work_factor = _ajuste("AGENDA_HASH_SCRYPT_N", ScryptPasswordHasher.work_factor)
+    block_size = _ajuste("AGENDA_HASH_SCRYPT_R", ScryptPasswordHasher.block_size)
+    parallelism = _ajuste("AGENDA_HASH_SCRYPT_P", ScryptPasswordHasher.parallelism)
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        # Igual que el de Django, pero con el límite de memoria según los
+        # parámetros del hash (scrypt usa 128·N·r·p bytes y el límite por
+        # defecto de OpenSSL, 32 MiB, no alcanza desde N=2**15 con r=8)
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            maxmem=2 * 128 * n * r * p, dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode("ascii").strip()
+        return "%s$%d$%s$%d$%d$%s" % (self.algorithm, n, salt, r, p, hash_)
+
+
+class Argon2Hasher(Argon2PasswordHasher):
+    time_cost = _ajuste("AGENDA_HASH_ARGON2_TIEMPO", Argon2PasswordHasher.time_cost)
+    memory_cost = _ajuste("AGENDA_HASH_ARGON2_MEMORIA", Argon2PasswordHasher.memory_cost)
+    parallelism = _ajuste("AGENDA_HASH_ARGON2_HILOS", Argon2PasswordHasher.parallelism)
@@ -0,0 +1,183 @@
+"""
+Motor de horarios: única definición de los bloques que ofrece cada médico.
+
+Una plantilla (días + ventanas + paso) se compila una sola vez en un vector
+inmutable de ``Bloque``; por médico se cachea qué plantilla usa y sus
+excepciones, y los feriados se cachean aparte. Resolver los bloques de una
+fecha cuesta un par de lecturas de caché, sin bucles de ``datetime.combine``.
+"""
+from collections import namedtuple
+from datetime import time
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import cache as agenda_cache
+from .disponibilidad import PASO_MIN
+from .models import ExcepcionHorario, Feriado, Medico
+
+DIAS_ESTANDAR = "01234"
+VENTANAS_ESTANDAR = "09:00-13:00,15:00-19:00"
+
+Bloque = namedtuple("Bloque", "bit hora etiqueta")
+
+_TTL = 60 * 60
+
+
+def _parse_hora(texto: str) -> int:
+    h, m = texto.strip().split(":")
+    h, m = int(h), int(m)
+    if not (0 <= h <= 24 and 0 <= m < 60) or h * 60 + m > 24 * 60:
+        raise ValueError(texto)
+    return h * 60 + m
+
+
+def _parse_ventanas(ventanas: str):
+    rangos = []
+    for parte in ventanas.split(","):
+        if not parte.strip():
+            continue
+        ini, fin = parte.split("-")
+        rangos.append((_parse_hora(ini), _parse_hora(fin)))
+    return rangos
+
+
+def validar_ventanas(ventanas: str, paso_min: int = PASO_MIN) -> None:
+    try:
+        rangos = _parse_ventanas(ventanas)
+    except ValueError as e:
+        raise ValidationError(
+            {"ventanas": 'Formato esperado: "09:00-13:00,15:00-19:00".'}) from e
+    for ini, fin in rangos:
+        if ini >= fin or ini % PASO_MIN:
+            raise ValidationError(
+                {"ventanas": f"Rango inválido o no alineado a {PASO_MIN} minutos."})
+        # Si no, el último bloque terminaría después del fin de la ventana
+        if (fin - ini) % paso_min:
+            raise ValidationError(
+                {"ventanas": f"La ventana {ini // 60:02d}:{ini % 60:02d}-"
+                             f"{fin // 60:02d}:{fin % 60:02d} no es múltiplo de "
+                             f"{paso_min} minutos."})
+
+
+@lru_cache(maxsize=256)
+def compilar(ventanas: str, paso_min: int = PASO_MIN) -> tuple:
+    """Vector ordenado e inmutable de bloques para unas ventanas y un paso."""
+    minutos = set()
+    for ini, fin in _parse_ventanas(ventanas):
+        minutos.update(range(ini, fin, paso_min))
+    return tuple(
+        Bloque(m // PASO_MIN, time(m // 60, m % 60), f"{m // 60:02d}:{m % 60:02d}")
+        for m in sorted(minutos) if m % PASO_MIN == 0
+    )
+
+
+def _feriados() -> frozenset:
+    return agenda_cache.obtener(
+        "horarios", ("feriados",),
+        lambda: frozenset(Feriado.objects.values_list("fecha", flat=True)), _TTL)
+
+
+def _empaquetar(fila, excepciones: dict):
+    dias, ventanas, paso = fila
+    if ventanas is None:
+        dias, ventanas, paso = DIAS_ESTANDAR, VENTANAS_ESTANDAR, PASO_MIN
+    return (frozenset(int(d) for d in dias), ventanas, paso, excepciones)
+
+
+def _consulta_medico(medico_id: int):
+    return (
+        Medico.objects.filter(pk=medico_id)
+        .values_list("plantilla__dias", "plantilla__ventanas", "plantilla__paso_min")
+    )
+
+
+def _agenda_medico(medico_id: int):
+    """(dias, ventanas, paso, {fecha: ventanas}) del médico, o None si no existe."""
+    def cargar():
+        fila = _consulta_medico(medico_id).first()
+        if fila is None:
+            return None
+        excepciones = dict(
+            ExcepcionHorario.objects.filter(medico_id=medico_id)
+            .values_list("fecha", "ventanas")
+        )
+        return _empaquetar(fila, excepciones)
+
+    return agenda_cache.obtener("horarios", ("medico", medico_id), cargar, _TTL)
+
+
+def _resolver(datos, feriados, fecha) -> tuple:
+    if datos is None or fecha in feriados:
+        return ()
+    dias, ventanas, paso, excepciones = datos
+    if fecha in excepciones:
+        return compilar(excepciones[fecha], paso) if excepciones[fecha] else ()
+    if fecha.weekday() not in dias:
+        return ()
+    return compilar(ventanas, paso)
+
+
+def bloques_para(medico_id: int, fecha) -> tuple:
+    """Bloques de atención del médico en la fecha (vacío si no atiende)."""
+    return _resolver(_agenda_medico(medico_id), _feriados(), fecha)
+
+
+def atiende(medico_id: int, fecha, hora: time) -> bool:
+    return any(b.hora == hora for b in bloques_para(medico_id, fecha))
+
+
+def _filtrar(bloques, fecha, mapa, ahora) -> list:
+    if not bloques:
+        return []
+    ahora = ahora or timezone.localtime()
+    if fecha < ahora.date():
+        return []
+    hora_min = ahora.time() if fecha == ahora.date() else None
+    return [
+        b for b in bloques
+        if not (mapa >> b.bit) & 1 and (hora_min is None or b.hora > hora_min)
+    ]
+
+
+def libres(medico_id: int, fecha, mapa: int = 0, ahora=None) -> list:
+    """
+    Bloques libres según el mapa de ocupación. Si la fecha es hoy se
+    descartan los bloques que ya pasaron.
+    """
+    return _filtrar(bloques_para(medico_id, fecha), fecha, mapa, ahora)
+
+
+# ---- Variantes async (vistas AJAX bajo ASGI) ----
+
+async def _aferiados() -> frozenset:
+    async def cargar():
+        return frozenset([f async for f in Feriado.objects.values_list("fecha", flat=True)])
+
+    return await agenda_cache.aobtener("horarios", ("feriados",), cargar, _TTL)
+
+
+async def _aagenda_medico(medico_id: int):
+    async def cargar():
+        fila = await _consulta_medico(medico_id).afirst()
+        if fila is None:
+            return None
+        excepciones = {
+            f: v async for f, v in
+            ExcepcionHorario.objects.filter(medico_id=medico_id).values_list("fecha", "ventanas")
+        }
+        return _empaquetar(fila, excepciones)
+
+    return await agenda_cache.aobtener("horarios", ("medico", medico_id), cargar, _TTL)
+
+
+async def alibres_rango(medico_id: int, fechas, mapas: dict, ahora=None) -> dict:
+    """{fecha: [Bloque libre]} para varias fechas con una sola lectura de la agenda."""
+    datos = await _aagenda_medico(medico_id)
+    feriados = await _aferiados()
+    ahora = ahora or timezone.localtime()
+    return {
+        f: _filtrar(_resolver(datos, feriados, f), f, mapas.get(f, 0), ahora)
+        for f in fechas
+    }
@@ -0,0 +1,130 @@
+"""
+Registro de consultas SQL por vista.
+
+``medir()`` envuelve la conexión con ``execute_wrapper`` y anota cada
+consulta (SQL, duración). ``agenda.middleware.PresupuestoConsultasMiddleware``
+guarda una muestra por petición en ``REGISTRO``, un almacén en memoria que
+conserva las últimas ``AGENDA_INSTRUMENTACION_MUESTRAS`` peticiones por
+nombre de URL y se vuelca como JSON o CSV (comando ``reporte_consultas``).
+"""
+import csv
+import io
+import json
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_LISTAS = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+
+
+def huella(sql: str) -> str:
+    """SQL sin literales ni listas IN variables, para agrupar consultas repetidas."""
+    sql = _LITERALES.sub("?", sql)
+    sql = _LISTAS.sub("(…)", sql)
+    return " ".join(sql.split())
+
+
+class Medicion:
+    def __init__(self):
+        self.consultas = []  # [(sql, ms)]
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((sql, (time.perf_counter() - t0) * 1000))
+
+    @property
+    def total(self) -> int:
+        return len(self.consultas)
+
+    @property
+    def tiempo_ms(self) -> float:
+        return sum(ms for _, ms in self.consultas)
+
+    def duplicadas(self) -> dict:
+        """{huella: veces} de las consultas que se repiten (candidatas a N+1)."""
+        conteo = Counter(huella(sql) for sql, _ in self.consultas)
+        return {h: n for h, n in conteo.items() if n > 1}
+
+
+@contextmanager
+def medir(using=None):
+    """Mide las consultas de todas las conexiones (o solo de ``using``)."""
+    medicion = Medicion()
+    alias = [using] if using else list(connections)
+    with _envolver(alias, medicion):
+        yield medicion
+
+
+@contextmanager
+def _envolver(alias, medicion):
+    if not alias:
+        yield
+        return
+    with connections[alias[0]].execute_wrapper(medicion):
+        with _envolver(alias[1:], medicion):
+            yield
+
+
+class Registro:
+    def __init__(self, maximo: int = 200):
+        self.maximo = maximo
+        self._muestras = defaultdict(lambda: deque(maxlen=self.maximo))
+        self._lock = threading.Lock()
+
+    def agregar(self, vista: str, medicion: Medicion) -> None:
+        muestra = {
+            "consultas": medicion.total,
+            "tiempo_ms": round(medicion.tiempo_ms, 3),
+            "duplicadas": medicion.duplicadas(),
+        }
+        with self._lock:
+            self._muestras[vista].append(muestra)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._muestras.clear()
+
+    def resumen(self) -> list:
+        with self._lock:
+            copia = {v: list(m) for v, m in self._muestras.items()}
+        filas = []
+        for vista, muestras in sorted(copia.items()):
+            duplicadas = Counter()
+            for m in muestras:
+                duplicadas.update(m["duplicadas"])
+            n = len(muestras)
+            filas.append({
+                "vista": vista,
+                "peticiones": n,
+                "consultas_prom": round(sum(m["consultas"] for m in muestras) / n, 2),
+                "consultas_max": max(m["consultas"] for m in muestras),
+                "tiempo_ms_prom": round(sum(m["tiempo_ms"] for m in muestras) / n, 3),
+                "duplicadas": dict(duplicadas.most_common(10)),
+            })
+        return filas
+
+    def como_json(self) -> str:
+        return json.dumps(self.resumen(), ensure_ascii=False, indent=2)
+
+    def como_csv(self) -> str:
+        salida = io.StringIO()
+        w = csv.writer(salida)
+        w.writerow(["vista", "peticiones", "consultas_prom", "consultas_max",
+                    "tiempo_ms_prom", "duplicadas"])
+        for f in self.resumen():
+            w.writerow([f["vista"], f["peticiones"], f["consultas_prom"],
+                        f["consultas_max"], f["tiempo_ms_prom"],
+                        sum(f["duplicadas"].values())])
+        return salida.getvalue()
+
+
+REGISTRO = Registro(getattr(settings, "AGENDA_INSTRUMENTACION_MUESTRAS", 200))
@@ -0,0 +1,103 @@
+"""
+KPIs del panel de staff.
+
+Cada contador es un ``Q`` sobre ``Cita`` con la ventana de fechas que
+necesita; ``calcular`` los resuelve todos en un único ``aggregate`` con
+agregación condicional, restringido a la unión de las ventanas para que use
+el índice por fecha. Los KPIs derivados (tasas) se calculan sobre esos
+contadores sin ir a la BD, y el resultado se cachea hasta que cambie una cita.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import cache as agenda_cache
+from .models import Cita
+
+TTL = 60
+
+# nombre -> fn(hoy) -> (Q, (desde, hasta))
+CONTADORES = {}
+# nombre -> fn(contadores) -> valor
+DERIVADOS = {}
+
+
+def contador(nombre):
+    def registrar(fn):
+        CONTADORES[nombre] = fn
+        return fn
+    return registrar
+
+
+def derivado(nombre):
+    def registrar(fn):
+        DERIVADOS[nombre] = fn
+        return fn
+    return registrar
+
+
+@contador("hoy")
+def _hoy(hoy):
+    return Q(fecha=hoy), (hoy, hoy)
+
+
+@contador("semana")
+def _semana(hoy):
+    fin = hoy + timedelta(days=7)
+    return Q(fecha__range=(hoy, fin)), (hoy, fin)
+
+
+@contador("canceladas_hoy")
+def _canceladas_hoy(hoy):
+    return Q(fecha=hoy, estado="cancelada"), (hoy, hoy)
+
+
+@contador("canceladas_semana")
+def _canceladas_semana(hoy):
+    fin = hoy + timedelta(days=7)
+    return Q(fecha__range=(hoy, fin), estado="cancelada"), (hoy, fin)
+
+
+@derivado("tasa_cancelacion_semana")
+def _tasa_cancelacion(c):
+    return round(100 * c["canceladas_semana"] / c["semana"], 1) if c["semana"] else 0.0
+
+
+def _contadores(hoy) -> dict:
+    definiciones = {n: fn(hoy) for n, fn in CONTADORES.items()}
+    desde = min(r[0] for _, r in definiciones.values())
+    hasta = max(r[1] for _, r in definiciones.values())
+    return Cita.objects.filter(fecha__range=(desde, hasta)).aggregate(
+        **{n: Count("id", filter=q) for n, (q, _) in definiciones.items()}
+    )
+
+
+def _carga_especialidad(hoy):
+    fin = hoy + timedelta(days=7)
+    return list(
+        Cita.objects.filter(fecha__range=(hoy, fin))
+        .exclude(estado="cancelada")
+        .values("medico__especialidad__nombre")
+        .annotate(total=Count("id"))
+        .order_by("-total")
+    )
+
+
+def calcular(hoy=None) -> dict:
+    """
+    {"contadores": {...}, "carga_especialidad": [...]}, cacheado por día y
+    por versión de "citas" (la invalidan las señales de ``Cita``).
+    """
+    hoy = hoy or timezone.localdate()
+
+    def cargar():
+        contadores = _contadores(hoy)
+        for nombre, fn in DERIVADOS.items():
+            contadores[nombre] = fn(contadores)
+        return {
+            "contadores": contadores,
+            "carga_especialidad": _carga_especialidad(hoy),
+        }
+
+    return agenda_cache.obtener("citas", ("kpis", hoy.isoformat()), cargar, TTL)
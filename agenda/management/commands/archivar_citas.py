@@ -0,0 +1,41 @@
+import time as reloj
+
+from django.core.management.base import BaseCommand
+
+from agenda import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve a CitaArchivada las citas anteriores al horizonte "
+        "(AGENDA_ARCHIVO_DIAS) en lotes transaccionales. Se puede "
+        "interrumpir y volver a ejecutar: continúa donde quedó."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None,
+                            help=f"Horizonte en días (por defecto {archivo.DIAS}).")
+        parser.add_argument("--lote", type=int, default=5000)
+        parser.add_argument("--max-lotes", type=int, default=None,
+                            help="Detenerse tras N lotes (p. ej. en ventanas de mantención).")
+        parser.add_argument("--pausa", type=float, default=0.0,
+                            help="Segundos de espera entre lotes para no saturar la BD.")
+        parser.add_argument("--simular", action="store_true",
+                            help="Solo informa cuántas citas se archivarían.")
+
+    def handle(self, *args, **opts):
+        hasta = archivo.corte(opts["dias"])
+        if opts["simular"]:
+            n = archivo.pendientes(hasta).count()
+            self.stdout.write(f"Se archivarían {n} cita(s) anteriores a {hasta:%Y-%m-%d %H:%M}.")
+            return
+
+        t0, total = reloj.perf_counter(), 0
+        for n in archivo.archivar(hasta, opts["lote"], opts["max_lotes"]):
+            total += n
+            self.stdout.write(f"  lote de {n} (acumulado {total})")
+            if opts["pausa"]:
+                reloj.sleep(opts["pausa"])
+        seg = reloj.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} cita(s) archivadas en {seg:.1f} s."))
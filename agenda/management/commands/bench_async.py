@@ -0,0 +1,131 @@
+import asyncio
+import random
+import time as reloj
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from agenda import horarios
+from agenda.models import Medico, User
+from agenda.utils import percentil
+
+EMAIL_PACIENTE = "bench-paciente@medidate.test"
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispara muchas peticiones concurrentes del selector de fecha "
+        "(ajax_horas / ajax_disponibilidad) contra un servidor ya levantado y "
+        "mide throughput y latencia. Córrelo contra uvicorn (ASGI, con "
+        "AGENDA_AJAX_ASYNC=True) y contra el servidor WSGI para compararlos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000",
+                            help="Base del servidor a medir.")
+        parser.add_argument("--peticiones", type=int, default=5000)
+        parser.add_argument("--concurrencia", type=int, default=1000)
+        parser.add_argument("--endpoint", choices=["horas", "disponibilidad", "mixto"],
+                            default="horas")
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--semilla", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        destino = urlsplit(opts["url"])
+        if destino.scheme != "http" or not destino.hostname:
+            raise CommandError("Solo se admite http://host[:puerto].")
+        medico = Medico.objects.filter(citas__isnull=False).order_by("id").first() \
+            or Medico.objects.order_by("id").first()
+        if medico is None:
+            raise CommandError("No hay médicos: usa seed o seed_bulk.")
+
+        rutas = self._rutas(medico, opts)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self._sesion()}"
+        resultado = asyncio.run(self._disparar(
+            destino.hostname, destino.port or 80, rutas, cookie, opts))
+
+        tiempos, estados, errores, seg = resultado
+        ok = estados.get(200, 0)
+        self.stdout.write(
+            f"{len(rutas)} peticiones, concurrencia {opts['concurrencia']}, "
+            f"{seg:.2f} s -> {len(rutas) / seg:,.0f} req/s ({ok} con 200)")
+        self.stdout.write(
+            f"latencia p50={percentil(tiempos, 50):.1f}  p95={percentil(tiempos, 95):.1f}  "
+            f"p99={percentil(tiempos, 99):.1f} ms")
+        otros = {k: v for k, v in estados.items() if k != 200}
+        if otros or errores:
+            self.stdout.write(self.style.WARNING(f"otros estados: {otros}  errores: {errores}"))
+
+    # ---------------------------------------------------------------
+    def _sesion(self) -> str:
+        """Sesión ya autenticada del usuario de benchmark (sin pasar por el login)."""
+        user, _ = User.objects.get_or_create(email=EMAIL_PACIENTE)
+        sesion = SessionStore()
+        sesion[SESSION_KEY] = str(user.pk)
+        sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sesion[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        sesion.create()
+        return sesion.session_key
+
+    def _rutas(self, medico, opts) -> list:
+        rnd = random.Random(opts["semilla"])
+        hoy = timezone.localdate()
+        fechas = [hoy + timedelta(days=i) for i in range(60)
+                  if horarios.bloques_para(medico.pk, hoy + timedelta(days=i))] or [hoy]
+        horas = reverse("agenda:ajax_horas")
+        rango = reverse("agenda:ajax_disponibilidad")
+        rutas = []
+        for _ in range(opts["peticiones"]):
+            tipo = opts["endpoint"]
+            if tipo == "mixto":
+                tipo = rnd.choice(["horas", "horas", "horas", "disponibilidad"])
+            if tipo == "horas":
+                q = {"medico": medico.pk, "fecha": rnd.choice(fechas).isoformat()}
+                rutas.append(f"{horas}?{urlencode(q)}")
+            else:
+                desde = hoy.replace(day=1)
+                q = {"medico": medico.pk, "desde": desde.isoformat(),
+                     "hasta": (desde + timedelta(days=41)).isoformat()}
+                rutas.append(f"{rango}?{urlencode(q)}")
+        return rutas
+
+    async def _disparar(self, host, puerto, rutas, cookie, opts):
+        semaforo = asyncio.Semaphore(opts["concurrencia"])
+        tiempos, estados, errores = [], {}, {}
+
+        async def una(ruta):
+            async with semaforo:
+                t0 = reloj.perf_counter()
+                try:
+                    estado = await asyncio.wait_for(
+                        self._get(host, puerto, ruta, cookie), opts["timeout"])
+                except (OSError, asyncio.TimeoutError) as e:
+                    nombre = type(e).__name__
+                    errores[nombre] = errores.get(nombre, 0) + 1
+                    return
+                tiempos.append((reloj.perf_counter() - t0) * 1000)
+                estados[estado] = estados.get(estado, 0) + 1
+
+        t0 = reloj.perf_counter()
+        await asyncio.gather(*(una(r) for r in rutas))
+        return tiempos, estados, errores, reloj.perf_counter() - t0
+
+    @staticmethod
+    async def _get(host, puerto, ruta, cookie) -> int:
+        lector, escritor = await asyncio.open_connection(host, puerto)
+        try:
+            escritor.write(
+                f"GET {ruta} HTTP/1.1\r\nHost: {host}:{puerto}\r\n"
+                f"Cookie: {cookie}\r\nConnection: close\r\n\r\n".encode())
+            await escritor.drain()
+            estado = await lector.readline()
+            await lector.read()
+            return int(estado.split()[1]) if estado else 0
+        finally:
+            escritor.close()
@@ -0,0 +1,93 @@
+import statistics
+import time as reloj
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from agenda.hashers import Argon2Hasher, PBKDF2Hasher, ScryptHasher
+
+# algoritmo -> (clase, [(parámetros, variables de entorno)], (parámetro, mínimo sugerido))
+# Los mínimos son los de la guía de OWASP para almacenamiento de contraseñas.
+ESCALAS = {
+    "pbkdf2": (PBKDF2Hasher, [
+        ({"iterations": n}, {"AGENDA_HASH_PBKDF2_ITERACIONES": n})
+        for n in (100_000, 200_000, 310_000, 600_000, 870_000, 1_000_000, 1_500_000)
+    ], ("iterations", 600_000)),
+    "scrypt": (ScryptHasher, [
+        ({"work_factor": 2 ** e}, {"AGENDA_HASH_SCRYPT_N": 2 ** e, "AGENDA_HASH_SCRYPT_R": 8,
+                                   "AGENDA_HASH_SCRYPT_P": 1})
+        for e in (14, 15, 16, 17)
+    ], ("work_factor", 2 ** 17)),
+    "argon2": (Argon2Hasher, [
+        ({"time_cost": t, "memory_cost": m, "parallelism": 1},
+         {"AGENDA_HASH_ARGON2_TIEMPO": t, "AGENDA_HASH_ARGON2_MEMORIA": m,
+          "AGENDA_HASH_ARGON2_HILOS": 1})
+        for t, m in ((2, 19_456), (2, 47_104), (3, 65_536), (2, 102_400), (4, 102_400))
+    ], ("memory_cost", 19_456)),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide en este hardware cuánto tarda un hash de contraseña con cada "
+        "algoritmo y costo, y sugiere los parámetros más altos que quedan bajo "
+        "--objetivo-ms (el login hace un hash por intento, así que ese tiempo "
+        "limita los logins por segundo y por núcleo)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--objetivo-ms", type=float, default=100.0,
+                            help="Tiempo máximo aceptable por hash.")
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--algoritmos", nargs="+", choices=list(ESCALAS),
+                            default=list(ESCALAS))
+
+    def handle(self, *args, **opts):
+        actual = get_hasher()
+        self.stdout.write(
+            f"Preferido ahora: {settings.AGENDA_HASHER} ({actual.algorithm}) -> "
+            f"{self._medir(actual, opts['repeticiones']):.1f} ms por hash")
+
+        sugerencias = []
+        for nombre in opts["algoritmos"]:
+            clase, escala, (clave, minimo) = ESCALAS[nombre]
+            if nombre == "argon2" and find_spec("argon2") is None:
+                self.stdout.write("argon2: argon2-cffi no está instalado, se omite.")
+                continue
+            self.stdout.write(f"\n{nombre}:")
+            elegido = None
+            for params, env in escala:
+                # Los hashers leen su costo de settings en cada uso
+                with override_settings(**env):
+                    ms = self._medir(clase(), opts["repeticiones"])
+                bajo = ms <= opts["objetivo_ms"]
+                if bajo:
+                    elegido = (env, ms, params[clave] >= minimo)
+                texto = ", ".join(f"{k}={v}" for k, v in params.items())
+                self.stdout.write(
+                    f"  {texto:<45} {ms:8.1f} ms  ~{1000 / ms:6.1f} logins/s por núcleo"
+                    f"{'' if bajo else '  (sobre el objetivo)'}")
+            if elegido:
+                sugerencias.append((nombre, *elegido))
+
+        if not sugerencias:
+            raise CommandError(
+                f"Ningún costo quedó bajo {opts['objetivo_ms']} ms; sube --objetivo-ms.")
+        self.stdout.write(f"\nSugerencias (objetivo {opts['objetivo_ms']:.0f} ms por hash):")
+        for nombre, env, ms, suficiente in sugerencias:
+            variables = " ".join(f"{k}={v}" for k, v in env.items())
+            aviso = "" if suficiente else "  ¡bajo el mínimo recomendado por OWASP!"
+            self.stdout.write(f"  AGENDA_HASHER={nombre} {variables}  ({ms:.1f} ms){aviso}")
+
+    @staticmethod
+    def _medir(hasher, repeticiones) -> float:
+        salt = hasher.salt()
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = reloj.perf_counter()
+            hasher.encode("clave-de-prueba-123", salt)
+            tiempos.append((reloj.perf_counter() - t0) * 1000)
+        return statistics.median(tiempos)
@@ -0,0 +1,100 @@
+import random
+import time as reloj
+import uuid
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agenda import disponibilidad, horarios
+from agenda.models import Cita, Especialidad, Medico, Paciente, User
+from agenda.utils import percentil, revertido
+
+
+def _libres_por_consulta(medico_id, fecha):
+    """Camino anterior de ajax_horas: escanea las citas del día y formatea cada bloque."""
+    base = [time(h, mm) for h in range(9, 17) for mm in (0, 30)]
+    ocupadas = {
+        t.strftime("%H:%M")
+        for t in Cita.objects.filter(medico_id=medico_id, fecha=fecha)
+        .exclude(estado="cancelada")
+        .values_list("hora", flat=True)
+    }
+    return [t.strftime("%H:%M") for t in base if t.strftime("%H:%M") not in ocupadas]
+
+
+def _libres_por_indice(medico_id, fecha):
+    mapa = disponibilidad.ocupacion(medico_id, fecha)
+    return [b.etiqueta for b in horarios.libres(medico_id, fecha, mapa)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia p50/p99 de las horas libres (consulta a Cita vs. "
+        "índice de ocupación). Con --citas genera datos sintéticos dentro de "
+        "una transacción que se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--citas", type=int, default=0,
+                            help="Citas sintéticas a cargar (p. ej. 1000000).")
+        parser.add_argument("--medicos", type=int, default=200)
+        parser.add_argument("--peticiones", type=int, default=2000)
+        parser.add_argument("--semilla", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        with revertido():
+            if opts["citas"]:
+                self._cargar(opts["citas"], opts["medicos"])
+            self._medir(opts["peticiones"], opts["semilla"])
+
+    def _cargar(self, total, n_medicos):
+        self.stdout.write(f"Cargando {total} citas sintéticas…")
+        etiqueta = uuid.uuid4().hex[:8]
+        esp = Especialidad.objects.create(nombre=f"bench-{etiqueta}")
+        medicos = Medico.objects.bulk_create(
+            [Medico(nombre=f"Bench {i}", especialidad=esp) for i in range(n_medicos)])
+        user = User.objects.create_user(
+            email=f"bench-{etiqueta}@medidate.test")
+        paciente = Paciente.objects.get(user=user)
+
+        horas = [b.hora for b in horarios.compilar(horarios.VENTANAS_ESTANDAR)]
+        lote, creadas, fecha = [], 0, timezone.localdate()
+        while creadas < total:
+            fecha += timedelta(days=1)
+            if fecha.weekday() >= 5:
+                continue
+            for m in medicos:
+                for h in horas:
+                    lote.append(Cita(paciente=paciente, medico=m, fecha=fecha, hora=h,
+                                     inicio=Cita.inicio_de(fecha, h)))
+                    creadas += 1
+                    if creadas >= total:
+                        break
+                if creadas >= total:
+                    break
+            if len(lote) >= 10000:
+                Cita.objects.bulk_create(lote, batch_size=10000)
+                lote = []
+        Cita.objects.bulk_create(lote, batch_size=10000)
+        disponibilidad.reconstruir()
+
+    def _medir(self, peticiones, semilla):
+        muestras = list(
+            Cita.objects.values_list("medico_id", "fecha").distinct()[:5000])
+        if not muestras:
+            self.stderr.write("No hay citas: usa --citas N.")
+            return
+        rnd = random.Random(semilla)
+        pares = [rnd.choice(muestras) for _ in range(peticiones)]
+
+        for nombre, fn in (("consulta", _libres_por_consulta),
+                           ("indice", _libres_por_indice)):
+            tiempos = []
+            for med, fecha in pares:
+                t0 = reloj.perf_counter()
+                fn(med, fecha)
+                tiempos.append((reloj.perf_counter() - t0) * 1000)
+            self.stdout.write(
+                f"{nombre:>9}: p50={percentil(tiempos, 50):.3f} ms  "
+                f"p99={percentil(tiempos, 99):.3f} ms  (n={len(tiempos)})")
@@ -0,0 +1,97 @@
+import random
+import time as reloj
+import uuid
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from agenda.models import User
+from agenda.utils import percentil, revertido
+
+CLAVE = "bench-clave-123"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el camino de login: búsqueda del usuario (email__iexact vs. "
+        "índice sobre LOWER(email)) y authenticate() completo con aciertos, "
+        "claves erróneas y emails inexistentes. Con --usuarios genera usuarios "
+        "sintéticos dentro de una transacción que se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--usuarios", type=int, default=0,
+                            help="Usuarios sintéticos a cargar (p. ej. 1000000).")
+        parser.add_argument("--intentos", type=int, default=500)
+        parser.add_argument("--lote", type=int, default=10000)
+        parser.add_argument("--semilla", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        with revertido():
+            if opts["usuarios"]:
+                self._cargar(opts["usuarios"], opts["lote"])
+            self._medir(opts["intentos"], opts["semilla"])
+
+    def _cargar(self, total, lote):
+        self.stdout.write(f"Cargando {total} usuarios sintéticos…")
+        etiqueta = uuid.uuid4().hex[:8]
+        # Un solo hash para todos: calcularlo por usuario tardaría horas
+        clave = make_password(CLAVE)
+        for inicio in range(0, total, lote):
+            User.objects.bulk_create([
+                User(email=f"bench{i}.{etiqueta}@login.medidate.test", password=clave)
+                for i in range(inicio, min(inicio + lote, total))
+            ])
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cur:
+                cur.execute(f"ANALYZE {User._meta.db_table}")
+
+    def _medir(self, intentos, semilla):
+        rnd = random.Random(semilla)
+        ids = list(User.objects.order_by("?").values_list("email", flat=True)[:intentos])
+        if not ids:
+            self.stderr.write("No hay usuarios: usa --usuarios N.")
+            return
+        total = User.objects.count()
+        self.stdout.write(f"{total} usuarios en la tabla")
+        # El usuario escribe su email con otras mayúsculas
+        emails = [rnd.choice(ids).upper() for _ in range(intentos)]
+
+        self.stdout.write("Búsqueda del usuario:")
+        for nombre, buscar in (
+            ("iexact", lambda e: User.objects.filter(email__iexact=e).first()),
+            ("lower (índice)", lambda e: User.objects.por_email(e).first()),
+        ):
+            tiempos = self._tiempos(buscar, emails)
+            self.stdout.write(
+                f"  {nombre:>15}: p50={percentil(tiempos, 50):.3f} ms  "
+                f"p99={percentil(tiempos, 99):.3f} ms")
+
+        self.stdout.write("authenticate():")
+        # Solo los usuarios sintéticos tienen una clave conocida
+        sinteticos = [e.upper() for e in ids if e.endswith("@login.medidate.test")]
+        casos = [
+            ("clave incorrecta", emails, "otra-clave"),
+            ("email inexistente", [f"nadie{i}@login.medidate.test" for i in range(intentos)], CLAVE),
+        ]
+        if sinteticos:
+            casos.insert(0, ("acierto", [rnd.choice(sinteticos) for _ in range(intentos)], CLAVE))
+        for nombre, lista, clave in casos:
+            inicio = reloj.perf_counter()
+            tiempos = self._tiempos(
+                lambda e, clave=clave: authenticate(None, username=e, password=clave), lista)
+            seg = reloj.perf_counter() - inicio
+            self.stdout.write(
+                f"  {nombre:>17}: p50={percentil(tiempos, 50):.2f} ms  "
+                f"p99={percentil(tiempos, 99):.2f} ms  ({len(lista) / seg:,.0f} logins/s por proceso)")
+
+    @staticmethod
+    def _tiempos(fn, valores) -> list:
+        tiempos = []
+        for v in valores:
+            t0 = reloj.perf_counter()
+            fn(v)
+            tiempos.append((reloj.perf_counter() - t0) * 1000)
+        return tiempos
@@ -0,0 +1,265 @@
+import json
+import os
+import platform
+import subprocess
+import time as reloj
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from agenda import cache as agenda_cache, disponibilidad, horarios, reservas
+from agenda.instrumentacion import medir
+from agenda.models import Cita, Medico, User
+from agenda.utils import percentil, revertido
+
+EMAIL_PACIENTE = "bench-paciente@medidate.test"
+EMAIL_STAFF = "bench-staff@medidate.test"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50/p95/p99), consultas y memoria asignada de las vistas "
+        "de agenda con el cliente de pruebas. Guarda cada corrida en un "
+        "historial JSON y compara corridas para detectar regresiones. Los "
+        "usuarios de prueba y las citas que crean los escenarios de "
+        "cancelación se revierten al terminar cada escenario."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteraciones", type=int, default=50)
+        parser.add_argument("--calentamiento", type=int, default=5)
+        parser.add_argument("--historial", default="bench_history.json")
+        parser.add_argument("--etiqueta", default="", help="Nombre de la corrida.")
+        parser.add_argument("--vista", action="append", dest="vistas",
+                            help="Limitar a estas vistas (repetible).")
+        parser.add_argument("--cargar", type=int, default=0, metavar="CITAS",
+                            help="Antes de medir, ejecuta seed_bulk con este número de citas.")
+        parser.add_argument("--comparar", nargs="*", metavar="CORRIDA",
+                            help="Compara dos corridas del historial (índices o etiquetas; "
+                                 "por defecto las dos últimas) en vez de medir.")
+        parser.add_argument("--umbral", type=float, default=10.0,
+                            help="% de empeoramiento a partir del cual se marca regresión.")
+
+    # ---------------------------------------------------------------
+    def handle(self, *args, **opts):
+        if opts["comparar"] is not None:
+            return self._comparar(opts)
+
+        if opts["cargar"]:
+            call_command("seed_bulk", citas=opts["cargar"],
+                         pacientes=max(1000, opts["cargar"] // 20),
+                         medicos=max(10, opts["cargar"] // 2000), stdout=self.stdout)
+
+        with revertido():
+            resultados = self._medir_escenarios(opts)
+        # Lo que se revirtió pudo haber llegado a la caché
+        agenda_cache.invalidar("citas")
+
+        corrida = {
+            "etiqueta": opts["etiqueta"],
+            "fecha": timezone.now().isoformat(),
+            "commit": self._commit(),
+            "bd": connection.vendor,
+            "citas": Cita.objects.count(),
+            "python": platform.python_version(),
+            "iteraciones": opts["iteraciones"],
+            "resultados": resultados,
+        }
+        historial = self._leer(opts["historial"])
+        historial.append(corrida)
+        with open(opts["historial"], "w", encoding="utf-8") as fh:
+            json.dump(historial, fh, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Corrida #{len(historial) - 1} guardada en {opts['historial']}"))
+
+    def _medir_escenarios(self, opts):
+        paciente, staff = self._usuarios()
+        medico = Medico.objects.filter(citas__isnull=False).order_by("id").first() \
+            or Medico.objects.order_by("id").first()
+        if medico is None:
+            raise CommandError("No hay médicos: usa --cargar N o el comando seed.")
+        self.medico = medico
+        self.paciente = paciente.paciente
+        self.libres = self._bloques_libres()
+
+        escenarios = self._escenarios()
+        if opts["vistas"]:
+            escenarios = [e for e in escenarios if e[0] in opts["vistas"]]
+
+        hosts = [*settings.ALLOWED_HOSTS, "testserver"]
+        resultados = {}
+        with override_settings(ALLOWED_HOSTS=hosts):
+            clientes = {"paciente": Client(), "staff": Client()}
+            clientes["paciente"].force_login(paciente)
+            clientes["staff"].force_login(staff)
+            for nombre, rol, preparar in escenarios:
+                with revertido():
+                    resultados[nombre] = self._medir(
+                        clientes[rol], preparar, opts["iteraciones"], opts["calentamiento"])
+                r = resultados[nombre]
+                self.stdout.write(
+                    f"{nombre:>28}: p50={r['p50_ms']:8.2f}  p95={r['p95_ms']:8.2f}  "
+                    f"p99={r['p99_ms']:8.2f} ms  consultas={r['consultas']:5.1f}  "
+                    f"mem={r['kib_asignados']:8.1f} KiB")
+        return resultados
+
+    # ---------------------------------------------------------------
+    def _usuarios(self):
+        paciente, _ = User.objects.get_or_create(email=EMAIL_PACIENTE)
+        staff, creado = User.objects.get_or_create(email=EMAIL_STAFF)
+        if creado:
+            staff.user_permissions.add(
+                Permission.objects.get(codename="access_consultorio"))
+        return paciente, staff
+
+    def _bloques_libres(self):
+        """Generador de (fecha, hora) libres del médico de prueba para crear citas."""
+        f = timezone.localdate() + timedelta(days=1)
+        for _ in range(365):
+            mapa = disponibilidad.ocupacion(self.medico.pk, f)
+            for b in horarios.libres(self.medico.pk, f, mapa):
+                yield f, b.hora
+            f += timedelta(days=1)
+
+    def _nueva_cita(self):
+        for f, h in self.libres:
+            r = reservas.reservar(self.paciente, self.medico, f, h, "benchmark")
+            if r.ok:
+                return r.cita
+        raise CommandError("El médico de prueba no tiene bloques libres.")
+
+    def _escenarios(self):
+        """(nombre, rol, preparar) donde preparar() devuelve (método, url, datos)."""
+        med = self.medico
+        fecha = next(
+            (timezone.localdate() + timedelta(days=i) for i in range(1, 15)
+             if horarios.bloques_para(med.pk, timezone.localdate() + timedelta(days=i))),
+            timezone.localdate())
+        hoy = timezone.localdate()
+
+        def get(nombre, **params):
+            return lambda: ("get", reverse(nombre), params)
+
+        def cancelar_paciente():
+            cita = self._nueva_cita()
+            return "post", reverse("agenda:cita_cancelar", args=[cita.pk]), {}
+
+        def cancelar_staff():
+            cita = self._nueva_cita()
+            return "post", reverse("agenda:consultorio_cita_cancelar", args=[cita.pk]), {
+                "motivo": "benchmark"}
+
+        return [
+            ("inicio_paciente", "paciente", get("agenda:inicio")),
+            ("inicio_staff", "staff", get("agenda:inicio")),
+            ("perfil", "paciente", get("agenda:perfil")),
+            ("agendar", "paciente", get("agenda:agendar_cita")),
+            ("consultorio_citas", "staff", get("agenda:consultorio_citas")),
+            ("consultorio_citas_filtros", "staff", get(
+                "agenda:consultorio_citas", medico=med.pk, desde=hoy.isoformat(),
+                hasta=(hoy + timedelta(days=30)).isoformat(), q="a")),
+            ("ajax_medicos", "paciente", get(
+                "agenda:ajax_medicos", especialidad=med.especialidad_id)),
+            ("ajax_horas", "paciente", get(
+                "agenda:ajax_horas", medico=med.pk, fecha=fecha.isoformat())),
+            ("ajax_disponibilidad", "paciente", get(
+                "agenda:ajax_disponibilidad", medico=med.pk, desde=hoy.isoformat(),
+                hasta=(hoy + timedelta(days=30)).isoformat())),
+            ("cita_cancelar", "paciente", cancelar_paciente),
+            ("consultorio_cita_cancelar", "staff", cancelar_staff),
+        ]
+
+    def _medir(self, client, preparar, iteraciones, calentamiento):
+        def ejecutar():
+            metodo, url, datos = preparar()
+            t0 = reloj.perf_counter()
+            with medir() as m:
+                resp = getattr(client, metodo)(url, datos)
+            ms = (reloj.perf_counter() - t0) * 1000
+            if resp.status_code >= 400:
+                raise CommandError(f"{url} respondió {resp.status_code}")
+            return ms, m.total
+
+        for _ in range(calentamiento):
+            ejecutar()
+        tiempos, consultas = [], []
+        for _ in range(iteraciones):
+            ms, n = ejecutar()
+            tiempos.append(ms)
+            consultas.append(n)
+
+        # Memoria en una pasada aparte: tracemalloc distorsiona la latencia
+        asignados = []
+        for _ in range(min(10, iteraciones)):
+            tracemalloc.start()
+            ejecutar()
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            asignados.append(pico / 1024)
+
+        return {
+            "p50_ms": round(percentil(tiempos, 50), 3),
+            "p95_ms": round(percentil(tiempos, 95), 3),
+            "p99_ms": round(percentil(tiempos, 99), 3),
+            "consultas": round(sum(consultas) / len(consultas), 2),
+            "kib_asignados": round(percentil(asignados, 50), 1),
+        }
+
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _leer(ruta):
+        if not os.path.exists(ruta):
+            return []
+        with open(ruta, encoding="utf-8") as fh:
+            return json.load(fh)
+
+    @staticmethod
+    def _commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                text=True, cwd=settings.BASE_DIR, timeout=5).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    def _buscar(self, historial, clave):
+        if clave.lstrip("-").isdigit():
+            return historial[int(clave)]
+        for corrida in reversed(historial):
+            if corrida.get("etiqueta") == clave:
+                return corrida
+        raise CommandError(f"No hay una corrida '{clave}' en el historial.")
+
+    def _comparar(self, opts):
+        historial = self._leer(opts["historial"])
+        claves = opts["comparar"] or ["-2", "-1"]
+        if len(claves) != 2 or len(historial) < 2:
+            raise CommandError("Se necesitan dos corridas para comparar.")
+        base, nueva = (self._buscar(historial, c) for c in claves)
+
+        regresiones = 0
+        self.stdout.write(f"{'vista':>28}  {'métrica':>13}  {'base':>9}  {'nueva':>9}  cambio")
+        for vista, r_nueva in nueva["resultados"].items():
+            r_base = base["resultados"].get(vista)
+            if not r_base:
+                continue
+            for metrica in ("p50_ms", "p95_ms", "consultas", "kib_asignados"):
+                a, b = r_base[metrica], r_nueva[metrica]
+                cambio = ((b - a) / a * 100) if a else (100.0 if b else 0.0)
+                peor = (b > a) if metrica == "consultas" else cambio > opts["umbral"]
+                marca = "  ⚠ REGRESIÓN" if peor else ""
+                regresiones += peor
+                self.stdout.write(
+                    f"{vista:>28}  {metrica:>13}  {a:9.2f}  {b:9.2f}  {cambio:+6.1f}%{marca}")
+        if regresiones:
+            raise CommandError(f"{regresiones} regresión(es) respecto de la corrida base.")
+        self.stdout.write(self.style.SUCCESS("Sin regresiones."))
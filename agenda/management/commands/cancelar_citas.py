@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from agenda import cancelaciones
+from agenda.models import Medico, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancela en un solo UPDATE todas las citas vigentes de un médico "
+        "entre dos fechas (ej. licencia médica)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("medico", type=int, help="ID del médico.")
+        parser.add_argument("desde", help="Fecha inicial (AAAA-MM-DD).")
+        parser.add_argument("hasta", nargs="?", help="Fecha final (por defecto = desde).")
+        parser.add_argument("--motivo", default="", help="Motivo de cancelación.")
+        parser.add_argument("--usuario", help="Email del usuario que cancela (auditoría).")
+        parser.add_argument("--simular", action="store_true",
+                            help="Solo informa cuántas citas se cancelarían.")
+
+    def handle(self, *args, **opts):
+        desde = parse_date(opts["desde"] or "")
+        hasta = parse_date(opts["hasta"] or "") if opts["hasta"] else desde
+        if not desde or not hasta or hasta < desde:
+            raise CommandError("Rango de fechas inválido.")
+        try:
+            medico = Medico.objects.get(pk=opts["medico"])
+        except Medico.DoesNotExist:
+            raise CommandError(f"No existe el médico {opts['medico']}.") from None
+
+        usuario = None
+        if opts["usuario"]:
+            usuario = User.objects.por_email(opts["usuario"]).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario {opts['usuario']}.")
+
+        if opts["simular"]:
+            n = cancelaciones.vigentes().filter(
+                medico=medico, fecha__range=(desde, hasta)).count()
+            self.stdout.write(f"Se cancelarían {n} cita(s) de {medico.nombre}.")
+            return
+
+        n = cancelaciones.cancelar_rango(medico.pk, desde, hasta, usuario, opts["motivo"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{n} cita(s) de {medico.nombre} canceladas entre {desde} y {hasta}."))
@@ -0,0 +1,45 @@
+import time as reloj
+
+from django.core.management.base import BaseCommand
+
+from agenda import notificaciones
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la bandeja de salida: envía las notificaciones pendientes "
+        "en lotes con un pool de hilos y reintenta los fallos con espera "
+        "exponencial. Se pueden correr varios en paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=100)
+        parser.add_argument("--hilos", type=int, default=4)
+        parser.add_argument("--una-vez", action="store_true",
+                            help="Vacía lo pendiente y termina (para cron).")
+        parser.add_argument("--espera", type=float, default=5.0,
+                            help="Segundos a dormir cuando no hay pendientes.")
+
+    def handle(self, *args, **opts):
+        totales = {"enviadas": 0, "fallidas": 0, "descartadas": 0}
+        try:
+            while True:
+                lote = notificaciones.reclamar(opts["lote"])
+                if not lote:
+                    if opts["una_vez"]:
+                        break
+                    reloj.sleep(opts["espera"])
+                    continue
+                t0 = reloj.perf_counter()
+                r = notificaciones.procesar(lote, opts["hilos"])
+                for k, v in r.items():
+                    totales[k] += v
+                self.stdout.write(
+                    f"lote de {len(lote)} en {reloj.perf_counter() - t0:.2f} s: "
+                    f"{r['enviadas']} enviadas, {r['fallidas']} con error, "
+                    f"{r['descartadas']} descartadas")
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {totales['enviadas']} enviadas, {totales['fallidas']} con error, "
+            f"{totales['descartadas']} descartadas."))
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from agenda.models import Cita
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta EXPLAIN sobre las consultas de ventanas de tiempo "
+        "(próximas/pasadas) y verifica que usen los índices compuestos por "
+        "``inicio``. Termina con error si alguna no lo hace."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plan", action="store_true",
+                            help="Muestra el plan completo de cada consulta.")
+        parser.add_argument("--analizar", action="store_true",
+                            help="Actualiza las estadísticas (ANALYZE) de agenda_cita antes.")
+
+    def _consultas(self):
+        ahora = timezone.now()
+        cita = Cita.objects.order_by("id").first()
+        if cita is None:
+            raise CommandError("No hay citas: carga datos con seed o seed_bulk.")
+        activas = Cita.objects.exclude(estado__in=["cancelada", "atendida"])
+        return [
+            ("perfil: próximas del paciente", "cita_paciente_inicio_idx",
+             activas.filter(paciente_id=cita.paciente_id, inicio__gte=ahora)
+             .order_by("inicio")),
+            ("resumen: próxima cita", "cita_paciente_inicio_idx",
+             Cita.objects.filter(paciente_id=cita.paciente_id, inicio__gte=ahora,
+                                 estado__in=Cita.ESTADOS_ACTIVOS).order_by("inicio")[:1]),
+            ("agenda del médico (7 días)", "cita_medico_inicio_idx",
+             Cita.objects.filter(medico_id=cita.medico_id,
+                                 inicio__range=(ahora, ahora + timedelta(days=7)))
+             .order_by("inicio")),
+            ("pendientes desde ahora", "cita_estado_inicio_idx",
+             Cita.objects.filter(estado="pendiente", inicio__gte=ahora,
+                                 inicio__lt=ahora + timedelta(days=1))
+             .order_by("inicio")),
+        ]
+
+    def handle(self, *args, **opts):
+        fallidas = 0
+        if opts["analizar"]:
+            with connection.cursor() as cur:
+                cur.execute("ANALYZE agenda_cita")
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                # Con tablas chicas el planificador prefiere un seq scan; lo que
+                # se verifica aquí es que el índice sea utilizable
+                with connection.cursor() as cur:
+                    cur.execute("SET LOCAL enable_seqscan = off")
+            for nombre, indice, qs in self._consultas():
+                plan = qs.explain()
+                ok = indice in plan
+                fallidas += not ok
+                estado = self.style.SUCCESS("OK  ") if ok else self.style.ERROR("FALLA")
+                self.stdout.write(f"{estado} {nombre:<32} espera {indice}")
+                if opts["verbose_plan"] or not ok:
+                    for linea in plan.splitlines():
+                        self.stdout.write(f"        {linea}")
+        if fallidas:
+            raise CommandError(f"{fallidas} consulta(s) no usan el índice esperado.")
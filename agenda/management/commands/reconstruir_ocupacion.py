@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from agenda import disponibilidad
+
+
+class Command(BaseCommand):
+    help = "Recalcula el índice de ocupación (OcupacionDia) a partir de las citas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--medico", type=int, help="Solo este médico.")
+        parser.add_argument("--desde", help="Fecha inicial (AAAA-MM-DD).")
+        parser.add_argument("--hasta", help="Fecha final (AAAA-MM-DD).")
+
+    def handle(self, *args, **opts):
+        dias = disponibilidad.reconstruir(
+            medico_id=opts["medico"],
+            desde=parse_date(opts["desde"] or ""),
+            hasta=parse_date(opts["hasta"] or ""),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice reconstruido: {dias} día(s) con ocupación."))
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from agenda.instrumentacion import REGISTRO
+from agenda.models import User
+
+MIDDLEWARE = "agenda.middleware.PresupuestoConsultasMiddleware"
+
+RUTAS_POR_DEFECTO = ["/", "/perfil/", "/agendar/", "/consultorio/", "/ajax/medicos/"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recorre rutas con el cliente de pruebas y reporta, por nombre de URL, "
+        "consultas, tiempo de BD y SQL repetido (JSON o CSV)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ruta", action="append", dest="rutas",
+                            help="Ruta a medir (repetible). Ej: --ruta '/ajax/horas/?medico=1&fecha=2025-09-01'")
+        parser.add_argument("--email", help="Usuario con el que iniciar sesión.")
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--formato", choices=["json", "csv"], default="json")
+        parser.add_argument("--salida", help="Archivo de salida (por defecto stdout).")
+
+    def handle(self, *args, **opts):
+        client = Client()
+        if opts["email"]:
+            user = User.objects.por_email(opts["email"]).first()
+            if user is None:
+                raise CommandError(f"No existe el usuario {opts['email']}.")
+            client.force_login(user)
+
+        middleware = list(settings.MIDDLEWARE)
+        if MIDDLEWARE not in middleware:
+            middleware.insert(0, MIDDLEWARE)
+
+        REGISTRO.limpiar()
+        with override_settings(MIDDLEWARE=middleware,
+                               ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for ruta in opts["rutas"] or RUTAS_POR_DEFECTO:
+                for _ in range(opts["repeticiones"]):
+                    client.get(ruta)
+
+        texto = REGISTRO.como_json() if opts["formato"] == "json" else REGISTRO.como_csv()
+        if opts["salida"]:
+            with open(opts["salida"], "w", encoding="utf-8") as fh:
+                fh.write(texto)
+            self.stdout.write(self.style.SUCCESS(f"Reporte escrito en {opts['salida']}"))
+        else:
+            self.stdout.write(texto)
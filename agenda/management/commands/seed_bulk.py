@@ -0,0 +1,240 @@
+import math
+import random
+import time as reloj
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from agenda import busqueda, cache as agenda_cache, disponibilidad, horarios, resumen
+from agenda.models import Cita, Especialidad, Medico, Paciente, User
+
+NOMBRES = [
+    "José", "María", "Juan", "Ana", "Luis", "Camila", "Sofía", "Matías", "Valentina",
+    "Benjamín", "Martina", "Tomás", "Isidora", "Agustín", "Florencia", "Joaquín",
+    "Catalina", "Vicente", "Antonia", "Ignacio", "Fernanda", "Cristóbal", "Josefa",
+]
+APELLIDOS = [
+    "González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva",
+    "Martínez", "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández",
+    "Torres", "Araya", "Flores", "Espinoza", "Valenzuela", "Castillo", "Núñez",
+]
+ESPECIALIDADES = [
+    "Medicina General", "Dermatología", "Pediatría", "Cardiología", "Ginecología",
+    "Traumatología", "Oftalmología", "Otorrinolaringología", "Neurología",
+    "Psiquiatría", "Endocrinología", "Gastroenterología", "Urología", "Nutrición",
+]
+MOTIVOS = ["", "", "Control", "Dolor de cabeza", "Chequeo anual", "Resultados de exámenes",
+           "Dolor lumbar", "Renovación de receta", "Alergia", "Fiebre"]
+MOTIVOS_CANCELACION = ["Médico con licencia", "Paciente no puede asistir", "Reagendada", ""]
+
+# Lunes y martes concentran más demanda que el viernes
+PESO_DIA = {0: 1.0, 1: 0.95, 2: 0.85, 3: 0.8, 4: 0.7}
+
+COLUMNAS_CITA = ["paciente_id", "medico_id", "fecha", "hora", "inicio", "motivo", "estado",
+                 "creada", "cancelada_por_id", "cancelada_en", "cancel_motivo"]
+
+
+@contextmanager
+def _respetar_creada():
+    """
+    ``Cita.creada`` es ``auto_now_add``: ``bulk_create`` la pisaría con la
+    hora de la carga. Mientras dura el bloque se guarda el valor generado,
+    igual que con ``--copy``.
+    """
+    campo = Cita._meta.get_field("creada")
+    campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        campo.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera volúmenes grandes y reproducibles de datos sintéticos "
+        "(especialidades, médicos, pacientes y citas) para pruebas de carga."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--especialidades", type=int, default=len(ESPECIALIDADES))
+        parser.add_argument("--medicos", type=int, default=500)
+        parser.add_argument("--pacientes", type=int, default=10000)
+        parser.add_argument("--citas", type=int, default=100000)
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--lote", type=int, default=10000)
+        parser.add_argument("--ocupacion", type=float, default=0.75,
+                            help="Fracción de bloques ocupados por día hábil.")
+        parser.add_argument("--futuro-dias", type=int, default=60,
+                            help="Días hacia adelante con citas agendadas.")
+        parser.add_argument("--copy", action="store_true",
+                            help="Usa COPY (solo PostgreSQL) para citas.")
+
+    def handle(self, *args, **opts):
+        if opts["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy solo está disponible con PostgreSQL.")
+        self.rnd = random.Random(opts["semilla"])
+        self.opts = opts
+        self.etiqueta = f"s{opts['semilla']}"
+
+        especialidades = self._paso("especialidades", self._especialidades)
+        medicos = self._paso("médicos", lambda: self._medicos(especialidades))
+        pacientes = self._paso("pacientes", self._pacientes)
+        self._paso("citas", lambda: self._citas(medicos, pacientes))
+        self._paso("índice de ocupación", disponibilidad.reconstruir)
+        self._paso("resúmenes descartados", resumen.descartar)
+
+        for nombre in ("citas", "horarios", "catalogo"):
+            agenda_cache.invalidar(nombre)
+        self.stdout.write(self.style.SUCCESS("Carga masiva completada."))
+
+    # ---------------------------------------------------------------
+    def _paso(self, nombre, fn):
+        t0 = reloj.perf_counter()
+        resultado = fn()
+        seg = reloj.perf_counter() - t0
+        filas = resultado if isinstance(resultado, int) else len(resultado)
+        self.stdout.write(
+            f"{nombre:>20}: {filas:>10} filas en {seg:7.1f} s "
+            f"({filas / seg if seg else 0:,.0f} filas/s)")
+        return resultado
+
+    def _especialidades(self):
+        nombres = [
+            ESPECIALIDADES[i] if i < len(ESPECIALIDADES) else f"Especialidad {i + 1}"
+            for i in range(self.opts["especialidades"])
+        ]
+        existentes = set(Especialidad.objects.filter(
+            nombre__in=nombres).values_list("nombre", flat=True))
+        Especialidad.objects.bulk_create(
+            [Especialidad(nombre=n) for n in nombres if n not in existentes])
+        return list(Especialidad.objects.filter(nombre__in=nombres).order_by("id"))
+
+    def _medicos(self, especialidades):
+        rnd = self.rnd
+        nuevos = [
+            Medico(
+                nombre=f"Dr(a). {rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}",
+                especialidad=rnd.choice(especialidades),
+            )
+            for _ in range(self.opts["medicos"])
+        ]
+        return Medico.objects.bulk_create(nuevos, batch_size=self.opts["lote"])
+
+    def _pacientes(self):
+        rnd, lote = self.rnd, self.opts["lote"]
+        sin_clave = make_password(None)
+        dominio = f".{self.etiqueta}@seed.medidate.test"
+        # Una nueva corrida con la misma semilla sigue la numeración
+        base = User.objects.filter(email__endswith=dominio).count()
+        ids = []
+        for inicio in range(0, self.opts["pacientes"], lote):
+            usuarios = []
+            for i in range(inicio, min(inicio + lote, self.opts["pacientes"])):
+                usuarios.append(User(
+                    email=f"paciente{base + i}{dominio}",
+                    first_name=rnd.choice(NOMBRES),
+                    last_name=f"{rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+                    password=sin_clave,
+                ))
+            with transaction.atomic():
+                User.objects.bulk_create(usuarios)
+                pacientes = Paciente.objects.bulk_create([
+                    Paciente(
+                        user=u,
+                        genero=rnd.choice("MFO"),
+                        fecha_nacimiento=timezone.localdate()
+                        - timedelta(days=rnd.randint(365, 90 * 365)),
+                        busqueda=busqueda.texto_de(u),
+                    )
+                    for u in usuarios
+                ])
+            ids.extend(p.pk for p in pacientes)
+        return ids
+
+    def _citas(self, medicos, pacientes):
+        if not (medicos and pacientes):
+            return 0
+        generador = self._generar_citas(medicos, pacientes)
+        if self.opts["copy"]:
+            return self._copiar_citas(generador)
+        total, lote = 0, []
+        with _respetar_creada():
+            for fila in generador:
+                lote.append(Cita(**fila))
+                if len(lote) >= self.opts["lote"]:
+                    Cita.objects.bulk_create(lote)
+                    total += len(lote)
+                    lote = []
+            Cita.objects.bulk_create(lote)
+        return total + len(lote)
+
+    def _copiar_citas(self, generador):
+        total = 0
+        with connection.cursor() as cur:
+            sql = f"COPY agenda_cita ({', '.join(COLUMNAS_CITA)}) FROM STDIN"
+            with cur.cursor.copy(sql) as copy:
+                for fila in generador:
+                    copy.write_row([fila.get(c) for c in COLUMNAS_CITA])
+                    total += 1
+        return total
+
+    def _generar_citas(self, medicos, pacientes):
+        """
+        Recorre días hábiles (del pasado hacia el futuro) y ocupa una fracción
+        de los bloques de cada médico, sin repetir bloque activo.
+        """
+        rnd, opts = self.rnd, self.opts
+        bloques = horarios.compilar(horarios.VENTANAS_ESTANDAR)
+        peso_medio = sum(PESO_DIA.values()) / len(PESO_DIA)
+        por_dia = len(medicos) * len(bloques) * opts["ocupacion"] * peso_medio
+        dias_habiles = max(1, math.ceil(opts["citas"] / por_dia))
+        hoy = timezone.localdate()
+        ahora = timezone.now()
+
+        # Fecha inicial: deja ``futuro_dias`` hacia adelante y el resto en el pasado
+        fecha, habiles = hoy + timedelta(days=opts["futuro_dias"]), 0
+        while habiles < dias_habiles:
+            fecha -= timedelta(days=1)
+            if fecha.weekday() < 5:
+                habiles += 1
+
+        emitidas = 0
+        while emitidas < opts["citas"]:
+            fecha += timedelta(days=1)
+            if fecha.weekday() >= 5:
+                continue
+            pasada = fecha < hoy
+            tasa = opts["ocupacion"] * PESO_DIA[fecha.weekday()]
+            for medico in medicos:
+                n = min(len(bloques), max(0, round(rnd.gauss(tasa, 0.15) * len(bloques))))
+                for b in rnd.sample(bloques, n):
+                    yield self._cita(rnd, medico.pk, rnd.choice(pacientes),
+                                     fecha, b.hora, pasada, ahora)
+                    emitidas += 1
+                    if emitidas >= opts["citas"]:
+                        return
+
+    @staticmethod
+    def _cita(rnd, medico_id, paciente_id, fecha, hora, pasada, ahora):
+        inicio = Cita.inicio_de(fecha, hora)
+        creada = inicio - timedelta(days=rnd.randint(1, 45), minutes=rnd.randint(0, 600))
+        creada = min(creada, ahora)
+        r = rnd.random()
+        if pasada:
+            estado = "cancelada" if r < 0.12 else "confirmada"
+        else:
+            estado = "cancelada" if r < 0.08 else ("confirmada" if r < 0.4 else "pendiente")
+        fila = {
+            "paciente_id": paciente_id, "medico_id": medico_id,
+            "fecha": fecha, "hora": hora, "inicio": inicio, "motivo": rnd.choice(MOTIVOS),
+            "estado": estado, "creada": creada,
+            "cancelada_por_id": None, "cancelada_en": None, "cancel_motivo": "",
+        }
+        if estado == "cancelada":
+            fila["cancelada_en"] = min(creada + timedelta(hours=rnd.randint(1, 72)), ahora)
+            fila["cancel_motivo"] = rnd.choice(MOTIVOS_CANCELACION)
+        return fila
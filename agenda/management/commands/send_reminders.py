@@ -0,0 +1,55 @@
+import time as reloj
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from agenda import notificaciones, recordatorios
+
+
+class Command(BaseCommand):
+    help = (
+        "Encola los recordatorios de las citas de mañana (o de --fecha) en "
+        "lotes idempotentes. Con --loop queda corriendo como programador."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fecha", help="Fecha de las citas (AAAA-MM-DD); por defecto mañana.")
+        parser.add_argument("--lote", type=int, default=1000)
+        parser.add_argument("--enviar", action="store_true",
+                            help="Además, vacía la bandeja de salida al terminar.")
+        parser.add_argument("--hilos", type=int, default=4,
+                            help="Hilos de envío con --enviar.")
+        parser.add_argument("--loop", action="store_true",
+                            help="Repite cada --intervalo segundos.")
+        parser.add_argument("--intervalo", type=float, default=300.0)
+
+    def handle(self, *args, **opts):
+        fecha = None
+        if opts["fecha"]:
+            fecha = parse_date(opts["fecha"])
+            if fecha is None:
+                raise CommandError("Fecha inválida.")
+        try:
+            while True:
+                self._pasada(fecha or timezone.localdate() + timedelta(days=1), opts)
+                if not opts["loop"]:
+                    break
+                reloj.sleep(opts["intervalo"])
+        except KeyboardInterrupt:
+            pass
+
+    def _pasada(self, fecha, opts):
+        t0, total = reloj.perf_counter(), 0
+        for n in recordatorios.encolar(fecha, opts["lote"]):
+            total += n
+        self.stdout.write(
+            f"{fecha}: {total} recordatorio(s) encolados en "
+            f"{reloj.perf_counter() - t0:.2f} s")
+
+        if opts["enviar"]:
+            enviadas = 0
+            while lote := notificaciones.reclamar(opts["lote"]):
+                enviadas += notificaciones.procesar(lote, opts["hilos"])["enviadas"]
+            self.stdout.write(f"{enviadas} correo(s) enviados")
@@ -0,0 +1,74 @@
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Barrier
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from agenda import horarios, reservas
+from agenda.models import Cita, Especialidad, Medico, Paciente, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Lanza reservas concurrentes contra el mismo bloque y verifica que "
+        "exactamente una gane y el resto reciba 'ocupado' sin errores. "
+        "Crea datos temporales y los elimina al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservas", type=int, default=300)
+        parser.add_argument("--hilos", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        n, hilos = opts["reservas"], opts["hilos"]
+        etiqueta = uuid.uuid4().hex[:8]
+        esp = Especialidad.objects.create(nombre=f"stress-{etiqueta}")
+        medico = Medico.objects.create(nombre=f"Stress {etiqueta}", especialidad=esp)
+        usuarios = [
+            User.objects.create_user(email=f"stress-{etiqueta}-{i}@medidate.test")
+            for i in range(min(n, 20))
+        ]
+        pacientes = list(Paciente.objects.filter(user__in=usuarios))
+
+        fecha = timezone.localdate() + timedelta(days=1)
+        while not horarios.bloques_para(medico.pk, fecha):
+            fecha += timedelta(days=1)
+        hora = horarios.bloques_para(medico.pk, fecha)[0].hora
+
+        barrera = Barrier(min(hilos, n))
+
+        def intento(i):
+            try:
+                try:
+                    barrera.wait(timeout=5)
+                except Exception:
+                    pass
+                r = reservas.reservar(pacientes[i % len(pacientes)], medico, fecha, hora)
+                return "ok" if r.ok else "ocupado"
+            except Exception as exc:
+                return f"error: {type(exc).__name__}"
+            finally:
+                connection.close()
+
+        try:
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                resultados = Counter(pool.map(intento, range(n)))
+            activas = Cita.objects.filter(
+                medico=medico, fecha=fecha, hora=hora).exclude(estado="cancelada").count()
+        finally:
+            Cita.objects.filter(medico=medico).delete()
+            medico.delete()
+            esp.delete()
+            User.objects.filter(pk__in=[u.pk for u in usuarios]).delete()
+
+        for clave, total in sorted(resultados.items()):
+            self.stdout.write(f"{clave:>12}: {total}")
+        if resultados["ok"] != 1 or activas != 1 or resultados["ocupado"] != n - 1:
+            raise CommandError(
+                f"Resultado inesperado: {dict(resultados)}, citas activas={activas}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{n} reservas concurrentes: 1 confirmada, {n - 1} rechazadas sin errores."))
@@ -0,0 +1,52 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .instrumentacion import REGISTRO, medir
+from .roles import roles_de
+
+
+class RolesMiddleware:
+    """
+    Expone ``request.roles`` (perezoso); va después de AuthenticationMiddleware.
+    Sirve tanto en WSGI como en ASGI: no hace E/S, así que bajo ASGI no obliga
+    a Django a pasar la petición a un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _anotar(self, request):
+        request.roles = SimpleLazyObject(
+            lambda: roles_de(request.user, getattr(request, "session", None)))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._anotar(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._anotar(request)
+        return await self.get_response(request)
+
+
+class PresupuestoConsultasMiddleware:
+    """
+    Opcional: anota consultas, tiempo de BD y SQL duplicado por nombre de URL.
+    Conviene ponerlo primero en MIDDLEWARE para incluir sesión y autenticación.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with medir() as medicion:
+            response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        vista = match.view_name if match and match.view_name else request.path
+        REGISTRO.agregar(vista, medicion)
+        return response
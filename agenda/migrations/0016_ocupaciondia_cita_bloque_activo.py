@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_ocupacion(apps, schema_editor):
+    Cita = apps.get_model("agenda", "Cita")
+    OcupacionDia = apps.get_model("agenda", "OcupacionDia")
+
+    mapas = {}
+    citas = Cita.objects.exclude(estado="cancelada").values_list(
+        "medico_id", "fecha", "hora")
+    for med, fecha, hora in citas.iterator(chunk_size=5000):
+        minutos = hora.hour * 60 + hora.minute
+        if hora.second or minutos % 30:
+            continue
+        clave = (med, fecha)
+        mapas[clave] = mapas.get(clave, 0) | (1 << (minutos // 30))
+
+    OcupacionDia.objects.bulk_create(
+        [OcupacionDia(medico_id=med, fecha=fecha, mapa=m)
+         for (med, fecha), m in mapas.items()],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0015_cita_cancel_motivo_cita_cancelada_en_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('mapa', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='cita',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='cita',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'cancelada'), _negated=True), fields=('medico', 'fecha', 'hora'), name='cita_bloque_activo_unico'),
+        ),
+        migrations.AddField(
+            model_name='ocupaciondia',
+            name='medico',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacion', to='agenda.medico'),
+        ),
+        migrations.AddConstraint(
+            model_name='ocupaciondia',
+            constraint=models.UniqueConstraint(fields=('medico', 'fecha'), name='ocupacion_medico_fecha_unica'),
+        ),
+        migrations.RunPython(poblar_ocupacion, migrations.RunPython.noop),
+    ]
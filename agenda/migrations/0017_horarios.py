@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0016_ocupaciondia_cita_bloque_activo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('nombre', models.CharField(blank=True, max_length=120)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlantillaHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=80, unique=True)),
+                ('dias', models.CharField(default='01234', max_length=7)),
+                ('ventanas', models.CharField(default='09:00-13:00,15:00-19:00', max_length=200)),
+                ('paso_min', models.PositiveSmallIntegerField(choices=[(30, '30 minutos'), (60, '60 minutos')], default=30)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='medico',
+            name='plantilla',
+            field=models.ForeignKey(blank=True, help_text='Vacío = horario estándar.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medicos', to='agenda.plantillahorario'),
+        ),
+        migrations.CreateModel(
+            name='ExcepcionHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('ventanas', models.CharField(blank=True, max_length=200)),
+                ('motivo', models.CharField(blank=True, max_length=200)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='excepciones', to='agenda.medico')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('medico', 'fecha'), name='excepcion_medico_fecha_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:43
+
+import unicodedata
+
+from django.db import OperationalError, migrations, models
+
+# Copias de agenda.busqueda tal como estaban en esta migración: los cambios
+# posteriores de ese módulo no deben alterar lo que hace
+TABLA_FTS = "agenda_paciente_fts"
+
+SQL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS agenda_paciente_busqueda_trgm "
+    "ON agenda_paciente USING gin (busqueda gin_trgm_ops)",
+]
+
+SQL_SQLITE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+    "busqueda, content='agenda_paciente', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF busqueda ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda);
+        INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda);
+    END""",
+]
+
+
+def normalizar(texto: str) -> str:
+    sin_tildes = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in sin_tildes if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def poblar_busqueda(apps, schema_editor):
+    Paciente = apps.get_model("agenda", "Paciente")
+    lote = []
+    for p in Paciente.objects.select_related("user").iterator(chunk_size=2000):
+        u = p.user
+        p.busqueda = normalizar(f"{u.first_name} {u.last_name} {u.email}")
+        lote.append(p)
+        if len(lote) >= 2000:
+            Paciente.objects.bulk_update(lote, ["busqueda"])
+            lote = []
+    Paciente.objects.bulk_update(lote, ["busqueda"])
+
+
+def crear_indices(apps, schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor == "postgresql":
+        with conexion.cursor() as cur:
+            for sql in SQL_POSTGRES:
+                cur.execute(sql)
+    elif conexion.vendor == "sqlite":
+        try:
+            with conexion.cursor() as cur:
+                for sql in SQL_SQLITE:
+                    cur.execute(sql)
+                cur.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        except OperationalError:
+            # SQLite sin FTS5: la búsqueda queda con LIKE
+            pass
+
+
+def eliminar_indices(apps, schema_editor):
+    conexion = schema_editor.connection
+    with conexion.cursor() as cur:
+        if conexion.vendor == "postgresql":
+            cur.execute("DROP INDEX IF EXISTS agenda_paciente_busqueda_trgm")
+        elif conexion.vendor == "sqlite":
+            for sufijo in ("ai", "ad", "au"):
+                cur.execute(f"DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}")
+            cur.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0017_horarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='busqueda',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
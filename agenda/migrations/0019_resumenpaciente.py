@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0018_paciente_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPaciente',
+            fields=[
+                ('paciente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='agenda.paciente')),
+                ('proxima_en', models.DateTimeField(blank=True, null=True)),
+                ('proximas', models.PositiveIntegerField(default=0)),
+                ('historial', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('proxima_cita', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='agenda.cita')),
+            ],
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:12
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_inicio(apps, schema_editor):
+    Cita = apps.get_model("agenda", "Cita")
+    if schema_editor.connection.vendor == "postgresql":
+        # Un solo UPDATE: fecha + hora es un timestamp local de TIME_ZONE
+        schema_editor.execute(
+            "UPDATE agenda_cita SET inicio = (fecha + hora) AT TIME ZONE %s",
+            [settings.TIME_ZONE],
+        )
+        return
+
+    lote = []
+    for cita in Cita.objects.only("id", "fecha", "hora").iterator(chunk_size=5000):
+        cita.inicio = timezone.make_aware(datetime.combine(cita.fecha, cita.hora))
+        lote.append(cita)
+        if len(lote) >= 5000:
+            Cita.objects.bulk_update(lote, ["inicio"])
+            lote = []
+    Cita.objects.bulk_update(lote, ["inicio"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0019_resumenpaciente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='inicio',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(poblar_inicio, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cita',
+            name='inicio',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['paciente', 'inicio'], name='cita_paciente_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['medico', 'inicio'], name='cita_medico_inicio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['estado', 'inicio'], name='cita_estado_inicio_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0020_cita_inicio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitaArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField()),
+                ('inicio', models.DateTimeField()),
+                ('motivo', models.CharField(blank=True, max_length=250)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('cancelada', 'Cancelada')], max_length=12)),
+                ('creada', models.DateTimeField()),
+                ('cancelada_en', models.DateTimeField(blank=True, null=True)),
+                ('cancel_motivo', models.CharField(blank=True, max_length=200)),
+                ('archivada', models.DateTimeField(auto_now_add=True)),
+                ('cancelada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='citas_archivadas', to='agenda.medico')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='citas_archivadas', to='agenda.paciente')),
+            ],
+            options={
+                'ordering': ['fecha', 'hora'],
+                'indexes': [models.Index(fields=['paciente', 'inicio'], name='archivo_paciente_inicio_idx')],
+            },
+        ),
+    ]
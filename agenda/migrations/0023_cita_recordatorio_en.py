@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0022_notificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cita',
+            name='recordatorio_en',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
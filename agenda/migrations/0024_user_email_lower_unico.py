@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:09
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def verificar_duplicados(apps, schema_editor):
+    User = apps.get_model("agenda", "User")
+    repetidos = list(
+        User.objects.values(normalizado=Lower("email"))
+        .annotate(n=Count("id")).filter(n__gt=1)
+        .values_list("normalizado", flat=True)[:20]
+    )
+    if repetidos:
+        raise RuntimeError(
+            "Hay emails que solo difieren en mayúsculas; unifícalos antes de migrar: "
+            + ", ".join(repetidos))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0023_cita_recordatorio_en'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='user_email_lower_unico'),
+        ),
+    ]
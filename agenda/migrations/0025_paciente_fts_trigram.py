@@ -0,0 +1,51 @@
+from django.db import OperationalError, migrations
+
+# Copia del SQL de agenda.busqueda en esta migración: los cambios posteriores
+# de ese módulo no deben alterar lo que hace
+TABLA_FTS = "agenda_paciente_fts"
+
+SQL_SQLITE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+    "busqueda, content='agenda_paciente', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF busqueda ON agenda_paciente BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, busqueda) VALUES ('delete', old.id, old.busqueda);
+        INSERT INTO {TABLA_FTS}(rowid, busqueda) VALUES (new.id, new.busqueda);
+    END""",
+]
+
+
+def recrear_fts(apps, schema_editor):
+    # La tabla FTS5 de 0018 tokenizaba por palabras (solo prefijos); con
+    # trigram busca subcadenas, igual que LIKE y pg_trgm
+    conexion = schema_editor.connection
+    if conexion.vendor != "sqlite":
+        return
+    with conexion.cursor() as cur:
+        for sufijo in ("ai", "ad", "au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}")
+        cur.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+    try:
+        with conexion.cursor() as cur:
+            for sql in SQL_SQLITE:
+                cur.execute(sql)
+            cur.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite sin FTS5 o anterior a 3.34 (sin trigram): queda LIKE
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0024_user_email_lower_unico'),
+    ]
+
+    operations = [
+        migrations.RunPython(recrear_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def descartar(apps, schema_editor):
+    # Los resúmenes se calcularon sin contar las citas confirmadas como
+    # próximas; se reconstruyen en la siguiente lectura con ``resumen.de``
+    apps.get_model('agenda', 'ResumenPaciente').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0025_paciente_fts_trigram'),
+    ]
+
+    operations = [
+        migrations.RunPython(descartar, migrations.RunPython.noop),
+    ]
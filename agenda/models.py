@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 
@@ -25,6 +29,11 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault("is_superuser", True)
         return self._create_user(email, password, **extra_fields)
 
+    def por_email(self, email):
+        """Búsqueda sin distinguir mayúsculas que usa el índice único sobre LOWER(email)."""
+        return self.alias(email_normalizado=Lower("email")).filter(
+            email_normalizado=(email or "").strip().lower())
+
 
 class User(AbstractUser):
     username = None
@@ -37,6 +46,12 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # El login y el registro comparan el email sin distinguir mayúsculas
+            models.UniqueConstraint(Lower("email"), name="user_email_lower_unico"),
+        ]
+
     def __str__(self):
         return self.get_full_name() or self.email
 
@@ -48,6 +63,8 @@ class Paciente(models.Model):
     fecha_nacimiento = models.DateField(null=True, blank=True)
     genero = models.CharField(max_length=1, choices=GENERO, blank=True)
     telefono = models.CharField(max_length=20, blank=True, null=True)
+    # "nombre apellidos email" normalizado (ver agenda.busqueda)
+    busqueda = models.CharField(max_length=500, blank=True, editable=False)
 
     def __str__(self):
         return str(self.user)
@@ -60,10 +77,35 @@ class Especialidad(models.Model):
         return self.nombre
 
 
+class PlantillaHorario(models.Model):
+    """
+    Horario semanal de atención. ``dias`` usa los números de ``weekday()``
+    (0 = lunes) y ``ventanas`` rangos "HH:MM-HH:MM" separados por comas.
+    """
+    PASOS = [(30, '30 minutos'), (60, '60 minutos')]
+
+    nombre = models.CharField(max_length=80, unique=True)
+    dias = models.CharField(max_length=7, default='01234')
+    ventanas = models.CharField(max_length=200, default='09:00-13:00,15:00-19:00')
+    paso_min = models.PositiveSmallIntegerField(choices=PASOS, default=30)
+
+    def __str__(self):
+        return self.nombre
+
+    def clean(self):
+        from .horarios import validar_ventanas
+        validar_ventanas(self.ventanas, self.paso_min)
+        if not self.dias or any(d not in '0123456' for d in self.dias):
+            raise ValidationError({'dias': 'Usa dígitos 0 (lunes) a 6 (domingo).'})
+
+
 class Medico(models.Model):
     nombre = models.CharField(max_length=150)
     especialidad = models.ForeignKey(
         Especialidad, on_delete=models.PROTECT, related_name='medicos')
+    plantilla = models.ForeignKey(
+        PlantillaHorario, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='medicos', help_text='Vacío = horario estándar.')
 
     def __str__(self):
         return f"{self.nombre} ({self.especialidad})"
@@ -75,6 +117,8 @@ class Cita(models.Model):
         ('confirmada', 'Confirmada'),
         ('cancelada', 'Cancelada'),
     ]
+    # Vigentes: las "próximas" del resumen y las que reciben recordatorio
+    ESTADOS_ACTIVOS = ('pendiente', 'confirmada')
 
     paciente = models.ForeignKey(
         'Paciente', on_delete=models.CASCADE, related_name='citas')
@@ -82,6 +126,9 @@ class Cita(models.Model):
         'Medico',    on_delete=models.PROTECT, related_name='citas')
     fecha = models.DateField()
     hora = models.TimeField()
+    # fecha + hora como instante con zona; lo mantiene save() para que los
+    # filtros "próximas/pasadas" sean un rango sobre una sola columna
+    inicio = models.DateTimeField(editable=False)
     motivo = models.CharField(max_length=250, blank=True)
     estado = models.CharField(
         max_length=12, choices=ESTADO, default='pendiente')
@@ -93,9 +140,10 @@ class Cita(models.Model):
     )
     cancelada_en = models.DateTimeField(null=True, blank=True)
     cancel_motivo = models.CharField(max_length=200, blank=True)
+    # Cuándo se encoló el recordatorio del día anterior (send_reminders)
+    recordatorio_en = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
-        unique_together = ('medico', 'fecha', 'hora')
         ordering = ['fecha', 'hora']
         permissions = (
             ("access_consultorio", "Puede acceder al panel de consultorio"),
@@ -104,30 +152,118 @@ class Cita(models.Model):
         indexes = [
             models.Index(fields=['fecha', 'hora']),
             models.Index(fields=['estado']),
+            models.Index(fields=['paciente', 'inicio'], name='cita_paciente_inicio_idx'),
+            models.Index(fields=['medico', 'inicio'], name='cita_medico_inicio_idx'),
+            models.Index(fields=['estado', 'inicio'], name='cita_estado_inicio_idx'),
+        ]
+        # Un bloque solo puede tener una cita activa; las canceladas lo liberan
+        constraints = [
+            models.UniqueConstraint(
+                fields=['medico', 'fecha', 'hora'],
+                condition=~models.Q(estado='cancelada'),
+                name='cita_bloque_activo_unico',
+            ),
         ]
 
     def __str__(self):
         return f"{self.fecha} {self.hora} - {self.paciente} / {self.medico}"
 
+    # ---- Valores guardados (las señales comparan contra ellos para mantener
+    # el índice de ocupación, el resumen del paciente y los avisos) ----
+    CAMPOS_ORIGINALES = ('estado', 'medico_id', 'fecha', 'hora', 'paciente_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._recordar_originales()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        self._recordar_originales(fields)
+
+    def _recordar_originales(self, campos=None):
+        """Anota como guardados los valores cargados (``campos``: solo esos)."""
+        nombres = self.CAMPOS_ORIGINALES
+        if campos is not None:
+            attnames = {self._meta.get_field(c).attname for c in campos}
+            nombres = [k for k in nombres if k in attnames]
+        originales = self.__dict__.setdefault('_originales', {})
+        originales.update((k, self.__dict__[k]) for k in nombres if k in self.__dict__)
+
+    def _cargar_diferidos(self, using):
+        """Lee de una vez los CAMPOS_ORIGINALES diferidos (p. ej. tras ``only('estado')``)."""
+        faltan = [k for k in self.CAMPOS_ORIGINALES if k not in self.__dict__]
+        if not faltan or self._state.adding:
+            return
+        fila = Cita._base_manager.using(using).filter(pk=self.pk).values(*faltan).first() or {}
+        self.__dict__.update(fila)
+        self.__dict__.setdefault('_originales', {}).update(fila)
+
+    def original(self, campo):
+        """Valor de ``campo`` en la BD al cargar o guardar la cita por última vez."""
+        return self.__dict__.get('_originales', {}).get(campo)
+
+    @staticmethod
+    def inicio_de(fecha, hora):
+        return timezone.make_aware(datetime.combine(fecha, hora))
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Cita, instance=self)
+        # La cita y lo que las señales derivan de ella (ocupación, resumen,
+        # aviso en la bandeja de salida) se confirman o se revierten juntos
+        with transaction.atomic(using=using):
+            self._cargar_diferidos(using)
+            self.inicio = self.inicio_de(self.fecha, self.hora)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and {'fecha', 'hora'} & set(update_fields):
+                kwargs['update_fields'] = {*update_fields, 'inicio'}
+            super().save(*args, **kwargs)
+        self._recordar_originales(kwargs.get('update_fields'))
+
+    @staticmethod
+    def _bloque_de(datos):
+        if datos.get('estado') == 'cancelada':
+            return None
+        if not all(datos.get(k) is not None for k in ('medico_id', 'fecha', 'hora')):
+            return None
+        return (datos['medico_id'], datos['fecha'], datos['hora'])
+
+    def bloque_ocupado(self):
+        """(medico_id, fecha, hora) si la cita ocupa un bloque, o None si está cancelada."""
+        return self._bloque_de(self.__dict__)
+
+    def bloque_original(self):
+        """``bloque_ocupado`` según los valores guardados (None si es nueva)."""
+        return self._bloque_de(self.__dict__.get('_originales', {}))
+
     # ---- Lógica de estado UI (no cambia tu semántica) ----
-    @property
-    def estado_ui(self) -> str:
+    BADGES = {
+        "agendada": "badge-brand",  # color de marca (teal)
+        "atendida": "bg-success",   # verde
+        "cancelada": "bg-secondary",  # gris
+    }
+
+    def estado_ui_en(self, ahora) -> str:
+        """``estado_ui`` respecto de ``ahora`` (datetime local) sin volver a leer el reloj."""
         if self.estado == "cancelada":
             return "cancelada"
-        hoy = timezone.localdate()
-        ahora = timezone.localtime().time()
-        if self.fecha < hoy or (self.fecha == hoy and self.hora <= ahora):
+        hoy = ahora.date()
+        if self.fecha < hoy or (self.fecha == hoy and self.hora <= ahora.time()):
             return "atendida"     # pasada
         return "agendada"
 
+    @property
+    def estado_ui(self) -> str:
+        # Las tablas lo fijan en bloque (fragmentos.anotar_estados)
+        calculado = self.__dict__.get("_estado_ui")
+        if calculado is not None:
+            return calculado
+        return self.estado_ui_en(timezone.localtime())
+
     @property
     def estado_badge_class(self) -> str:
-        s = self.estado_ui
-        if s == "agendada":
-            return "badge-brand"  # color de marca (teal)
-        if s == "atendida":
-            return "bg-success"   # verde
-        return "bg-secondary"     # cancelada (gris)
+        return self.BADGES[self.estado_ui]
 
     # ---- Helpers para cancelar desde staff ----
     def es_pasada(self) -> bool:
@@ -148,3 +284,162 @@ class Cita(models.Model):
         self.save(update_fields=[
                   'estado', 'cancelada_por', 'cancelada_en', 'cancel_motivo'])
         return True
+
+
+class Feriado(models.Model):
+    fecha = models.DateField(unique=True)
+    nombre = models.CharField(max_length=120, blank=True)
+
+    def __str__(self):
+        return f"{self.fecha} {self.nombre}".strip()
+
+
+class ExcepcionHorario(models.Model):
+    """Cambia el horario de un médico en una fecha; sin ventanas = no atiende."""
+    medico = models.ForeignKey(
+        'Medico', on_delete=models.CASCADE, related_name='excepciones')
+    fecha = models.DateField()
+    ventanas = models.CharField(max_length=200, blank=True)
+    motivo = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['medico', 'fecha'], name='excepcion_medico_fecha_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.medico} {self.fecha} {self.ventanas or 'sin atención'}"
+
+    def clean(self):
+        from .horarios import PASO_MIN, validar_ventanas
+        if self.ventanas:
+            # Se compilan con el paso de la plantilla del médico
+            plantilla = self.medico.plantilla if self.medico_id else None
+            validar_ventanas(self.ventanas, plantilla.paso_min if plantilla else PASO_MIN)
+
+
+class OcupacionDia(models.Model):
+    """
+    Mapa de bits con los bloques ocupados de un médico en una fecha.
+    El bit ``n`` corresponde al bloque que empieza ``n * 30`` minutos
+    después de medianoche (ver ``agenda.disponibilidad``).
+    """
+    medico = models.ForeignKey(
+        'Medico', on_delete=models.CASCADE, related_name='ocupacion')
+    fecha = models.DateField()
+    mapa = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['medico', 'fecha'], name='ocupacion_medico_fecha_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.medico_id} {self.fecha} {self.mapa:048b}"
+
+
+class ResumenPaciente(models.Model):
+    """
+    Datos del panel del paciente mantenidos por ``agenda.resumen``: la
+    próxima cita y los contadores, para resolver el panel con una lectura
+    por clave primaria.
+    """
+    paciente = models.OneToOneField(
+        'Paciente', on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    proxima_cita = models.ForeignKey(
+        'Cita', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    proxima_en = models.DateTimeField(null=True, blank=True)
+    proximas = models.PositiveIntegerField(default=0)
+    historial = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def vigente(self, ahora=None) -> bool:
+        """False cuando la próxima cita ya pasó y los contadores quedaron viejos."""
+        return self.proxima_en is None or self.proxima_en >= (ahora or timezone.now())
+
+    def __str__(self):
+        return f"{self.paciente_id}: {self.proximas} próximas, {self.historial} en historial"
+
+
+class CitaArchivada(models.Model):
+    """
+    Citas pasadas que ``agenda.archivo`` sacó de ``Cita`` (conservan su id).
+    Solo se leen: el historial del paciente las une a las de ``Cita``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    paciente = models.ForeignKey(
+        'Paciente', on_delete=models.CASCADE, related_name='citas_archivadas')
+    medico = models.ForeignKey(
+        'Medico', on_delete=models.PROTECT, related_name='citas_archivadas')
+    fecha = models.DateField()
+    hora = models.TimeField()
+    inicio = models.DateTimeField()
+    motivo = models.CharField(max_length=250, blank=True)
+    estado = models.CharField(max_length=12, choices=Cita.ESTADO)
+    creada = models.DateTimeField()
+    cancelada_por = models.ForeignKey(
+        'User', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    cancelada_en = models.DateTimeField(null=True, blank=True)
+    cancel_motivo = models.CharField(max_length=200, blank=True)
+    archivada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['fecha', 'hora']
+        indexes = [
+            models.Index(fields=['paciente', 'inicio'], name='archivo_paciente_inicio_idx'),
+        ]
+
+    # Siempre son pasadas: atendidas salvo que se hayan cancelado
+    @property
+    def estado_ui(self) -> str:
+        return "cancelada" if self.estado == "cancelada" else "atendida"
+
+    def estado_ui_en(self, ahora) -> str:
+        return self.estado_ui
+
+    @property
+    def estado_badge_class(self) -> str:
+        return "bg-secondary" if self.estado == "cancelada" else "bg-success"
+
+    def __str__(self):
+        return f"{self.fecha} {self.hora} - {self.paciente} con {self.medico} (archivada)"
+
+
+class Notificacion(models.Model):
+    """
+    Bandeja de salida de correos. Se escribe en la misma transacción que el
+    cambio de la cita y la vacía el comando ``enviar_notificaciones``.
+    """
+    TIPOS = [
+        ('confirmacion', 'Confirmación'),
+        ('recordatorio', 'Recordatorio'),
+        ('cancelacion', 'Cancelación'),
+    ]
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('enviada', 'Enviada'),
+        ('fallida', 'Fallida'),
+        ('descartada', 'Descartada'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    # Sin restricción en la BD: el archivo de citas borra filas con SQL directo
+    cita = models.ForeignKey(
+        'Cita', null=True, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='notificaciones')
+    estado = models.CharField(max_length=12, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    creada = models.DateTimeField(auto_now_add=True)
+    enviada_en = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='notif_pendientes_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} cita {self.cita_id} ({self.estado})"
@@ -0,0 +1,130 @@
+"""
+Notificaciones por correo con bandeja de salida (outbox).
+
+Las vistas nunca hablan con el servidor de correo: ``encolar`` inserta una
+fila en ``Notificacion`` dentro de la misma transacción que cambia la cita
+(si la transacción se revierte, la notificación también). El comando
+``enviar_notificaciones`` reclama lotes con un "arriendo" (corre
+``proximo_intento`` hacia adelante, así otro worker no los toma y, si este
+muere, vuelven a quedar disponibles), los envía en paralelo con un pool de
+hilos y reprograma los fallos con espera exponencial.
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notificacion
+
+MAX_INTENTOS = getattr(settings, "AGENDA_NOTIFICACIONES_MAX_INTENTOS", 5)
+ARRIENDO = timedelta(minutes=5)
+ESPERA_BASE = timedelta(seconds=30)
+ESPERA_MAX = timedelta(hours=1)
+
+
+def encolar(tipo: str, cita_id: int) -> Notificacion:
+    return Notificacion.objects.create(tipo=tipo, cita_id=cita_id)
+
+
+def encolar_muchas(tipo: str, cita_ids) -> int:
+    return len(Notificacion.objects.bulk_create(
+        [Notificacion(tipo=tipo, cita_id=pk) for pk in cita_ids], batch_size=5000))
+
+
+def espera(intentos: int) -> timedelta:
+    """Espera exponencial (30 s, 1 min, 2 min, …) con ±20 % de azar."""
+    base = min(ESPERA_BASE * 2 ** max(0, intentos - 1), ESPERA_MAX)
+    return base * random.uniform(0.8, 1.2)
+
+
+def reclamar(lote: int = 100) -> list:
+    """Toma hasta ``lote`` notificaciones vencidas y las arrienda a este worker."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Notificacion.objects.select_for_update(skip_locked=True)
+            .filter(estado="pendiente", proximo_intento__lte=ahora)
+            .order_by("proximo_intento")
+            .values_list("pk", flat=True)[:lote]
+        )
+        Notificacion.objects.filter(pk__in=ids).update(
+            proximo_intento=ahora + ARRIENDO, intentos=F("intentos") + 1)
+    return list(
+        Notificacion.objects.filter(pk__in=ids)
+        .select_related("cita__paciente__user", "cita__medico__especialidad")
+    )
+
+
+def componer(notificacion: Notificacion):
+    """EmailMessage listo para enviar, o None si ya no corresponde enviarlo."""
+    cita = notificacion.cita
+    if cita is None or not cita.paciente.user.email:
+        return None
+    if notificacion.tipo == "recordatorio" and cita.estado == "cancelada":
+        return None
+    user = cita.paciente.user
+    ctx = {"cita": cita, "nombre": user.get_full_name() or user.email}
+    plantilla = f"agenda/correos/{notificacion.tipo}"
+    asunto = render_to_string(f"{plantilla}_asunto.txt", ctx).strip()
+    cuerpo = render_to_string(f"{plantilla}.txt", ctx).strip() + "\n"
+    return EmailMessage(asunto, cuerpo, settings.DEFAULT_FROM_EMAIL, [user.email])
+
+
+def _enviar(pares) -> list:
+    """[(notificacion, mensaje)] -> [(notificacion, error o None)] con una conexión."""
+    try:
+        conexion = get_connection()
+        conexion.open()
+    except Exception as e:
+        return [(n, e) for n, _ in pares]
+    resultados = []
+    try:
+        for n, mensaje in pares:
+            try:
+                mensaje.connection = conexion
+                mensaje.send()
+                resultados.append((n, None))
+            except Exception as e:
+                resultados.append((n, e))
+    finally:
+        conexion.close()
+    return resultados
+
+
+def procesar(notificaciones, hilos: int = 4) -> dict:
+    """Envía un lote reclamado y registra el resultado. Devuelve los contadores."""
+    pares, descartadas = [], []
+    for n in notificaciones:
+        mensaje = componer(n)
+        if mensaje is None:
+            descartadas.append(n.pk)
+        else:
+            pares.append((n, mensaje))
+
+    grupos = [pares[i::hilos] for i in range(hilos) if pares[i::hilos]]
+    resultados = []
+    if grupos:
+        with ThreadPoolExecutor(max_workers=len(grupos)) as pool:
+            for parcial in pool.map(_enviar, grupos):
+                resultados.extend(parcial)
+
+    ahora = timezone.now()
+    enviadas = [n.pk for n, error in resultados if error is None]
+    fallidas = [(n, error) for n, error in resultados if error is not None]
+    Notificacion.objects.filter(pk__in=enviadas).update(
+        estado="enviada", enviada_en=ahora, error="")
+    Notificacion.objects.filter(pk__in=descartadas).update(estado="descartada")
+    for n, error in fallidas:
+        if n.intentos >= MAX_INTENTOS:
+            cambios = {"estado": "fallida"}
+        else:
+            cambios = {"proximo_intento": ahora + espera(n.intentos)}
+        Notificacion.objects.filter(pk=n.pk).update(error=str(error)[:2000], **cambios)
+    return {"enviadas": len(enviadas), "fallidas": len(fallidas),
+            "descartadas": len(descartadas)}
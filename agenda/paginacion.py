@@ -0,0 +1,104 @@
+"""
+Paginación por clave (keyset / seek) sobre ``(fecha, hora, id)``.
+
+En lugar de ``OFFSET`` cada página filtra a partir de la última fila de la
+anterior, así que el costo no crece con la profundidad y se aprovecha el
+índice ``(fecha, hora)``. El total se obtiene aparte con ``total_aproximado``.
+"""
+import base64
+import hashlib
+from datetime import date, time
+
+from django.db import connections
+from django.db.models import Q
+
+from . import cache as agenda_cache
+
+ORDEN = ("fecha", "hora", "id")
+ORDEN_INVERSO = ("-fecha", "-hora", "-id")
+
+
+def codificar_cursor(obj) -> str:
+    texto = f"{obj.fecha.isoformat()}|{obj.hora.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str):
+    """(fecha, hora, id) o None si el cursor no es válido."""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        f, h, pk = base64.urlsafe_b64decode(cursor + relleno).decode().split("|")
+        return date.fromisoformat(f), time.fromisoformat(h), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def _despues_de(qs, f, h, pk):
+    # fecha >= f abre un rango sobre el índice; el OR solo desempata dentro del día
+    return qs.filter(fecha__gte=f).filter(
+        Q(fecha__gt=f) | Q(hora__gt=h) | Q(hora=h, id__gt=pk))
+
+
+def _antes_de(qs, f, h, pk):
+    return qs.filter(fecha__lte=f).filter(
+        Q(fecha__lt=f) | Q(hora__lt=h) | Q(hora=h, id__lt=pk))
+
+
+class PaginaKeyset:
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = codificar_cursor(object_list[-1]) if has_next else ""
+        self.previous_cursor = codificar_cursor(object_list[0]) if has_previous else ""
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginar(qs, por_pagina: int = 20, despues: str = "", antes: str = "") -> PaginaKeyset:
+    """Página de ``qs`` tras el cursor ``despues`` o antes del cursor ``antes``."""
+    cursor_despues = decodificar_cursor(despues) if despues else None
+    cursor_antes = decodificar_cursor(antes) if antes and not cursor_despues else None
+
+    if cursor_antes:
+        filas = list(_antes_de(qs, *cursor_antes).order_by(*ORDEN_INVERSO)[:por_pagina + 1])
+        hay_mas = len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+        return PaginaKeyset(filas, has_next=bool(filas), has_previous=hay_mas)
+
+    if cursor_despues:
+        qs = _despues_de(qs, *cursor_despues)
+    filas = list(qs.order_by(*ORDEN)[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    return PaginaKeyset(filas, has_next=hay_mas, has_previous=bool(cursor_despues and filas))
+
+
+def _estimacion_postgres(modelo, alias):
+    with connections[alias].cursor() as cur:
+        cur.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [modelo._meta.db_table],
+        )
+        fila = cur.fetchone()
+    return fila[0] if fila and fila[0] >= 0 else None
+
+
+def total_aproximado(qs, filtros: dict, ttl: int = 60):
+    """
+    (total, exacto). Sin filtros en PostgreSQL usa la estadística del
+    planificador; si no, un ``COUNT(*)`` cacheado por conjunto de filtros que
+    se invalida cuando cambia alguna cita.
+    """
+    activos = {k: v for k, v in filtros.items() if v}
+    if not activos and connections[qs.db].vendor == "postgresql":
+        estimado = _estimacion_postgres(qs.model, qs.db)
+        if estimado is not None:
+            return estimado, False
+
+    huella = hashlib.sha1(repr(sorted(activos.items())).encode()).hexdigest()
+    return agenda_cache.obtener("citas", ("total", huella), qs.count, ttl), True
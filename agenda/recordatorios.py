@@ -0,0 +1,41 @@
+"""
+Recordatorios del día anterior.
+
+``encolar`` busca las citas activas de una fecha que aún no tienen
+recordatorio (rango sobre ``cita_estado_inicio_idx``) y, por lotes, las marca
+con ``recordatorio_en`` y encola su notificación en la misma transacción.
+Volver a correrlo no duplica nada: lo ya marcado queda fuera del filtro. El
+envío lo hace el worker de ``agenda.notificaciones``, que carga paciente,
+usuario, médico y especialidad de todo el lote con un solo ``select_related``.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import notificaciones
+from .models import Cita
+
+
+def pendientes(fecha):
+    desde = timezone.make_aware(datetime.combine(fecha, time.min))
+    hasta = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+    return Cita.objects.filter(
+        estado__in=Cita.ESTADOS_ACTIVOS, inicio__gte=desde, inicio__lt=hasta,
+        recordatorio_en__isnull=True,
+    )
+
+
+def encolar(fecha, lote: int = 1000):
+    """Encola los recordatorios de ``fecha`` por lotes; genera el tamaño de cada lote."""
+    while True:
+        with transaction.atomic():
+            ids = list(
+                pendientes(fecha).select_for_update(skip_locked=True)
+                .order_by("inicio").values_list("pk", flat=True)[:lote]
+            )
+            if not ids:
+                return
+            Cita.objects.filter(pk__in=ids).update(recordatorio_en=timezone.now())
+            notificaciones.encolar_muchas("recordatorio", ids)
+        yield len(ids)
@@ -0,0 +1,78 @@
+"""
+Servicio de reservas.
+
+La validación del formulario es solo una comprobación temprana: quien decide
+es la restricción única de bloque activo (``cita_bloque_activo_unico``). El
+INSERT va en su propio savepoint y, si otra reserva ganó el bloque, se
+devuelve un resultado "ocupado" con las alternativas más cercanas en vez de
+dejar escapar el IntegrityError.
+"""
+import random
+import time as reloj
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from django.db import IntegrityError, OperationalError, transaction
+
+from . import disponibilidad, horarios
+from .models import Cita
+
+REINTENTOS = 3
+
+
+class ResultadoReserva(NamedTuple):
+    cita: Optional[Cita]
+    alternativas: list  # [(fecha, Bloque)]
+
+    @property
+    def ok(self) -> bool:
+        return self.cita is not None
+
+
+def _bloque_tomado(medico_id, fecha, hora) -> bool:
+    return (
+        Cita.objects.filter(medico_id=medico_id, fecha=fecha, hora=hora)
+        .exclude(estado="cancelada")
+        .exists()
+    )
+
+
+def alternativas(medico_id: int, fecha, hora, n: int = 3, dias: int = 7) -> list:
+    """Los ``n`` bloques libres más cercanos a ``fecha``/``hora`` en los próximos ``dias``."""
+    mapas = disponibilidad.ocupacion_rango(
+        medico_id, fecha, fecha + timedelta(days=dias))
+    objetivo = datetime.combine(fecha, hora)
+    candidatos = []
+    for i in range(dias + 1):
+        f = fecha + timedelta(days=i)
+        for b in horarios.libres(medico_id, f, mapas.get(f, 0)):
+            distancia = abs(datetime.combine(f, b.hora) - objetivo)
+            candidatos.append((distancia, f, b))
+        if len(candidatos) >= n and i > 0:
+            break
+    candidatos.sort(key=lambda c: c[0])
+    return [(f, b) for _, f, b in candidatos[:n]]
+
+
+def reservar(paciente, medico, fecha, hora, motivo: str = "") -> ResultadoReserva:
+    """
+    Reserva el bloque de forma atómica. Los bloqueos transitorios de la BD
+    (p. ej. "database is locked" o un deadlock) se reintentan con espera
+    aleatoria; el choque con otra reserva no se reintenta.
+    """
+    for intento in range(REINTENTOS):
+        try:
+            with transaction.atomic():
+                cita = Cita.objects.create(
+                    paciente=paciente, medico=medico,
+                    fecha=fecha, hora=hora, motivo=motivo,
+                )
+            return ResultadoReserva(cita, [])
+        except IntegrityError:
+            if not _bloque_tomado(medico.pk, fecha, hora):
+                raise
+            return ResultadoReserva(None, alternativas(medico.pk, fecha, hora))
+        except OperationalError:
+            if intento == REINTENTOS - 1:
+                raise
+            reloj.sleep(random.uniform(0.01, 0.05) * (intento + 1))
@@ -0,0 +1,64 @@
+"""
+Resumen por paciente para el panel de inicio.
+
+``ResumenPaciente`` guarda la próxima cita y los contadores del paciente. Las
+señales de ``Cita`` lo recalculan dentro del ``atomic`` de ``Cita.save``: si
+el recálculo falla, el cambio de la cita también se revierte. Además, como
+el paso del tiempo también lo vuelve viejo (la próxima cita deja de ser
+futura), ``de`` lo recalcula a demanda cuando su ``proxima_en`` ya pasó.
+Las operaciones masivas que no disparan señales lo borran con ``descartar``
+y se reconstruye en la siguiente lectura.
+"""
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Cita, CitaArchivada, ResumenPaciente
+
+
+def _criterios(ahora):
+    futuras = Q(inicio__gte=ahora)
+    proximas = futuras & Q(estado__in=Cita.ESTADOS_ACTIVOS)
+    # Igual que el historial de ``perfil``
+    historial = ~futuras | Q(estado="cancelada")
+    return proximas, historial
+
+
+def recalcular(paciente_id: int, ahora=None) -> ResumenPaciente:
+    ahora = ahora or timezone.now()
+    proximas, historial = _criterios(ahora)
+    citas = Cita.objects.filter(paciente_id=paciente_id)
+    contadores = citas.aggregate(
+        proximas=Count("id", filter=proximas),
+        historial=Count("id", filter=historial),
+    )
+    contadores["historial"] += CitaArchivada.objects.filter(paciente_id=paciente_id).count()
+    proxima = citas.filter(proximas).order_by("inicio").values("id", "inicio").first()
+    resumen, _ = ResumenPaciente.objects.update_or_create(
+        paciente_id=paciente_id,
+        defaults={
+            "proxima_cita_id": proxima and proxima["id"],
+            "proxima_en": proxima and proxima["inicio"],
+            **contadores,
+        },
+    )
+    return resumen
+
+
+def de(paciente_id: int) -> ResumenPaciente:
+    """Resumen vigente del paciente (una lectura por PK en el caso común)."""
+    resumen = (
+        ResumenPaciente.objects
+        .select_related("proxima_cita__medico__especialidad")
+        .filter(pk=paciente_id).first()
+    )
+    if resumen is None or not resumen.vigente():
+        resumen = recalcular(paciente_id)
+    return resumen
+
+
+def descartar(pacientes=None) -> int:
+    """Borra resúmenes (todos, o los de ``pacientes``: ids o subconsulta)."""
+    qs = ResumenPaciente.objects.all()
+    if pacientes is not None:
+        qs = qs.filter(paciente_id__in=pacientes)
+    return qs.delete()[0]
@@ -0,0 +1,87 @@
+"""
+Roles del usuario resueltos una vez por petición.
+
+``RolesMiddleware`` los expone como ``request.roles`` y guards, context
+processors y template tags los toman de ahí con ``de_peticion``, así que
+comparten una sola consulta. ``roles_de(user)`` los memoriza en el propio
+objeto ``user`` para el código sin petición. Con ``AGENDA_ROLES_EN_SESION`` el
+id del Paciente se guarda además en la sesión y las siguientes peticiones no
+consultan la BD para saber si el usuario es paciente.
+"""
+from django.conf import settings
+from django.utils.functional import cached_property
+
+from .models import Paciente
+
+CLAVE_SESION = "_agenda_roles"
+
+
+class Roles:
+    def __init__(self, user, session=None):
+        self.user = user
+        self.session = session
+        self._paciente_id = None
+        if session is not None and getattr(settings, "AGENDA_ROLES_EN_SESION", True):
+            guardado = session.get(CLAVE_SESION)
+            if guardado and guardado.get("user") == user.pk:
+                self._paciente_id = guardado.get("paciente")
+
+    @cached_property
+    def paciente(self):
+        """Fila de Paciente del usuario (o None), cargada como mucho una vez."""
+        if not self.user.is_authenticated:
+            return None
+        # Por usuario y no por el id de la sesión, que puede haber quedado viejo
+        paciente = Paciente.objects.filter(user=self.user).first()
+        self._recordar(paciente)
+        return paciente
+
+    @property
+    def es_paciente(self) -> bool:
+        if self._paciente_id and "paciente" not in self.__dict__:
+            return True
+        return self.paciente is not None
+
+    @property
+    def es_medico(self) -> bool:
+        # Medico no tiene vínculo con User (se eliminó en 0010)
+        return False
+
+    @property
+    def es_staff(self) -> bool:
+        return self.user.has_perm("agenda.access_consultorio")
+
+    def asignar_paciente(self, paciente) -> None:
+        self.__dict__["paciente"] = paciente
+        self._recordar(paciente)
+
+    def _recordar(self, paciente) -> None:
+        self._paciente_id = paciente.pk if paciente else None
+        if paciente is None:
+            # El id guardado ya no existe (o nunca fue de este usuario)
+            if self.session is not None and CLAVE_SESION in self.session:
+                del self.session[CLAVE_SESION]
+            return
+        if self.session is not None and getattr(settings, "AGENDA_ROLES_EN_SESION", True):
+            valor = {"user": self.user.pk, "paciente": paciente.pk}
+            if self.session.get(CLAVE_SESION) != valor:
+                self.session[CLAVE_SESION] = valor
+
+
+def roles_de(user, session=None) -> Roles:
+    roles = getattr(user, "_agenda_roles", None)
+    if roles is None:
+        roles = Roles(user, session)
+        try:
+            user._agenda_roles = roles
+        except AttributeError:
+            pass
+    return roles
+
+
+def de_peticion(request) -> Roles:
+    """``request.roles`` (``RolesMiddleware``); sin el middleware, los de ``request.user``."""
+    roles = getattr(request, "roles", None)
+    if roles is None:
+        roles = roles_de(request.user, getattr(request, "session", None))
+    return roles
@@ -0,0 +1,176 @@
+"""
+Réplica de lectura con "lee lo que escribiste".
+
+Si ``DATABASES`` define el alias ``replica`` (ver ``DB_REPLICA_*`` en
+settings), las lecturas hechas dentro de ``lectura_replica`` (decorador de
+vistas) o de ``en_replica()`` (bloque) van a la réplica; todo lo demás, y
+cualquier escritura, sigue en ``default``. Sin réplica configurada (o con
+``AGENDA_REPLICA=False``) el router no hace nada.
+
+Las demás lecturas no van a la réplica por defecto: solo las vistas marcadas
+toleran su atraso, y p. ej. las validaciones de una reserva deben ver la
+primaria.
+
+La réplica puede ir algo atrasada. Para que quien acaba de agendar o
+cancelar vea su cambio al ser redirigido, ``ReplicaMiddleware`` marca la
+sesión tras escribir una cita, un paciente o un médico y, durante
+``AGENDA_REPLICA_VENTANA`` segundos, todas sus lecturas van a la primaria.
+Las sesiones nunca se leen de la réplica.
+
+Las cachés versionadas (``agenda.cache``) tienen el problema inverso: otra
+sesión podría leer de la réplica un dato viejo y guardarlo bajo la versión
+nueva. ``cacheable`` evita guardar lo leído de la réplica mientras la versión
+sea más nueva que la ventana.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import cache as agenda_cache
+
+REPLICA = "replica"
+VENTANA = getattr(settings, "AGENDA_REPLICA_VENTANA", 10)
+CLAVE_SESION = "_agenda_primaria_hasta"
+
+# Escribir en estos modelos fija la sesión a la primaria
+MODELOS_FIJAN = {"agenda.cita", "agenda.paciente", "agenda.medico"}
+# Apps que se leen siempre de la primaria
+SOLO_PRIMARIA = {"sessions"}
+
+_en_replica = ContextVar("agenda_en_replica", default=False)
+_peticion = ContextVar("agenda_peticion", default=None)
+
+
+class _Peticion:
+    """Estado de la petición en curso (mutable: lo marca ``db_for_write``)."""
+    __slots__ = ("fijada", "escribio")
+
+    def __init__(self, fijada: bool):
+        self.fijada = fijada
+        self.escribio = False
+
+
+def hay_replica() -> bool:
+    return REPLICA in settings.DATABASES and getattr(settings, "AGENDA_REPLICA", True)
+
+
+@contextmanager
+def en_replica():
+    marca = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(marca)
+
+
+def lectura_replica(view_func):
+    """Las lecturas de los GET/HEAD de la vista van a la réplica."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _avista(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await view_func(request, *args, **kwargs)
+            with en_replica():
+                return await view_func(request, *args, **kwargs)
+        return _avista
+
+    @wraps(view_func)
+    def _vista(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view_func(request, *args, **kwargs)
+        with en_replica():
+            return view_func(request, *args, **kwargs)
+    return _vista
+
+
+def lee_de_replica() -> bool:
+    if not _en_replica.get() or not hay_replica():
+        return False
+    peticion = _peticion.get()
+    if peticion is not None and peticion.fijada:
+        return False
+    # Dentro de una transacción en la primaria se lee lo que esta ve
+    return not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def _reciente(version: int) -> bool:
+    return time.time() - version / 1_000_000 < VENTANA
+
+
+def cacheable(nombre: str) -> bool:
+    """¿Se puede guardar en caché lo leído ahora para el espacio ``nombre``?"""
+    return not lee_de_replica() or not _reciente(agenda_cache.version(nombre))
+
+
+async def acacheable(nombre: str) -> bool:
+    return not lee_de_replica() or not _reciente(await agenda_cache.aversion(nombre))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in SOLO_PRIMARIA or not lee_de_replica():
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        peticion = _peticion.get()
+        if peticion is not None and model._meta.label_lower in MODELOS_FIJAN:
+            peticion.fijada = peticion.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Misma BD lógica: un objeto leído de la réplica puede relacionarse
+        # con uno de la primaria
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaMiddleware:
+    """
+    Fija a la primaria, por ``VENTANA`` segundos, la sesión que escribió.
+    Va después de SessionMiddleware; sin réplica no toca la sesión.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sesion = getattr(request, "session", None)
+        if sesion is None or not hay_replica():
+            return self.get_response(request)
+        peticion = _Peticion(sesion.get(CLAVE_SESION, 0) > time.time())
+        marca = _peticion.set(peticion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion.reset(marca)
+        if peticion.escribio:
+            sesion[CLAVE_SESION] = time.time() + VENTANA
+        return response
+
+    async def __acall__(self, request):
+        sesion = getattr(request, "session", None)
+        if sesion is None or not hay_replica():
+            return await self.get_response(request)
+        peticion = _Peticion(await sesion.aget(CLAVE_SESION, 0) > time.time())
+        marca = _peticion.set(peticion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion.reset(marca)
+        if peticion.escribio:
+            await sesion.aset(CLAVE_SESION, time.time() + VENTANA)
+        return response
@@ -1,9 +1,115 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save,
+)
 from django.dispatch import receiver
-from .models import User, Paciente
+from . import busqueda, cache as agenda_cache, disponibilidad, notificaciones, resumen
+from .models import (
+    Cita, Especialidad, ExcepcionHorario, Feriado, Medico, Paciente,
+    PlantillaHorario, User,
+)
 
 
 @receiver(post_save, sender=User)
 def ensure_paciente_profile(sender, instance: User, created, **kwargs):
     if created:
         Paciente.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Paciente)
+def normalizar_busqueda_paciente(sender, instance: Paciente, raw=False, **kwargs):
+    if not raw and instance.user_id:
+        instance.busqueda = busqueda.texto_de(instance.user)
+
+
+@receiver(post_save, sender=User)
+def sincronizar_busqueda_usuario(sender, instance: User, created, raw=False,
+                                 update_fields=None, **kwargs):
+    campos = {"first_name", "last_name", "email"}
+    if update_fields is not None and not campos & set(update_fields):
+        return  # p. ej. el update de last_login en cada login
+    if not created and not raw:
+        cambiados = Paciente.objects.filter(user=instance).exclude(
+            busqueda=busqueda.texto_de(instance)
+        ).update(busqueda=busqueda.texto_de(instance))
+        if cambiados:
+            # El consultorio muestra el nombre del paciente en sus tablas cacheadas
+            agenda_cache.invalidar("citas")
+
+
+@receiver(post_migrate)
+def instalar_indices_busqueda(sender, using="default", **kwargs):
+    if sender.name == "agenda":
+        from django.db import connections
+        busqueda.instalar_indices(connections[using])
+
+
+# Los receptores de Cita corren dentro del atomic de Cita.save (y del de
+# Collector.delete): si uno falla, la cita tampoco se guarda.
+
+@receiver(pre_delete, sender=Cita)
+def cargar_bloque(sender, instance: Cita, using, **kwargs):
+    # Tras el DELETE ya no se podrían leer los campos diferidos
+    instance._cargar_diferidos(using)
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_ocupacion(sender, instance: Cita, raw=False, **kwargs):
+    if raw:
+        return
+    disponibilidad.sincronizar(instance.bloque_original(), instance.bloque_ocupado())
+
+
+@receiver(post_delete, sender=Cita)
+def liberar_ocupacion(sender, instance: Cita, **kwargs):
+    disponibilidad.sincronizar(instance.bloque_original(), None)
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_resumen(sender, instance: Cita, raw=False, update_fields=None, **kwargs):
+    campos = {"estado", "fecha", "hora", "paciente"}
+    if raw or (update_fields is not None and not campos & set(update_fields)):
+        return
+    anterior = instance.original("paciente_id")
+    if anterior and anterior != instance.paciente_id:
+        resumen.recalcular(anterior)
+    resumen.recalcular(instance.paciente_id)
+
+
+@receiver(post_save, sender=Cita)
+def encolar_notificacion(sender, instance: Cita, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = instance.original("estado")
+    if created and instance.estado != "cancelada":
+        notificaciones.encolar("confirmacion", instance.pk)
+    elif not created and instance.estado == "cancelada" and anterior != "cancelada":
+        notificaciones.encolar("cancelacion", instance.pk)
+
+
+@receiver(post_delete, sender=Cita)
+def descartar_resumen(sender, instance: Cita, **kwargs):
+    # Si se está borrando el paciente completo, el resumen cae por CASCADE
+    resumen.descartar([instance.paciente_id])
+
+
+@receiver([post_save, post_delete], sender=Cita)
+def invalidar_citas(sender, using=None, **kwargs):
+    # Totales cacheados del consultorio y demás datos derivados de las citas.
+    # Tras el commit: antes, otra petición podría cachear el dato viejo bajo
+    # la versión nueva.
+    transaction.on_commit(lambda: agenda_cache.invalidar("citas"), using=using)
+
+
+@receiver([post_save, post_delete], sender=Medico)
+@receiver([post_save, post_delete], sender=PlantillaHorario)
+@receiver([post_save, post_delete], sender=Feriado)
+@receiver([post_save, post_delete], sender=ExcepcionHorario)
+def invalidar_horarios(sender, **kwargs):
+    agenda_cache.invalidar("horarios")
+
+
+@receiver([post_save, post_delete], sender=Especialidad)
+@receiver([post_save, post_delete], sender=Medico)
+def invalidar_catalogo(sender, **kwargs):
+    agenda_cache.invalidar("catalogo")
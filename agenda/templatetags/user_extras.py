@@ -1,31 +1,32 @@
 from django import template
-from agenda.models import Medico, Paciente
+from agenda.roles import de_peticion, roles_de
 
 register = template.Library()
 
 
-@register.simple_tag
-def has_medico(user):
+def _roles(context, user):
+    # Los de la petición si el usuario es el de la petición
+    request = context.get("request")
+    if request is not None and getattr(request, "user", None) == user:
+        return de_peticion(request)
+    return roles_de(user)
+
+
+@register.simple_tag(takes_context=True)
+def has_medico(context, user):
     """
     Retorna True si el usuario tiene perfil de médico.
     """
     if not user.is_authenticated:
         return False
-    try:
-        # Intenta acceder al perfil del médico asociado al usuario
-        return Medico.objects.filter(user=user).exists()
-    except Exception:
-        return False
+    return _roles(context, user).es_medico
 
 
-@register.simple_tag
-def has_paciente(user):
+@register.simple_tag(takes_context=True)
+def has_paciente(context, user):
     """
     Retorna True si el usuario tiene perfil de paciente.
     """
     if not user.is_authenticated:
         return False
-    try:
-        return Paciente.objects.filter(user=user).exists()
-    except Exception:
-        return False
+    return _roles(context, user).es_paciente
@@ -0,0 +1,68 @@
+"""
+Ayudas para tests: presupuesto de consultas por vista y el router de la
+réplica de pruebas.
+
+    from agenda.testing import PresupuestoConsultasMixin
+
+    class VistasTests(PresupuestoConsultasMixin, TestCase):
+        def test_perfil(self):
+            self.client.force_login(self.paciente.user)
+            self.assertPresupuesto("agenda:perfil")
+"""
+from contextlib import contextmanager
+
+from django.urls import reverse
+
+from .instrumentacion import medir
+from .routers import ReplicaRouter
+
+# Consultas máximas por vista en estado estable (cachés llenas; sesión y
+# usuario incluidos). agenda.tests las verifica en cada `manage.py test`.
+PRESUPUESTOS = {
+    "agenda:inicio": 8,
+    "agenda:perfil": 8,
+    "agenda:agendar_cita": 7,
+    "agenda:consultorio_citas": 10,
+    "agenda:ajax_medicos": 4,
+    "agenda:ajax_horas": 4,
+    "agenda:ajax_disponibilidad": 4,
+}
+
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+@contextmanager
+def presupuesto_consultas(maximo: int, etiqueta: str = ""):
+    """Falla si el bloque ejecuta más de ``maximo`` consultas; lista las repetidas."""
+    with medir() as medicion:
+        yield medicion
+    if medicion.total > maximo:
+        detalle = "\n".join(
+            f"  {n}× {h[:160]}" for h, n in medicion.duplicadas().items())
+        raise PresupuestoExcedido(
+            f"{etiqueta or 'bloque'}: {medicion.total} consultas "
+            f"(presupuesto {maximo})" + (f"\nRepetidas:\n{detalle}" if detalle else ""))
+
+
+class PresupuestoConsultasMixin:
+    """Mixin para ``TestCase`` que usa ``self.client``."""
+
+    def assertPresupuesto(self, nombre_url, maximo=None, *, args=None,
+                          kwargs=None, data=None, metodo="get"):
+        maximo = PRESUPUESTOS[nombre_url] if maximo is None else maximo
+        url = reverse(nombre_url, args=args, kwargs=kwargs)
+        with presupuesto_consultas(maximo, nombre_url):
+            response = getattr(self.client, metodo)(url, data or {})
+        return response
+
+
+class ReplicaRouterPruebas(ReplicaRouter):
+    """
+    La réplica de ``settings_test`` es otra BD sin replicación: se migra como
+    la primaria para que tenga el esquema.
+    """
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -0,0 +1,971 @@
+import io
+import smtplib
+import time as time_module
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from threading import Barrier
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import Permission
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import ScryptPasswordHasher
+from django.db import IntegrityError, connection, router, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import crypto, timezone
+
+from . import checks, context_processors, fragmentos, hashers, roles, routers
+from . import (
+    archivo, busqueda, cancelaciones, catalogo, disponibilidad, horarios, kpis, notificaciones, paginacion,
+    recordatorios, reservas, resumen, views,
+)
+from .management.commands.explicar_consultas import Command as ExplicarConsultas
+from .testing import PRESUPUESTOS, PresupuestoConsultasMixin
+from .forms import CitaForm, RegistroForm
+from .models import (
+    Cita, CitaArchivada, Especialidad, Medico, Notificacion, OcupacionDia, Paciente,
+    PlantillaHorario, ResumenPaciente, User,
+)
+
+
+class DatosAgenda(TestCase):
+    """Un médico y un paciente; las citas se crean en cada test."""
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = Especialidad.objects.create(nombre="Cardiología")
+        cls.medico = Medico.objects.create(nombre="Dra. Rojas", especialidad=especialidad)
+        cls.user = User.objects.create_user("paciente@medidate.test", "clave-123")
+        cls.paciente = cls.user.paciente
+        cls.fecha = timezone.localdate() + timedelta(days=30)
+
+    def crear_cita(self, hora=time(9, 0), **campos):
+        return Cita.objects.create(
+            paciente=self.paciente, medico=self.medico, fecha=self.fecha, hora=hora, **campos)
+
+    def ocupacion(self):
+        return disponibilidad.ocupacion(self.medico.pk, self.fecha)
+
+
+class OcupacionTests(DatosAgenda):
+    def test_reservar_y_cancelar_marcan_y_liberan_el_bloque(self):
+        cita = self.crear_cita()
+        self.assertEqual(self.ocupacion(), disponibilidad.mascara([time(9, 0)]))
+        self.assertTrue(cita.cancelar(None))
+        self.assertEqual(self.ocupacion(), 0)
+
+    def test_cancelar_con_campos_diferidos_libera_el_bloque(self):
+        cita = self.crear_cita()
+        diferida = Cita.objects.only("estado").get(pk=cita.pk)
+        diferida.estado = "cancelada"
+        diferida.save(update_fields=["estado"])
+        self.assertEqual(self.ocupacion(), 0)
+
+    def test_refresh_from_db_renueva_el_bloque_original(self):
+        cita = self.crear_cita()
+        otra = Cita.objects.get(pk=cita.pk)
+        otra.hora = time(10, 0)
+        otra.save()
+        cita.refresh_from_db()
+        cita.estado = "cancelada"
+        cita.save()
+        self.assertEqual(self.ocupacion(), 0)
+
+    def test_borrar_con_campos_diferidos_libera_el_bloque(self):
+        cita = self.crear_cita()
+        Cita.objects.only("pk").get(pk=cita.pk).delete()
+        self.assertEqual(self.ocupacion(), 0)
+
+    def test_fallo_al_actualizar_la_ocupacion_revierte_la_cita(self):
+        cita = self.crear_cita()
+        with mock.patch.object(disponibilidad, "liberar", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                cita.cancelar(None)
+        self.assertEqual(Cita.objects.get(pk=cita.pk).estado, "pendiente")
+        self.assertNotEqual(self.ocupacion(), 0)
+        # La instancia sigue reflejando lo guardado: reintentar funciona
+        cita.refresh_from_db()
+        self.assertTrue(cita.cancelar(None))
+        self.assertEqual(self.ocupacion(), 0)
+
+
+class VariantesAsyncTests(DatosAgenda):
+    """Las variantes async leen y llenan las mismas entradas de caché."""
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_mismos_bloques_libres_que_la_version_sincrona(self):
+        await Cita.objects.acreate(
+            paciente=self.paciente, medico=self.medico, fecha=self.fecha, hora=time(9, 0))
+        mapas = await disponibilidad.aocupacion_rango(self.medico.pk, self.fecha, self.fecha)
+        libres = await horarios.alibres_rango(self.medico.pk, [self.fecha], mapas)
+        esperado = await sync_to_async(horarios.libres)(
+            self.medico.pk, self.fecha, mapas[self.fecha])
+        self.assertEqual(libres[self.fecha], esperado)
+        self.assertNotIn(time(9, 0), [b.hora for b in libres[self.fecha]])
+
+    def test_comparten_la_cache_con_la_version_sincrona(self):
+        medicos = async_to_sync(catalogo.amedicos)(self.medico.especialidad_id)
+        self.assertEqual(medicos, [self.medico])
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogo.medicos(), [self.medico])
+
+
+class VentanasTests(TestCase):
+    def test_acepta_ventanas_multiplo_del_paso(self):
+        horarios.validar_ventanas("09:00-13:00,15:00-19:00")
+        horarios.validar_ventanas("09:00-12:00", paso_min=60)
+
+    def test_rechaza_fin_no_alineado_al_paso(self):
+        for ventanas, paso in (("09:00-12:10", 30), ("09:00-12:30", 60)):
+            with self.subTest(ventanas=ventanas, paso=paso):
+                with self.assertRaises(ValidationError):
+                    horarios.validar_ventanas(ventanas, paso_min=paso)
+
+    def test_plantilla_valida_con_su_paso(self):
+        plantilla = PlantillaHorario(nombre="Tarde", ventanas="15:00-18:30", paso_min=60)
+        with self.assertRaises(ValidationError):
+            plantilla.full_clean()
+
+
+class ReservasConcurrentesTests(TransactionTestCase):
+    HILOS = 20
+
+    def test_solo_una_reserva_gana_el_bloque(self):
+        especialidad = Especialidad.objects.create(nombre="Pediatría")
+        medico = Medico.objects.create(nombre="Dr. Soto", especialidad=especialidad)
+        pacientes = [
+            User.objects.create_user(f"p{i}@medidate.test").paciente for i in range(self.HILOS)]
+        fecha = timezone.localdate() + timedelta(days=1)
+        while not horarios.bloques_para(medico.pk, fecha):
+            fecha += timedelta(days=1)
+        hora = horarios.bloques_para(medico.pk, fecha)[0].hora
+        barrera = Barrier(self.HILOS)
+
+        def reservar(paciente):
+            try:
+                barrera.wait(timeout=5)
+                return "ok" if reservas.reservar(paciente, medico, fecha, hora).ok else "ocupado"
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+            resultados = Counter(pool.map(reservar, pacientes))
+
+        self.assertEqual(resultados, {"ok": 1, "ocupado": self.HILOS - 1})
+        self.assertEqual(
+            Cita.objects.filter(medico=medico, fecha=fecha, hora=hora).count(), 1)
+        self.assertEqual(
+            disponibilidad.ocupacion(medico.pk, fecha), disponibilidad.mascara([hora]))
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for nombre, apellido, email in (
+            ("José", "Núñez", "jnunez@correo.cl"),
+            ("Ana", "Pérez", "ana.perez@correo.cl"),
+            ("Luis", "Muñoz", "lm@clinica.cl"),
+        ):
+            User.objects.create_user(email, first_name=nombre, last_name=apellido)
+
+    def buscar(self, q):
+        return set(busqueda.filtrar(Paciente.objects.all(), q).values_list("busqueda", flat=True))
+
+    def test_cada_termino_se_busca_como_subcadena(self):
+        todos = list(Paciente.objects.values_list("busqueda", flat=True))
+        for q in ("úñe", "NUNEZ", "pér", "ez", "jos nu", "correo", "an pe", "uñoz clin", "xyz"):
+            terminos = busqueda.normalizar(q).split()
+            esperado = {b for b in todos if all(t in b for t in terminos)}
+            with self.subTest(q=q):
+                self.assertEqual(self.buscar(q), esperado)
+
+    def test_subcadena_a_mitad_de_palabra(self):
+        self.assertEqual(self.buscar("úñe"), {"jose nunez jnunez@correo.cl"})
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 solo existe en SQLite")
+    def test_sqlite_usa_la_tabla_fts(self):
+        self.assertTrue(busqueda._fts_disponible(connection))
+        self.assertIn("MATCH", str(busqueda.filtrar(Paciente.objects.all(), "nunez").query))
+
+
+@skipUnless(connection.vendor == "sqlite", "se lee el EXPLAIN QUERY PLAN de SQLite")
+class PlanesConsultasTests(DatosAgenda):
+    """Las consultas de ventanas de tiempo usan los índices por ``inicio``."""
+
+    def setUp(self):
+        for h in range(8, 12):
+            self.crear_cita(hora=time(h, 0))
+
+    def test_cada_consulta_usa_su_indice(self):
+        for nombre, indice, qs in ExplicarConsultas()._consultas():
+            with self.subTest(consulta=nombre):
+                self.assertIn(f"USING INDEX {indice}", qs.explain())
+
+    def test_el_comando_no_reporta_fallas(self):
+        salida = io.StringIO()
+        call_command("explicar_consultas", stdout=salida)
+        self.assertNotIn("FALLA", salida.getvalue())
+
+
+class PresupuestoVistasTests(PresupuestoConsultasMixin, DatosAgenda):
+    """
+    Cada vista de ``PRESUPUESTOS`` en estado estable: una primera petición
+    llena las cachés (horarios, catálogo, fragmentos) y los roles en sesión,
+    y se mide la segunda.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user("staff@medidate.test", is_staff=True)
+        cls.staff.user_permissions.add(
+            Permission.objects.get(codename="access_consultorio"))
+        for i in range(5):
+            Cita.objects.create(paciente=cls.paciente, medico=cls.medico,
+                                fecha=cls.fecha + timedelta(days=i), hora=time(9, 0))
+
+    def setUp(self):
+        cache.clear()
+
+    def assertVista(self, nombre_url, user=None, data=None):
+        self.client.force_login(user or self.user)
+        self.assertEqual(self.client.get(reverse(nombre_url), data or {}).status_code, 200)
+        response = self.assertPresupuesto(nombre_url, data=data)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cubre_todas_las_vistas_con_presupuesto(self):
+        probadas = {n[len("test_"):].replace("__", ":") for n in dir(self)
+                    if n.startswith("test_agenda__")}
+        self.assertEqual(probadas, set(PRESUPUESTOS))
+
+    def test_agenda__inicio(self):
+        self.assertVista("agenda:inicio")
+
+    def test_agenda__perfil(self):
+        self.assertVista("agenda:perfil")
+
+    def test_agenda__agendar_cita(self):
+        self.assertVista("agenda:agendar_cita")
+
+    def test_agenda__consultorio_citas(self):
+        self.assertVista("agenda:consultorio_citas", user=self.staff)
+
+    def test_agenda__ajax_medicos(self):
+        self.assertVista("agenda:ajax_medicos", data={"especialidad": self.medico.especialidad_id})
+
+    def test_agenda__ajax_horas(self):
+        self.assertVista("agenda:ajax_horas", data={"medico": self.medico.pk, "fecha": self.fecha})
+
+    def test_agenda__ajax_disponibilidad(self):
+        self.assertVista("agenda:ajax_disponibilidad", data={
+            "medico": self.medico.pk, "desde": self.fecha,
+            "hasta": self.fecha + timedelta(days=13)})
+
+
+class FragmentosTests(DatosAgenda):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def perfil(self):
+        return self.client.get(reverse("agenda:perfil")).content.decode()
+
+    @override_settings(AGENDA_FRAGMENTOS=True)
+    def test_la_tabla_se_cachea_hasta_el_siguiente_cambio(self):
+        cita = self.crear_cita()
+        self.perfil()
+        with mock.patch.object(fragmentos, "render_to_string") as render:
+            self.perfil()
+        render.assert_not_called()
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.cancelar(self.user)
+        self.assertNotIn("Sin historial de citas.", self.perfil())
+
+    @override_settings(AGENDA_FRAGMENTOS=False)
+    def test_desactivados_se_renderizan_sin_la_cache(self):
+        self.crear_cita()
+        with mock.patch.object(fragmentos.cache, "set") as guardar:
+            self.perfil()
+        self.assertFalse(any("fragmento" in c.args[0] for c in guardar.call_args_list))
+
+    @override_settings(AGENDA_FRAGMENTOS=True, AGENDA_CACHE_CATALOGO=True)
+    def test_exigen_una_cache_compartida(self):
+        errores = checks.cache_compartida(None)
+        self.assertEqual([e.id for e in errores], ["agenda.E003"] * 2)
+        self.assertIn("AGENDA_CACHE_CATALOGO", errores[1].msg)
+        with override_settings(CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(checks.cache_compartida(None), [])
+
+
+class SeedBulkTests(TestCase):
+    def sembrar(self):
+        call_command("seed_bulk", especialidades=2, medicos=3, pacientes=20, citas=300,
+                     futuro_dias=2, semilla=5, stdout=io.StringIO())
+
+    def test_conserva_creada_generada(self):
+        self.sembrar()
+        citas = Cita.objects.all()
+        self.assertEqual(citas.count(), 300)
+        self.assertFalse(citas.filter(creada__gt=F("inicio")).exists())
+        self.assertFalse(citas.filter(cancelada_en__lt=F("creada")).exists())
+        # Las pasadas se crearon días antes, no a la hora de la carga
+        self.assertGreater(citas.order_by().values("creada__date").distinct().count(), 10)
+
+    def test_repetir_la_semilla_no_choca_con_los_emails(self):
+        self.sembrar()
+        self.sembrar()
+        self.assertEqual(User.objects.filter(email__endswith="@seed.medidate.test").count(), 40)
+
+
+class ExportarTests(DatosAgenda):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user("staff@medidate.test", is_staff=True)
+        cls.staff.user_permissions.add(
+            Permission.objects.get(codename="access_consultorio"))
+
+    def setUp(self):
+        self.crear_cita()
+        self.client.force_login(self.staff)
+
+    def exportar(self, **params):
+        return self.client.get(reverse("agenda:consultorio_exportar"), params)
+
+    def test_csv(self):
+        response = self.exportar()
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("Dra. Rojas", b"".join(response.streaming_content).decode())
+
+    @skipUnless(views.XLSX_DISPONIBLE, "openpyxl no está instalado")
+    def test_xlsx(self):
+        response = self.exportar(formato="xlsx")
+        self.assertEqual(
+            response["Content-Type"],
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+    def test_sin_openpyxl_no_cambia_de_formato(self):
+        with mock.patch.object(views, "XLSX_DISPONIBLE", False):
+            listado = self.client.get(reverse("agenda:consultorio_citas"))
+            self.assertNotContains(listado, "Exportar XLSX")
+            response = self.exportar(formato="xlsx", estado="pendiente")
+        self.assertRedirects(
+            response, reverse("agenda:consultorio_citas") + "?estado=pendiente",
+            fetch_redirect_response=False)
+
+
+class CancelacionLoteTests(DatosAgenda):
+    def cancelar_dia(self):
+        return cancelaciones.cancelar_rango(
+            self.medico.pk, self.fecha, self.fecha, None, "Licencia")
+
+    def test_cancela_libera_y_avisa(self):
+        for h in (9, 10, 11):
+            self.crear_cita(hora=time(h, 0))
+        self.assertEqual(self.cancelar_dia(), 3)
+        self.assertEqual(self.ocupacion(), 0)
+        self.assertEqual(Notificacion.objects.filter(tipo="cancelacion").count(), 3)
+
+    def test_no_pisa_una_cancelacion_hecha_entre_medio(self):
+        propia = self.crear_cita(hora=time(9, 0))
+        self.crear_cita(hora=time(10, 0))
+        # El paciente cancela después de que el lote leyó las vigentes
+        leidas = cancelaciones.vigentes
+
+        def vigentes_y_cancelacion(qs=None):
+            ids = list(leidas(qs).values_list("pk", flat=True))
+            Cita.objects.get(pk=propia.pk).cancelar(self.user, "No puedo ir")
+            return Cita.objects.filter(pk__in=ids)
+
+        with mock.patch.object(cancelaciones, "vigentes", vigentes_y_cancelacion):
+            self.assertEqual(self.cancelar_dia(), 1)
+        propia.refresh_from_db()
+        self.assertEqual((propia.cancelada_por, propia.cancel_motivo), (self.user, "No puedo ir"))
+        self.assertEqual(
+            Notificacion.objects.filter(tipo="cancelacion", cita=propia).count(), 1)
+
+    def test_next_externo_no_redirige_fuera_del_sitio(self):
+        staff = User.objects.create_user("staff@medidate.test", is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename="access_consultorio"))
+        self.client.force_login(staff)
+        datos = {"medico": self.medico.pk, "desde": self.fecha, "hasta": self.fecha}
+        for destino, esperado in (
+            ("https://malo.example/", reverse("agenda:consultorio_citas")),
+            ("//malo.example/", reverse("agenda:consultorio_citas")),
+            ("/consultorio/?estado=pendiente", "/consultorio/?estado=pendiente"),
+        ):
+            with self.subTest(next=destino):
+                response = self.client.post(
+                    reverse("agenda:consultorio_cancelar_lote"), {**datos, "next": destino})
+                self.assertRedirects(response, esperado, fetch_redirect_response=False)
+
+    def test_no_borra_bits_de_reservas_simultaneas(self):
+        self.crear_cita(hora=time(9, 0))
+        # Reserva de otra transacción aún no visible: solo su bit en el índice
+        OcupacionDia.objects.filter(medico=self.medico, fecha=self.fecha).update(
+            mapa=F("mapa").bitor(disponibilidad.mascara([time(15, 0)])))
+        self.cancelar_dia()
+        self.assertEqual(self.ocupacion(), disponibilidad.mascara([time(15, 0)]))
+
+
+class RolesTests(DatosAgenda):
+    def test_id_en_sesion_de_un_paciente_borrado_se_descarta(self):
+        sesion = SessionStore()
+        sesion[roles.CLAVE_SESION] = {"user": self.user.pk, "paciente": self.paciente.pk}
+        self.paciente.delete()
+        r = roles.Roles(self.user, sesion)
+        self.assertIsNone(r.paciente)
+        self.assertFalse(r.es_paciente)
+        self.assertNotIn(roles.CLAVE_SESION, sesion)
+
+    def test_la_peticion_siguiente_no_lo_toma_por_paciente(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("agenda:perfil"))
+        self.assertIn(roles.CLAVE_SESION, self.client.session)
+        self.paciente.delete()
+        self.client.get(reverse("agenda:inicio"))
+        self.assertNotIn(roles.CLAVE_SESION, self.client.session)
+        self.assertFalse(self.client.get(reverse("agenda:inicio")).context["es_paciente"])
+
+    def test_vistas_y_context_processor_usan_request_roles(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.roles = mock.Mock(es_paciente=True)
+        self.assertIs(views._roles(request), request.roles)
+        self.assertEqual(context_processors.rol_flags(request), {"es_paciente": True})
+
+
+class EmailLoginTests(DatosAgenda):
+    def test_login_sin_distinguir_mayusculas(self):
+        user = authenticate(None, username=" Paciente@MEDIDATE.test ", password="clave-123")
+        self.assertEqual(user, self.user)
+
+    def test_email_inexistente_igual_calcula_un_hash(self):
+        with mock.patch("django.contrib.auth.base_user.make_password",
+                        return_value="!") as hash_:
+            self.assertIsNone(authenticate(None, username="nadie@medidate.test", password="x"))
+        hash_.assert_called_once_with("x")
+
+    def test_email_unico_sin_distinguir_mayusculas(self):
+        with transaction.atomic(), self.assertRaisesRegex(IntegrityError, "user_email_lower_unico"):
+            User.objects.create_user("PACIENTE@medidate.test", "otra-clave")
+
+    def test_registro_rechaza_un_email_existente_con_otras_mayusculas(self):
+        datos = {"email": "Paciente@Medidate.TEST", "password1": "x-123-abc", "password2": "x-123-abc"}
+        with mock.patch.object(User.objects, "por_email", wraps=User.objects.por_email) as por_email:
+            form = RegistroForm(datos)
+            self.assertFalse(form.is_valid())
+        por_email.assert_called_once_with("paciente@medidate.test")
+        self.assertEqual(form.errors["email"], ["Ya existe un usuario con ese email."])
+
+
+@override_settings(
+    PASSWORD_HASHERS=["agenda.hashers.PBKDF2Hasher", "agenda.hashers.ScryptHasher"],
+    AGENDA_HASH_PBKDF2_ITERACIONES=1000,
+)
+class HashersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("hash@medidate.test", "clave-123")
+
+    def parametros(self):
+        self.user.refresh_from_db()
+        return self.user.password.split("$")
+
+    @override_settings(AGENDA_HASH_PBKDF2_ITERACIONES=3000)
+    def test_el_login_rehace_el_hash_con_el_costo_nuevo(self):
+        self.assertTrue(self.client.login(username="hash@medidate.test", password="clave-123"))
+        self.assertEqual(self.parametros()[:2], ["pbkdf2_sha256", "3000"])
+
+    @override_settings(AGENDA_HASH_PBKDF2_ITERACIONES=3000)
+    def test_clave_incorrecta_iguala_el_costo_sin_rehacer(self):
+        with mock.patch("django.contrib.auth.hashers.pbkdf2", wraps=crypto.pbkdf2) as pbkdf2:
+            self.assertFalse(self.user.check_password("otra"))
+        # Verificar con el costo guardado y completar la diferencia (harden_runtime)
+        self.assertEqual([c.args[2] for c in pbkdf2.call_args_list], [1000, 2000])
+        self.assertEqual(self.parametros()[1], "1000")
+
+    def test_cambiar_el_algoritmo_preferido_rehace_el_hash(self):
+        with override_settings(
+            PASSWORD_HASHERS=["agenda.hashers.ScryptHasher", "agenda.hashers.PBKDF2Hasher"],
+            AGENDA_HASH_SCRYPT_N=2 ** 10,
+        ):
+            self.assertTrue(self.user.check_password("clave-123"))
+            self.assertEqual(self.parametros()[:2], ["scrypt", str(2 ** 10)])
+            with override_settings(AGENDA_HASH_SCRYPT_N=2 ** 11):
+                self.assertTrue(hashers.ScryptHasher().must_update(self.user.password))
+                self.assertTrue(self.user.check_password("clave-123"))
+            self.assertEqual(self.parametros()[1], str(2 ** 11))
+
+    @override_settings(AGENDA_HASH_SCRYPT_N=2 ** 15)
+    def test_scrypt_sube_el_limite_de_memoria(self):
+        # 128·N·r = 32 MiB: con el límite por defecto de OpenSSL no alcanza
+        with self.assertRaises(ValueError):
+            ScryptPasswordHasher().encode("clave-123", "sal", n=2 ** 15)
+        hasher = hashers.ScryptHasher()
+        encoded = hasher.encode("clave-123", hasher.salt())
+        self.assertTrue(hasher.verify("clave-123", encoded))
+        # Un hash con más costo que el actual también se verifica
+        with override_settings(AGENDA_HASH_SCRYPT_N=2 ** 14):
+            self.assertTrue(hashers.ScryptHasher().verify("clave-123", encoded))
+
+    def test_check_del_algoritmo(self):
+        casos = [("scrypt", []), ("bcrypt", ["agenda.E001"]), ("argon2", ["agenda.E002"])]
+        for elegido, ids in casos:
+            with self.subTest(elegido), override_settings(AGENDA_HASHER=elegido), \
+                    mock.patch.object(checks, "find_spec", return_value=None):
+                self.assertEqual([e.id for e in checks.hasher_configurado(None)], ids)
+
+
+class CatalogoTests(DatosAgenda):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def datos_cita(self, **campos):
+        # Un día hábil y una hora de la plantilla estándar
+        fecha = self.fecha + timedelta(days=(7 - self.fecha.weekday()) % 7)
+        return {"especialidad": self.medico.especialidad_id, "medico": self.medico.pk,
+                "fecha": fecha, "hora": "09:00", **campos}
+
+    def test_validar_la_cita_no_consulta_el_catalogo(self):
+        CitaForm(self.datos_cita()).is_valid()  # llena las cachés
+        form = CitaForm(self.datos_cita())
+        # Solo la comprobación de que la hora sigue libre
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["medico"], self.medico)
+
+    def test_opcion_fuera_del_catalogo(self):
+        form = CitaForm(self.datos_cita(medico=999))
+        self.assertFalse(form.is_valid())
+        self.assertIn("medico", form.errors)
+
+    def medicos(self, **cabeceras):
+        return self.client.get(reverse("agenda:ajax_medicos"),
+                               {"especialidad": self.medico.especialidad_id}, **cabeceras)
+
+    def test_ajax_medicos_responde_304_hasta_que_cambia_el_catalogo(self):
+        etag = self.medicos()["ETag"]
+        with self.assertNumQueries(2):  # sesión y usuario
+            self.assertEqual(self.medicos(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Medico.objects.create(nombre="Dr. Soto", especialidad=self.medico.especialidad)
+        response = self.medicos(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), 2)
+
+    @override_settings(AGENDA_CACHE_CATALOGO=False)
+    def test_sin_cache_compartida_no_hay_etag(self):
+        response = self.medicos()
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+
+class KpisTests(DatosAgenda):
+    def setUp(self):
+        cache.clear()
+        self.crear_cita(hora=time(9, 0))
+        self.crear_cita(hora=time(10, 0), estado="cancelada")
+
+    def test_contadores_en_un_solo_aggregate_y_cacheados(self):
+        # Un aggregate para todos los contadores y otro para la carga por especialidad
+        with self.assertNumQueries(2):
+            datos = kpis.calcular(self.fecha)
+        self.assertEqual(datos["contadores"], {
+            "hoy": 2, "semana": 2, "canceladas_hoy": 1, "canceladas_semana": 1,
+            "tasa_cancelacion_semana": 50.0,
+        })
+        self.assertEqual(datos["carga_especialidad"],
+                         [{"medico__especialidad__nombre": "Cardiología", "total": 1}])
+        with self.assertNumQueries(0):
+            self.assertEqual(kpis.calcular(self.fecha), datos)
+
+    def test_un_cambio_de_cita_los_invalida(self):
+        kpis.calcular(self.fecha)
+        with self.captureOnCommitCallbacks(execute=True):
+            Cita.objects.get(hora=time(9, 0)).cancelar(None)
+        with self.assertNumQueries(2):
+            contadores = kpis.calcular(self.fecha)["contadores"]
+        self.assertEqual((contadores["canceladas_hoy"], contadores["tasa_cancelacion_semana"]),
+                         (2, 100.0))
+
+
+class PaginacionTests(DatosAgenda):
+    def setUp(self):
+        # Dos días, con horas repetidas entre días: el orden es (fecha, hora, id)
+        self.citas = [
+            Cita.objects.create(paciente=self.paciente, medico=self.medico,
+                                fecha=self.fecha + timedelta(days=d), hora=time(h, 0))
+            for d in (0, 1) for h in (9, 10, 11)
+        ]
+
+    def paginas(self, **cursor):
+        return paginacion.paginar(Cita.objects.all(), 2, **cursor)
+
+    def test_cursor_ida_y_vuelta(self):
+        cita = self.citas[4]
+        self.assertEqual(
+            paginacion.decodificar_cursor(paginacion.codificar_cursor(cita)),
+            (cita.fecha, cita.hora, cita.pk))
+
+    def test_cursor_alterado_es_invalido(self):
+        for cursor in ("", "xyz", "!!!!", "YXxifGM", "MjAyNi0xMy0wMXwwOTowMHwx"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(paginacion.decodificar_cursor(cursor))
+        # Con un cursor inválido se muestra la primera página
+        self.assertEqual(list(self.paginas(despues="xyz")), self.citas[:2])
+
+    def test_recorre_hacia_adelante_y_atras_sin_saltos(self):
+        pagina = self.paginas()
+        vistas = list(pagina)
+        self.assertFalse(pagina.has_previous)
+        while pagina.has_next:
+            pagina = self.paginas(despues=pagina.next_cursor)
+            vistas += list(pagina)
+        self.assertEqual(vistas, self.citas)
+        self.assertTrue(pagina.has_previous)
+
+        atras = self.paginas(antes=pagina.previous_cursor)
+        self.assertEqual(list(atras), self.citas[2:4])
+        self.assertEqual((atras.has_previous, atras.has_next), (True, True))
+        primera = self.paginas(antes=atras.previous_cursor)
+        self.assertEqual(list(primera), self.citas[:2])
+        self.assertFalse(primera.has_previous)
+
+    def test_despues_de_la_ultima_no_hay_filas(self):
+        pagina = self.paginas(despues=paginacion.codificar_cursor(self.citas[-1]))
+        self.assertEqual((list(pagina), pagina.has_next, pagina.has_previous), ([], False, False))
+
+    def test_la_estimacion_usa_la_bd_del_queryset(self):
+        conexion = mock.MagicMock(vendor="postgresql")
+        conexion.cursor.return_value.__enter__.return_value.fetchone.return_value = (42,)
+        with mock.patch.object(paginacion, "connections", {"replica": conexion}):
+            total = paginacion.total_aproximado(Cita.objects.using("replica"), {})
+        self.assertEqual(total, (42, False))
+
+
+class ResumenTests(DatosAgenda):
+    def test_se_mantiene_con_cada_cambio(self):
+        cita = self.crear_cita()
+        self.assertEqual(resumen.de(self.paciente.pk).proximas, 1)
+        cita.cancelar(None)
+        r = resumen.de(self.paciente.pk)
+        self.assertEqual((r.proximas, r.historial, r.proxima_cita_id), (0, 1, None))
+
+    def test_una_cita_confirmada_cuenta_como_proxima(self):
+        cita = self.crear_cita(estado="confirmada")
+        r = resumen.de(self.paciente.pk)
+        self.assertEqual((r.proximas, r.historial, r.proxima_cita_id), (1, 0, cita.pk))
+
+    def test_fallo_al_recalcular_revierte_la_cita(self):
+        cita = self.crear_cita()
+        with mock.patch.object(resumen, "recalcular", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                cita.cancelar(None)
+        self.assertEqual(Cita.objects.get(pk=cita.pk).estado, "pendiente")
+        self.assertEqual(resumen.de(self.paciente.pk).proxima_cita_id, cita.pk)
+
+
+class ArchivoTests(DatosAgenda):
+    def pasada(self, dias, hora=time(9, 0), **campos):
+        return Cita.objects.create(
+            paciente=self.paciente, medico=self.medico, hora=hora,
+            fecha=timezone.localdate() - timedelta(days=dias), **campos)
+
+    def archivar(self, **opciones):
+        return list(archivo.archivar(archivo.corte(0), **opciones))
+
+    def test_retoma_despues_de_un_lote_interrumpido(self):
+        citas = [self.pasada(d) for d in (3, 2, 1)]
+        self.assertEqual(self.archivar(lote=2, max_lotes=1), [2])
+        with mock.patch.object(CitaArchivada.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.archivar(lote=2)
+        # El lote que falló se revirtió entero: la cita sigue en la tabla caliente
+        self.assertEqual(list(Cita.objects.values_list("pk", flat=True)), [citas[2].pk])
+        self.assertEqual(CitaArchivada.objects.count(), 2)
+        self.assertEqual(self.archivar(lote=2), [1])
+        self.assertFalse(Cita.objects.exists())
+        self.assertEqual(
+            sorted(CitaArchivada.objects.values_list("pk", flat=True)), [c.pk for c in citas])
+
+    def test_repetir_una_copia_ya_archivada_no_choca(self):
+        cita = self.pasada(2, motivo="Control")
+        # Copia que quedó de una ejecución anterior sin llegar a borrar la original
+        CitaArchivada.objects.create(**Cita.objects.values(*archivo.CAMPOS).get(pk=cita.pk))
+        self.assertEqual(self.archivar(), [1])
+        self.assertFalse(Cita.objects.exists())
+        self.assertEqual(CitaArchivada.objects.get().motivo, "Control")
+
+    def test_anula_la_proxima_cita_de_un_resumen_viejo(self):
+        cita = self.pasada(2)
+        ResumenPaciente.objects.update_or_create(
+            paciente=self.paciente, defaults={"proxima_cita": cita, "proxima_en": cita.inicio})
+        self.archivar()
+        self.assertIsNone(ResumenPaciente.objects.get(pk=self.paciente.pk).proxima_cita_id)
+
+    def test_historial_mezcla_ambas_tablas_por_fecha(self):
+        archivadas = [self.pasada(20), self.pasada(10)]
+        list(archivo.archivar(archivo.corte(5)))
+        recientes = [self.pasada(25), self.pasada(15), self.pasada(2)]
+        cancelada = self.crear_cita()
+        cancelada.cancelar(None)
+        self.crear_cita(hora=time(10, 0))  # futura y vigente: no es historial
+        archivadas = [CitaArchivada.objects.get(pk=c.pk) for c in archivadas]
+        esperado = [cancelada, recientes[2], archivadas[1], recientes[1], archivadas[0], recientes[0]]
+        self.assertEqual(
+            [(type(c), c.pk) for c in archivo.historial(self.paciente)],
+            [(type(c), c.pk) for c in esperado])
+
+
+class OutboxTests(DatosAgenda):
+    """La fila de ``Notificacion`` se escribe en la transacción del cambio."""
+
+    def test_fallo_al_encolar_revierte_la_cancelacion(self):
+        cita = self.crear_cita()
+        with mock.patch.object(notificaciones, "encolar", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                cita.cancelar(self.user, "No puedo ir")
+        self.assertEqual(Cita.objects.get(pk=cita.pk).estado, "pendiente")
+        self.assertEqual(self.ocupacion(), disponibilidad.mascara([time(9, 0)]))
+        self.assertFalse(Notificacion.objects.filter(tipo="cancelacion").exists())
+
+    def test_fallo_al_encolar_revierte_la_cancelacion_del_paciente(self):
+        cita = self.crear_cita()
+        self.client.force_login(self.user)
+        with mock.patch.object(notificaciones, "encolar", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse("agenda:cita_cancelar", args=[cita.pk]))
+        self.assertEqual(Cita.objects.get(pk=cita.pk).estado, "pendiente")
+        self.assertFalse(Notificacion.objects.filter(tipo="cancelacion").exists())
+
+    def test_fallo_al_encolar_revierte_la_reserva(self):
+        with mock.patch.object(notificaciones, "encolar", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.crear_cita()
+        self.assertFalse(Cita.objects.exists())
+        self.assertEqual(self.ocupacion(), 0)
+
+    def test_fallo_al_encolar_revierte_la_cancelacion_masiva(self):
+        for h in (9, 10):
+            self.crear_cita(hora=time(h, 0))
+        with mock.patch.object(notificaciones, "encolar_muchas", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                cancelaciones.cancelar_rango(self.medico.pk, self.fecha, self.fecha, None)
+        self.assertFalse(Cita.objects.filter(estado="cancelada").exists())
+        self.assertEqual(self.ocupacion(), disponibilidad.mascara([time(9, 0), time(10, 0)]))
+        self.assertFalse(Notificacion.objects.filter(tipo="cancelacion").exists())
+
+
+class RecordatoriosTests(DatosAgenda):
+    def recordatorios(self):
+        return Notificacion.objects.filter(tipo="recordatorio")
+
+    def test_encola_las_activas_del_dia(self):
+        activas = [self.crear_cita(hora=time(9, 0)),
+                   self.crear_cita(hora=time(10, 0), estado="confirmada")]
+        self.crear_cita(hora=time(11, 0)).cancelar(None)
+        Cita.objects.create(paciente=self.paciente, medico=self.medico,
+                            fecha=self.fecha + timedelta(days=1), hora=time(9, 0))
+        self.assertEqual(list(recordatorios.encolar(self.fecha)), [2])
+        self.assertEqual(
+            sorted(self.recordatorios().values_list("cita_id", flat=True)),
+            [c.pk for c in activas])
+
+    def test_correrlo_dos_veces_no_duplica(self):
+        self.crear_cita()
+        self.assertEqual(list(recordatorios.encolar(self.fecha)), [1])
+        self.assertEqual(list(recordatorios.encolar(self.fecha)), [])
+        self.assertEqual(self.recordatorios().count(), 1)
+
+
+class NotificacionesTests(DatosAgenda):
+    """Envío desde la bandeja de salida con el backend de correo en memoria."""
+
+    def enviar(self):
+        return notificaciones.procesar(notificaciones.reclamar())
+
+    def vencer(self):
+        Notificacion.objects.update(proximo_intento=timezone.now())
+
+    def test_reclamar_arrienda_el_lote(self):
+        self.crear_cita()
+        antes = timezone.now()
+        (n,) = notificaciones.reclamar()
+        self.assertEqual((n.tipo, n.intentos), ("confirmacion", 1))
+        self.assertGreaterEqual(n.proximo_intento, antes + notificaciones.ARRIENDO)
+        # Arrendada: otro worker no la vuelve a tomar hasta que venza
+        self.assertEqual(notificaciones.reclamar(), [])
+        self.assertEqual(mail.outbox, [])
+
+    def test_procesar_envia_cada_plantilla(self):
+        cita = self.crear_cita(motivo="Control anual")
+        notificaciones.encolar("recordatorio", cita.pk)
+        otra = self.crear_cita(hora=time(10, 0), motivo="Control anual")
+        otra.cancelar(self.user, "No puedo ir")
+        self.assertEqual(self.enviar(), {"enviadas": 4, "fallidas": 0, "descartadas": 0})
+        self.assertEqual(Notificacion.objects.filter(estado="enviada").count(), 4)
+        correos = {m.subject: m for m in mail.outbox}
+        self.assertEqual(set(correos), {
+            "Cita agendada - MediDate", "Recordatorio de tu cita - MediDate",
+            "Cita cancelada - MediDate",
+        })
+        self.assertIn("Motivo: Control anual", correos["Cita agendada - MediDate"].body)
+        self.assertIn("Hora: 09:00", correos["Recordatorio de tu cita - MediDate"].body)
+        self.assertIn("Motivo: No puedo ir", correos["Cita cancelada - MediDate"].body)
+        for m in mail.outbox:
+            self.assertEqual(m.to, ["paciente@medidate.test"])
+            self.assertIn("Dra. Rojas (Cardiología)", m.body)
+
+    def test_recordatorio_de_una_cita_cancelada_se_descarta(self):
+        cita = self.crear_cita()
+        cita.cancelar(None)
+        Notificacion.objects.all().delete()
+        notificaciones.encolar("recordatorio", cita.pk)
+        self.assertEqual(self.enviar(), {"enviadas": 0, "fallidas": 0, "descartadas": 1})
+        self.assertEqual(Notificacion.objects.get().estado, "descartada")
+        self.assertEqual(mail.outbox, [])
+
+    def test_espera_exponencial_con_tope(self):
+        with mock.patch.object(notificaciones.random, "uniform", return_value=1):
+            esperas = [notificaciones.espera(i) for i in (1, 2, 3, 20)]
+        self.assertEqual(esperas, [
+            timedelta(seconds=30), timedelta(minutes=1), timedelta(minutes=2),
+            notificaciones.ESPERA_MAX,
+        ])
+
+    @mock.patch.object(notificaciones.random, "uniform", return_value=1)
+    @mock.patch.object(EmailMessage, "send", side_effect=smtplib.SMTPException("sin conexión"))
+    def test_fallo_se_reprograma_y_al_final_queda_fallida(self, send, uniform):
+        self.crear_cita()
+        for intento in range(1, notificaciones.MAX_INTENTOS):
+            self.vencer()
+            antes = timezone.now()
+            self.assertEqual(self.enviar()["fallidas"], 1)
+            n = Notificacion.objects.get()
+            self.assertEqual((n.estado, n.intentos, n.error), ("pendiente", intento, "sin conexión"))
+            self.assertGreaterEqual(n.proximo_intento, antes + notificaciones.espera(intento))
+            self.assertEqual(notificaciones.reclamar(), [])
+        self.vencer()
+        self.enviar()
+        n = Notificacion.objects.get()
+        self.assertEqual((n.estado, n.intentos), ("fallida", notificaciones.MAX_INTENTOS))
+        self.vencer()
+        self.assertEqual(notificaciones.reclamar(), [])
+        self.assertEqual(send.call_count, notificaciones.MAX_INTENTOS)
+
+    def test_un_reintento_exitoso_limpia_el_error(self):
+        self.crear_cita()
+        with mock.patch.object(EmailMessage, "send", side_effect=smtplib.SMTPException("caído")):
+            self.enviar()
+        self.vencer()
+        self.assertEqual(self.enviar()["enviadas"], 1)
+        n = Notificacion.objects.get()
+        self.assertEqual((n.estado, n.intentos, n.error), ("enviada", 2, ""))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_comando_vacia_la_bandeja(self):
+        for h in (9, 10):
+            self.crear_cita(hora=time(h, 0))
+        salida = io.StringIO()
+        call_command("enviar_notificaciones", "--una-vez", "--lote", "1", stdout=salida)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(Notificacion.objects.exclude(estado="enviada").exists())
+        self.assertIn("Total: 2 enviadas, 0 con error, 0 descartadas.", salida.getvalue())
+
+
+@override_settings(AGENDA_REPLICA=True)
+class ReplicaTests(TransactionTestCase):
+    """
+    Ruteo a la réplica y "lee lo que escribiste". La réplica de pruebas es
+    otra BD que nunca recibe lo escrito en la primaria. Sin el ``atomic`` de
+    TestCase: dentro de una transacción todo se lee de la primaria.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        especialidad = Especialidad.objects.create(nombre="Cardiología")
+        self.medico = Medico.objects.create(nombre="Dra. Rojas", especialidad=especialidad)
+        self.paciente = User.objects.create_user("paciente@medidate.test").paciente
+        self.vistos = {}
+        self.sesion = SessionStore()
+        self.cadena = routers.ReplicaMiddleware(routers.lectura_replica(self.vista))
+
+    def vista(self, request):
+        self.vistos["antes"] = Cita.objects.all().db
+        self.vistos["citas"] = Cita.objects.count()
+        self.vistos["sesiones"] = Session.objects.all().db
+        if request.GET.get("escribir") == "cita":
+            Cita.objects.create(paciente=self.paciente, medico=self.medico,
+                                fecha=timezone.localdate() + timedelta(days=30), hora=time(9, 0))
+        elif request.GET.get("escribir") == "medico":
+            # Lo mismo que pregunta el ORM antes de un INSERT/UPDATE
+            router.db_for_write(Medico)
+        self.vistos["despues"] = Cita.objects.all().db
+        return HttpResponse()
+
+    def pedir(self, metodo="get", **params):
+        request = getattr(RequestFactory(), metodo)("/", params)
+        request.session = self.sesion
+        self.vistos.clear()
+        self.cadena(request)
+        return dict(self.vistos)
+
+    def fijada(self):
+        return routers.CLAVE_SESION in self.sesion
+
+    def test_get_lee_de_la_replica_y_las_sesiones_de_la_primaria(self):
+        r = self.pedir()
+        self.assertEqual((r["antes"], r["sesiones"]), (routers.REPLICA, "default"))
+
+    def test_lee_lo_que_escribio(self):
+        r = self.pedir(escribir="cita")
+        self.assertEqual((r["antes"], r["despues"]), (routers.REPLICA, "default"))
+        self.assertTrue(self.fijada())
+        # El redirect siguiente ve la cita aunque la réplica no la tenga
+        r = self.pedir()
+        self.assertEqual((r["antes"], r["citas"]), ("default", 1))
+        self.assertEqual(Cita.objects.using(routers.REPLICA).count(), 0)
+
+    def test_vencida_la_ventana_vuelve_a_la_replica(self):
+        self.pedir(escribir="cita")
+        self.sesion[routers.CLAVE_SESION] = time_module.time() - 1
+        r = self.pedir()
+        self.assertEqual((r["antes"], r["citas"]), (routers.REPLICA, 0))
+
+    def test_escribir_un_medico_fija_la_sesion(self):
+        self.pedir(escribir="medico")
+        self.assertTrue(self.fijada())
+
+    def test_post_lee_de_la_primaria(self):
+        self.assertEqual(self.pedir("post")["antes"], "default")
+        self.assertFalse(self.fijada())
+
+    def test_en_replica_fuera_de_una_peticion(self):
+        with routers.en_replica():
+            self.assertEqual(Paciente.objects.all().db, routers.REPLICA)
+            with transaction.atomic():
+                self.assertEqual(Paciente.objects.all().db, "default")
+
+    def test_sin_lectura_replica_se_lee_de_la_primaria(self):
+        self.assertEqual(Cita.objects.all().db, "default")
+
+    @override_settings(AGENDA_REPLICA=False)
+    def test_desactivada_todo_va_a_la_primaria(self):
+        r = self.pedir(escribir="cita")
+        self.assertEqual(r["antes"], "default")
+        self.assertFalse(self.fijada())
@@ -1,10 +1,21 @@
 # agenda/urls.py
+from django.conf import settings
 from django.urls import path
 from django.views.generic.base import RedirectView
 from . import views
 
 app_name = "agenda"
 
+# Bajo ASGI (uvicorn) los endpoints AJAX tienen versión async nativa
+if getattr(settings, "AGENDA_AJAX_ASYNC", False):
+    ajax_medicos = views.ajax_medicos_async
+    ajax_horas = views.ajax_horas_async
+    ajax_disponibilidad = views.ajax_disponibilidad_async
+else:
+    ajax_medicos = views.ajax_medicos
+    ajax_horas = views.ajax_horas
+    ajax_disponibilidad = views.ajax_disponibilidad
+
 urlpatterns = [
     # Inicio
     path("", views.inicio, name="inicio"),
@@ -19,12 +30,18 @@ urlpatterns = [
 
     # 👉 Panel de staff (consultorio)
     path("consultorio/", views.consultorio_citas, name="consultorio_citas"),
+    path("consultorio/exportar/", views.consultorio_exportar,
+         name="consultorio_exportar"),
+    path("consultorio/cancelar-lote/", views.consultorio_cancelar_lote,
+         name="consultorio_cancelar_lote"),
     path('consultorio/citas/<int:cita_id>/cancelar/', views.consultorio_cita_cancelar,
          name='consultorio_cita_cancelar'),
 
     # AJAX
-    path("ajax/medicos/", views.ajax_medicos, name="ajax_medicos"),
-    path("ajax/horas/", views.ajax_horas, name="ajax_horas"),
+    path("ajax/medicos/", ajax_medicos, name="ajax_medicos"),
+    path("ajax/horas/", ajax_horas, name="ajax_horas"),
+    path("ajax/disponibilidad/", ajax_disponibilidad,
+         name="ajax_disponibilidad"),
 
     # Acciones de cita
     path("cita/<int:cita_id>/cancelar/",
@@ -1,57 +1,38 @@
-from datetime import datetime, time, timedelta
-from django.utils import timezone
-from .models import Cita, Medico
+import math
+from contextlib import contextmanager
 
+from django.db import transaction
 
-def _rango_horas(inicio: time, fin: time, paso_min=30):
-    """
-    Genera times cada 'paso_min' minutos desde 'inicio' (incluida) hasta 'fin' (excluida).
-    """
-    # Usamos la fecha local de hoy solo como soporte para sumar minutos
-    base = timezone.localdate()
-    dt = datetime.combine(base, inicio)
-    dt_fin = datetime.combine(base, fin)
-    while dt < dt_fin:
-        yield dt.time()
-        dt += timedelta(minutes=paso_min)
-
-
-def _ventanas_estandar():
-    """
-    Horario estándar de atención: 09:00–13:00 y 15:00–19:00, cada 30 minutos.
-    Ajusta aquí si tu clínica usa otros rangos.
-    """
-    maniana = list(_rango_horas(time(9, 0), time(13, 0), 30))
-    tarde = list(_rango_horas(time(15, 0), time(19, 0), 30))
-    return maniana + tarde
+from . import disponibilidad, horarios
+from .models import Medico
 
 
 def horas_disponibles_para(medico: Medico, fecha):
     """
     Devuelve una lista de objetos time con los horarios disponibles para un médico
-    en la fecha dada, excluyendo:
+    en la fecha dada, según su horario (``agenda.horarios``) y excluyendo:
       - horas ya reservadas en la BD
       - horas pasadas si la fecha es hoy
     """
-    # Si la fecha cae sábado o domingo, devolvemos vacío (la vista ya valida esto también)
-    if fecha.weekday() >= 5:
-        return []
-
-    # Todas las horas del día hábil
-    candidatos = _ventanas_estandar()
-
-    # Horas ya ocupadas
-    ocupadas = set(
-        Cita.objects.filter(medico=medico, fecha=fecha).values_list(
-            "hora", flat=True)
-    )
-
-    # Si es hoy, removemos horas pasadas
-    hoy = timezone.localdate()
-    ahora = timezone.localtime().time()
-    if fecha == hoy:
-        candidatos = [h for h in candidatos if h > ahora]
-
-    # Disponibles = candidatos - ocupadas
-    libres = [h for h in candidatos if h not in ocupadas]
-    return libres
+    mapa = disponibilidad.ocupacion(medico.pk, fecha)
+    return [b.hora for b in horarios.libres(medico.pk, fecha, mapa)]
+
+
+def percentil(valores, p: float) -> float:
+    """Percentil ``p`` (0–100) por el método del rango más cercano."""
+    if not valores:
+        return 0.0
+    orden = sorted(valores)
+    k = max(0, min(len(orden) - 1, math.ceil(p / 100 * len(orden)) - 1))
+    return orden[k]
+
+
+@contextmanager
+def revertido(using=None):
+    """
+    Transacción que se revierte siempre al salir: los comandos de medición
+    cargan datos o escriben citas sin dejar rastro en la BD.
+    """
+    with transaction.atomic(using=using):
+        yield
+        transaction.set_rollback(True, using=using)
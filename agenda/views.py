@@ -1,35 +1,50 @@
 from __future__ import annotations
-from datetime import date, time, datetime, timedelta
-from typing import List
+import csv
+import tempfile
+from importlib.util import find_spec
+from datetime import date, datetime, timedelta
 
 from django import forms
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
-from django.core.paginator import Paginator
 from django.utils.dateparse import parse_date
-from django.db.models import Q
-from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.http import (
+    FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 
-from .forms import CitaForm, UserUpdateForm, PacienteForm, RegistroForm
-from .models import Cita, Paciente, Medico, Especialidad
+from . import (
+    archivo, busqueda, cancelaciones, catalogo, disponibilidad, fragmentos, horarios, kpis,
+    paginacion, reservas, resumen,
+)
+from .forms import CancelacionLoteForm, CitaForm, UserUpdateForm, PacienteForm, RegistroForm
+from .models import Cita, Paciente
+from .roles import de_peticion
+from .routers import en_replica, lectura_replica
 
 
 # -------------------------------------------------------------------
 # Guards / helpers de rol
 # -------------------------------------------------------------------
 
-def _es_paciente(user):
-    return user.is_authenticated and Paciente.objects.filter(user=user).exists()
+def _roles(request: HttpRequest):
+    return de_peticion(request)
+
+
+def _es_paciente(request: HttpRequest) -> bool:
+    return request.user.is_authenticated and _roles(request).es_paciente
 
 
 def patient_required(view_func):
     """Permite acceso solo a usuarios que son pacientes."""
     @login_required
     def _wrapped(request, *args, **kwargs):
-        if not _es_paciente(request.user):
+        if not _es_paciente(request):
             messages.info(
                 request, "Solo los pacientes pueden acceder a esta sección.")
             if request.user.has_perm("agenda.access_consultorio"):
@@ -39,8 +54,21 @@ def patient_required(view_func):
     return _wrapped
 
 
+def _volver(request: HttpRequest) -> HttpResponse:
+    """Redirige al ``next`` del POST si es de este sitio; si no, al consultorio."""
+    destino = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(
+            destino, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        destino = 'agenda:consultorio_citas'
+    return redirect(destino)
+
+
 def _get_or_create_paciente_for_user(request: HttpRequest) -> Paciente:
-    paciente, _ = Paciente.objects.get_or_create(user=request.user)
+    roles = _roles(request)
+    paciente = roles.paciente
+    if paciente is None:
+        paciente, _ = Paciente.objects.get_or_create(user=request.user)
+        roles.asignar_paciente(paciente)
     return paciente
 
 
@@ -51,81 +79,58 @@ def _get_or_create_paciente_for_user(request: HttpRequest) -> Paciente:
 def inicio(request):
     ctx = {}
     hoy = timezone.localdate()
-    ahora = timezone.localtime().time()
 
     if request.user.is_authenticated:
         # Si tiene permiso de consultorio -> panel staff
         if request.user.has_perm("agenda.access_consultorio"):
-            semana_fin = hoy + timedelta(days=7)
-            ctx["kpis_staff"] = {
-                "hoy": Cita.objects.filter(fecha=hoy).count(),
-                "semana": Cita.objects.filter(fecha__range=(hoy, semana_fin)).count(),
-                "canceladas_hoy": Cita.objects.filter(fecha=hoy, estado="cancelada").count(),
-            }
-            ctx["citas_hoy"] = (
-                Cita.objects
-                .select_related("paciente__user", "medico", "medico__especialidad")
-                .filter(fecha=hoy)
-                .order_by("hora")[:5]
-            )
+            with en_replica():
+                datos = kpis.calcular(hoy)
+                ctx["citas_hoy"] = list(
+                    Cita.objects
+                    .select_related("paciente__user", "medico", "medico__especialidad")
+                    .filter(fecha=hoy)
+                    .order_by("hora")[:5]
+                )
+            ctx["kpis_staff"] = datos["contadores"]
+            ctx["carga_especialidad"] = datos["carga_especialidad"]
         else:
-            # Panel paciente: SOLO próximas (hoy desde ahora o futuras)
-            paciente = Paciente.objects.filter(user=request.user).first()
+            # Panel paciente: SOLO próximas (hoy desde ahora o futuras),
+            # leídas del resumen mantenido por agenda.resumen
+            paciente = _roles(request).paciente
             if paciente:
-                proximas_qs = (
-                    Cita.objects.filter(
-                        paciente=paciente,
-                        estado__in=["pendiente", "agendada"],
-                    )
-                    .filter(Q(fecha__gt=hoy) | (Q(fecha=hoy) & Q(hora__gte=ahora)))
-                )
-
-                ctx["proximas_count"] = proximas_qs.count()
-                ctx["proxima_cita"] = (
-                    proximas_qs
-                    .select_related("medico", "medico__especialidad")
-                    .order_by("fecha", "hora")
-                    .first()
-                )
+                datos = resumen.de(paciente.pk)
+                ctx["proximas_count"] = datos.proximas
+                ctx["proxima_cita"] = datos.proxima_cita
 
     return render(request, "inicio.html", ctx)
 
 
 @patient_required
+@lectura_replica
 def perfil(request: HttpRequest) -> HttpResponse:
     paciente = _get_or_create_paciente_for_user(request)
 
-    now = timezone.localtime()         # fecha y hora local
-    hoy = now.date()
-    hora_actual = now.time()
-
-    # Próximas: hoy con hora >= actual, o cualquier fecha futura.
-    # Excluimos canceladas y atendidas.
-    proximas = (
-        Cita.objects.filter(paciente=paciente)
-        .exclude(estado__in=["cancelada", "atendida"])
-        .filter(
-            Q(fecha__gt=hoy) |
-            Q(fecha=hoy, hora__gte=hora_actual)
-        )
-        .select_related("medico", "medico__especialidad")
-        .order_by("fecha", "hora")
-    )
-
-    # Historial: fechas pasadas, o de hoy con hora < actual,
-    # además de cualquier cita cancelada o atendida (sin importar fecha).
-    historial = (
-        Cita.objects.filter(paciente=paciente)
-        .filter(
-            Q(fecha__lt=hoy) |
-            Q(fecha=hoy, hora__lt=hora_actual) |
-            Q(estado__in=["cancelada", "atendida"])
+    def construir():
+        now = timezone.now()
+        # Próximas: desde ahora en adelante (rango sobre cita_paciente_inicio_idx).
+        # Excluimos canceladas y atendidas.
+        proximas = list(
+            Cita.objects.filter(paciente=paciente, inicio__gte=now)
+            .exclude(estado__in=["cancelada", "atendida"])
+            .select_related("medico", "medico__especialidad")
+            .order_by("inicio")
         )
-        .select_related("medico", "medico__especialidad")
-        .order_by("-fecha", "-hora")
-    )
-
-    ctx = {"paciente": paciente, "proximas": proximas, "historial": historial}
+        # Historial: lo que ya pasó, además de cualquier cita cancelada o
+        # atendida (sin importar fecha), incluidas las ya archivadas.
+        historial = archivo.historial(paciente, now)
+        fragmentos.anotar_estados(proximas + historial, now)
+        return ({"proximas": proximas, "historial": historial},
+                fragmentos.vence(proximas, now))
+
+    citas = fragmentos.renderizar(
+        request, fragmentos.clave("perfil", paciente.pk),
+        "partials/_citas_perfil.html", construir)
+    ctx = {"paciente": paciente, "citas": citas}
     return render(request, "agenda/perfil.html", ctx)
 
 
@@ -154,23 +159,31 @@ def agendar(request: HttpRequest) -> HttpResponse:
 
     if request.method == "POST":
         form = CitaForm(request.POST, paciente=paciente)
-        medicos_qs = Medico.objects.none()
+        medicos_qs = []
         esp_id = request.POST.get("especialidad")
         if esp_id and esp_id.isdigit():
-            medicos_qs = Medico.objects.filter(
-                especialidad_id=esp_id).order_by("nombre")
+            medicos_qs = catalogo.medicos(esp_id)
     else:
         form = CitaForm(paciente=paciente)
-        medicos_qs = Medico.objects.none()
+        medicos_qs = []
 
-    especialidades_qs = Especialidad.objects.all().order_by("nombre")
+    especialidades_qs = catalogo.especialidades()
+    alternativas = []
 
     if request.method == "POST" and form.is_valid():
-        form.save()
-        messages.success(request, "¡Cita agendada con éxito!")
-        return redirect("agenda:perfil")
+        cd = form.cleaned_data
+        resultado = reservas.reservar(
+            paciente, cd["medico"], cd["fecha"], cd["hora"], cd.get("motivo", ""))
+        if resultado.ok:
+            messages.success(request, "¡Cita agendada con éxito!")
+            return redirect("agenda:perfil")
+        # Otro paciente tomó el bloque entre la validación y el INSERT
+        form.add_error(
+            "hora", "Esta hora acaba de ser reservada. Elige otra disponible.")
+        alternativas = resultado.alternativas
 
-    ctx = {"form": form, "especialidades": especialidades_qs, "medicos": medicos_qs}
+    ctx = {"form": form, "especialidades": especialidades_qs,
+           "medicos": medicos_qs, "alternativas": alternativas}
     return render(request, "agenda/agendar_cita.html", ctx)
 
 
@@ -178,67 +191,95 @@ def agendar(request: HttpRequest) -> HttpResponse:
 # Consultorio (login + permiso específico)
 # -------------------------------------------------------------------
 
+def _filtros_consultorio(request: HttpRequest) -> dict:
+    """Filtros del panel de consultorio, compartidos por el listado y la exportación."""
+    esp_id = (request.GET.get("especialidad") or "").strip()
+    medico_id = (request.GET.get("medico") or "").strip()
+    return {
+        "q": (request.GET.get("q") or "").strip(),
+        "estado": (request.GET.get("estado") or "").strip(),
+        "especialidad": esp_id if esp_id.isdigit() else "",
+        "medico": medico_id if medico_id.isdigit() else "",
+        "desde": parse_date(request.GET.get("desde") or ""),
+        "hasta": parse_date(request.GET.get("hasta") or ""),
+    }
+
+
+def _filtrar_citas(qs, filtros: dict):
+    if filtros["q"]:
+        qs = busqueda.filtrar(qs, filtros["q"], "paciente__busqueda", "paciente_id")
+    if filtros["estado"]:
+        qs = qs.filter(estado=filtros["estado"])
+    if filtros["especialidad"]:
+        qs = qs.filter(medico__especialidad_id=int(filtros["especialidad"]))
+    if filtros["medico"]:
+        qs = qs.filter(medico_id=int(filtros["medico"]))
+    if filtros["desde"]:
+        qs = qs.filter(fecha__gte=filtros["desde"])
+    if filtros["hasta"]:
+        qs = qs.filter(fecha__lte=filtros["hasta"])
+    return qs
+
+
 @login_required(login_url="login")
 @permission_required("agenda.access_consultorio", raise_exception=True)
+@lectura_replica
 def consultorio_citas(request: HttpRequest) -> HttpResponse:
     """
     Si no estás logueado: /accounts/login/?next=/consultorio/
     Si estás logueado sin permiso: 403
     """
-    qs = (
-        Cita.objects
-        .select_related("paciente__user", "medico", "medico__especialidad")
-        .all()
-        .order_by("fecha", "hora")
-    )
-
-    # Filtros
-    q = (request.GET.get("q") or "").strip()
-    if q:
-        qs = qs.filter(
-            Q(paciente__user__first_name__icontains=q) |
-            Q(paciente__user__last_name__icontains=q) |
-            Q(paciente__user__email__icontains=q)
+    filtros = _filtros_consultorio(request)
+    esp_id = filtros["especialidad"]
+    despues = request.GET.get("despues") or ""
+    antes = request.GET.get("antes") or ""
+    params = request.GET.copy()
+    for k in ("despues", "antes", "page"):
+        params.pop(k, None)
+    siguiente = request.get_full_path()
+
+    def construir():
+        qs = _filtrar_citas(
+            Cita.objects
+            .select_related("paciente__user", "medico", "medico__especialidad")
+            .order_by("fecha", "hora"),
+            filtros,
         )
-
-    estado = (request.GET.get("estado") or "").strip()
-    if estado:
-        qs = qs.filter(estado=estado)
-
-    esp_id = (request.GET.get("especialidad") or "").strip()
-    if esp_id.isdigit():
-        qs = qs.filter(medico__especialidad_id=int(esp_id))
-
-    medico_id = (request.GET.get("medico") or "").strip()
-    if medico_id.isdigit():
-        qs = qs.filter(medico_id=int(medico_id))
-
-    f_desde = parse_date(request.GET.get("desde") or "")
-    f_hasta = parse_date(request.GET.get("hasta") or "")
-    if f_desde:
-        qs = qs.filter(fecha__gte=f_desde)
-    if f_hasta:
-        qs = qs.filter(fecha__lte=f_hasta)
-
-    page_obj = Paginator(qs, 20).get_page(request.GET.get("page"))
-
-    especialidades = Especialidad.objects.all().order_by("nombre")
-    medicos = (
-        Medico.objects.filter(especialidad_id=int(esp_id)).order_by("nombre")
-        if esp_id.isdigit() else Medico.objects.all().order_by("nombre")
-    )
+        page_obj = paginacion.paginar(qs, 20, despues=despues, antes=antes)
+        total, total_exacto = paginacion.total_aproximado(qs, filtros)
+        now = timezone.now()
+        fragmentos.anotar_estados(page_obj.object_list, now)
+        return ({
+            "page_obj": page_obj,
+            "total": total,
+            "total_exacto": total_exacto,
+            "params_filtros": params.urlencode(),
+            "siguiente": siguiente,
+        }, fragmentos.vence(page_obj.object_list, now))
+
+    tabla = fragmentos.renderizar(
+        request,
+        fragmentos.clave("consultorio", sorted(filtros.items()), despues, antes, siguiente),
+        "partials/_tabla_consultorio.html", construir)
+
+    especialidades = catalogo.especialidades()
+    medicos = catalogo.medicos(esp_id or None)
     ESTADOS = [("", "Todos")] + list(Cita.ESTADO)
 
     ctx = {
-        "page_obj": page_obj,
+        "tabla": tabla,
+        "params_filtros": params.urlencode(),
+        "exportar_xlsx": XLSX_DISPONIBLE,
         "especialidades": especialidades,
         "medicos": medicos,
         "ESTADOS": ESTADOS,
+        "form_lote": CancelacionLoteForm(),
+        "medicos_todos": catalogo.medicos(),
         "f": {
-            "q": q,
-            "estado": estado,
+            "q": filtros["q"],
+            "estado": filtros["estado"],
             "especialidad": esp_id,
-            "medico": medico_id,
+            "medico": filtros["medico"],
             "desde": request.GET.get("desde") or "",
             "hasta": request.GET.get("hasta") or "",
         },
@@ -246,49 +287,231 @@ def consultorio_citas(request: HttpRequest) -> HttpResponse:
     return render(request, "agenda/consultorio_citas.html", ctx)
 
 
+class _Eco:
+    """Buffer mínimo para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+EXPORT_COLUMNAS = (
+    "fecha", "hora", "medico__nombre", "medico__especialidad__nombre",
+    "paciente__user__first_name", "paciente__user__last_name",
+    "paciente__user__email", "motivo", "estado", "cancel_motivo",
+)
+# La exportación XLSX usa openpyxl (requirements.txt); sin él solo hay CSV
+XLSX_DISPONIBLE = find_spec("openpyxl") is not None
+
+EXPORT_ENCABEZADOS = (
+    "Fecha", "Hora", "Médico", "Especialidad", "Nombre", "Apellidos",
+    "Email", "Motivo", "Estado", "Estado (UI)", "Motivo cancelación",
+)
+
+
+def _filas_exportacion(qs):
+    """Tuplas listas para escribir; nunca instancia modelos."""
+    ahora = timezone.localtime()
+    hoy, hora_actual = ahora.date(), ahora.time()
+    filas = qs.order_by("fecha", "hora", "id").values_list(*EXPORT_COLUMNAS)
+    for fecha, hora, medico, esp, nombre, apellidos, email, motivo, estado, cmotivo in (
+            filas.iterator(chunk_size=2000)):
+        if estado == "cancelada":
+            ui = "cancelada"
+        elif fecha < hoy or (fecha == hoy and hora <= hora_actual):
+            ui = "atendida"
+        else:
+            ui = "agendada"
+        yield (fecha.isoformat(), hora.strftime("%H:%M"), medico, esp, nombre,
+               apellidos, email, motivo, estado, ui, cmotivo)
+
+
+@login_required(login_url="login")
+@permission_required("agenda.access_consultorio", raise_exception=True)
+@lectura_replica
+def consultorio_exportar(request: HttpRequest) -> HttpResponse:
+    """Exporta (en streaming) las citas con los mismos filtros del listado."""
+    qs = _filtrar_citas(Cita.objects.all(), _filtros_consultorio(request))
+    nombre = f"citas_{timezone.localdate():%Y%m%d}"
+
+    if request.GET.get("formato") == "xlsx":
+        if not XLSX_DISPONIBLE:
+            messages.error(
+                request, "La exportación XLSX no está disponible (falta openpyxl).")
+            params = request.GET.copy()
+            params.pop("formato")
+            return redirect(f"{reverse('agenda:consultorio_citas')}?{params.urlencode()}")
+        from openpyxl import Workbook
+
+        # write_only escribe fila a fila en un archivo temporal
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet("Citas")
+        hoja.append(EXPORT_ENCABEZADOS)
+        for fila in _filas_exportacion(qs):
+            hoja.append(fila)
+        tmp = tempfile.TemporaryFile()
+        libro.save(tmp)
+        tmp.seek(0)
+        return FileResponse(tmp, as_attachment=True, filename=f"{nombre}.xlsx")
+
+    escritor = csv.writer(_Eco())
+
+    def lineas():
+        yield "\ufeff"  # BOM para que Excel detecte UTF-8
+        yield escritor.writerow(EXPORT_ENCABEZADOS)
+        for fila in _filas_exportacion(qs):
+            yield escritor.writerow(fila)
+
+    response = StreamingHttpResponse(lineas(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{nombre}.csv"'
+    return response
+
+
 # -------------------------------------------------------------------
 # AJAX
 # -------------------------------------------------------------------
 
+def _etag_medicos(request, *args, **kwargs):
+    version = catalogo.version()
+    if version is None:
+        return None
+    return f'"{version}-{request.GET.get("especialidad", "")}"'
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_medicos, last_modified_func=lambda r: catalogo.modificado())
+@lectura_replica
 def ajax_medicos(request: HttpRequest) -> JsonResponse:
     esp_id = request.GET.get("especialidad")
-    items: List[dict] = []
+    items: list[dict] = []
     if esp_id and esp_id.isdigit():
-        items = list(
-            Medico.objects.filter(especialidad_id=esp_id)
-            .order_by("nombre")
-            .values("id", "nombre")
-        )
+        items = [{"id": m.id, "nombre": m.nombre} for m in catalogo.medicos(esp_id)]
     return JsonResponse({"items": items})
 
 
-@login_required
-def ajax_horas(request: HttpRequest) -> JsonResponse:
+def _params_horas(request: HttpRequest):
+    """(medico_id, fecha) o None si faltan o no son válidos."""
     med_id = request.GET.get("medico")
     fecha_str = request.GET.get("fecha")
 
     if not (med_id and fecha_str):
-        return JsonResponse({"items": []})
+        return None
 
     try:
         med_id_int = int(med_id)
     except ValueError:
-        return JsonResponse({"items": []})
+        return None
 
     try:
         y, m, d = [int(x) for x in fecha_str.split("-")]
         f = date(y, m, d)
     except Exception:
+        return None
+    return med_id_int, f
+
+
+@login_required
+@lectura_replica
+def ajax_horas(request: HttpRequest) -> JsonResponse:
+    params = _params_horas(request)
+    if params is None:
+        return JsonResponse({"items": []})
+    med_id_int, f = params
+
+    # Una lectura del índice de ocupación en lugar de recorrer las citas del día
+    mapa = disponibilidad.ocupacion(med_id_int, f)
+    libres = horarios.libres(med_id_int, f, mapa)
+    return JsonResponse({"items": [b.etiqueta for b in libres]})
+
+
+DISPONIBILIDAD_MAX_DIAS = 62
+
+
+def _params_disponibilidad(request: HttpRequest):
+    """(medico_id, desde, hasta, detalle) o None; el rango se recorta a DISPONIBILIDAD_MAX_DIAS."""
+    med_id = request.GET.get("medico") or ""
+    desde = parse_date(request.GET.get("desde") or "")
+    hasta = parse_date(request.GET.get("hasta") or "")
+    if not (med_id.isdigit() and desde and hasta) or hasta < desde:
+        return None
+    hasta = min(hasta, desde + timedelta(days=DISPONIBILIDAD_MAX_DIAS - 1))
+    return int(med_id), desde, hasta, request.GET.get("detalle") == "1"
+
+
+def _fechas(desde, hasta):
+    return [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+
+def _items_disponibilidad(libres_por_fecha: dict, detalle: bool) -> list:
+    items = []
+    for f, libres in libres_por_fecha.items():
+        item = {"fecha": f.isoformat(), "libres": len(libres)}
+        if detalle:
+            item["horas"] = [b.etiqueta for b in libres]
+        items.append(item)
+    return items
+
+
+@login_required
+@lectura_replica
+def ajax_disponibilidad(request: HttpRequest) -> JsonResponse:
+    """
+    Bloques libres de un médico para cada día de un rango (p. ej. un mes),
+    en una sola respuesta. ``detalle=1`` incluye las horas además del conteo.
+    """
+    params = _params_disponibilidad(request)
+    if params is None:
+        return JsonResponse({"items": []})
+    med_id_int, desde, hasta, detalle = params
+
+    mapas = disponibilidad.ocupacion_rango(med_id_int, desde, hasta)
+    ahora = timezone.localtime()
+    libres = {
+        f: horarios.libres(med_id_int, f, mapas.get(f, 0), ahora=ahora)
+        for f in _fechas(desde, hasta)
+    }
+    return JsonResponse({"items": _items_disponibilidad(libres, detalle)})
+
+
+# Versiones async de los endpoints AJAX, para despliegues ASGI (uvicorn).
+# Mismos parámetros y respuestas; urls.py las usa si AGENDA_AJAX_ASYNC=True.
+# El ETag de médicos sale de la caché (no de la BD), así que ``condition``
+# puede calcularlo de forma síncrona también aquí.
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_medicos, last_modified_func=lambda r: catalogo.modificado())
+@lectura_replica
+async def ajax_medicos_async(request: HttpRequest) -> JsonResponse:
+    esp_id = request.GET.get("especialidad")
+    items: list[dict] = []
+    if esp_id and esp_id.isdigit():
+        items = [{"id": m.id, "nombre": m.nombre} for m in await catalogo.amedicos(esp_id)]
+    return JsonResponse({"items": items})
+
+
+@login_required
+@lectura_replica
+async def ajax_horas_async(request: HttpRequest) -> JsonResponse:
+    params = _params_horas(request)
+    if params is None:
         return JsonResponse({"items": []})
+    med_id_int, f = params
+    mapas = await disponibilidad.aocupacion_rango(med_id_int, f, f)
+    libres = await horarios.alibres_rango(med_id_int, [f], mapas)
+    return JsonResponse({"items": [b.etiqueta for b in libres[f]]})
 
-    base_slots = [time(h, mm) for h in range(9, 17) for mm in (0, 30)]
-    ocupadas_qs = Cita.objects.filter(
-        medico_id=med_id_int, fecha=f).values_list("hora", flat=True)
-    ocupadas = {t.strftime("%H:%M") for t in ocupadas_qs}
-    libres = [t.strftime("%H:%M")
-              for t in base_slots if t.strftime("%H:%M") not in ocupadas]
-    return JsonResponse({"items": libres})
+
+@login_required
+@lectura_replica
+async def ajax_disponibilidad_async(request: HttpRequest) -> JsonResponse:
+    params = _params_disponibilidad(request)
+    if params is None:
+        return JsonResponse({"items": []})
+    med_id_int, desde, hasta, detalle = params
+    mapas = await disponibilidad.aocupacion_rango(med_id_int, desde, hasta)
+    libres = await horarios.alibres_rango(med_id_int, _fechas(desde, hasta), mapas)
+    return JsonResponse({"items": _items_disponibilidad(libres, detalle)})
 
 
 # -------------------------------------------------------------------
@@ -354,7 +577,8 @@ def registro(request: HttpRequest) -> HttpResponse:
 @permission_required('agenda.access_consultorio')
 @require_POST
 def consultorio_cita_cancelar(request: HttpRequest, cita_id: int) -> HttpResponse:
-    cita = get_object_or_404(Cita, id=cita_id)
+    cita = get_object_or_404(
+        Cita.objects.select_related("paciente__user"), id=cita_id)
     if not cita.cancelar(request.user, motivo=request.POST.get('motivo', '')):
         if cita.estado == 'cancelada':
             messages.info(request, "La cita ya estaba cancelada.")
@@ -367,7 +591,29 @@ def consultorio_cita_cancelar(request: HttpRequest, cita_id: int) -> HttpRespons
             f"Cita cancelada: {cita.paciente.user.get_full_name() or cita.paciente.user.email} · "
             f"{cita.fecha} {cita.hora.strftime('%H:%M')}"
         )
-    return redirect(request.POST.get('next') or 'agenda:consultorio_citas')
+    return _volver(request)
+
+
+@login_required(login_url="login")
+@permission_required("agenda.access_consultorio", raise_exception=True)
+@require_POST
+def consultorio_cancelar_lote(request: HttpRequest) -> HttpResponse:
+    form = CancelacionLoteForm(request.POST)
+    if not form.is_valid():
+        for errores in form.errors.values():
+            for e in errores:
+                messages.error(request, e)
+    else:
+        cd = form.cleaned_data
+        n = cancelaciones.cancelar_rango(
+            cd["medico"].pk, cd["desde"], cd["hasta"], request.user, cd["motivo"])
+        if n:
+            messages.success(
+                request, f"{n} cita(s) de {cd['medico'].nombre} canceladas "
+                f"entre {cd['desde']:%d/%m/%Y} y {cd['hasta']:%d/%m/%Y}.")
+        else:
+            messages.info(request, "No había citas vigentes en ese rango.")
+    return _volver(request)
 
 
 def sobre(request):